@@ -0,0 +1,16 @@
+"""
+Clock for Tokyo Weekend Events API
+
+Event times are naive Tokyo local time: ingestion converts offsets in feeds
+to it, and calendar feeds label them ``TZID=Asia/Tokyo``. The host may run
+in any zone (containers usually run in UTC), so anything compared with an
+event time reads the clock through ``now()``.
+"""
+from datetime import datetime, timedelta, timezone
+
+TOKYO = timezone(timedelta(hours=9))
+
+
+def now() -> datetime:
+    """The current Tokyo local time, naive like event times."""
+    return datetime.now(TOKYO).replace(tzinfo=None)
@@ -1,458 +1,57 @@
 """
 In-memory database for Tokyo Weekend Events API
+
+The catalog is loaded on first use rather than at import, so worker processes
+boot in constant time: from the binary snapshot named by
+TWE_CATALOG_SNAPSHOT when it exists, otherwise from the seed data.
+
+With TWE_SHARED_CATALOG set, workers instead serve the catalog from a shared
+memory snapshot (see ``app.shared_catalog``). The first worker publishes it;
+the others attach, and follow each generation a writer publishes after its
+catalog changes. A write holds the publish lock from before it applies until
+its generation is published, so writes from different workers queue up
+instead of overwriting each other. Each generation also carries the catalog
+version, epoch and change log, so ETags and delta sync agree across workers.
+Users, favorites and schedules stay per process.
 """
+from bisect import bisect_left, bisect_right, insort
+import atexit
+import heapq
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Callable, Collection, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
 from passlib.context import CryptContext
 import jwt
-from app.models import Event, Location, Coordinates, ExternalLinks, NearbyPlace, User, Favorite, Schedule
+from app import (
+    dedupe, ical, metrics, recommendations, reminders, reservations, seed, serialization,
+    shared_catalog, similarity, snapshot, streaming
+)
+from app.pagination import EventKey, PlaceKey
+from app.models import Event, NearbyPlace, User, Favorite, Schedule
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 SECRET_KEY = "tokyo_weekend_events_secret_key"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+ADMIN_EMAILS = {"admin@example.com"}
+CATALOG_SNAPSHOT = os.environ.get("TWE_CATALOG_SNAPSHOT")
+SHARED_CATALOG = os.environ.get("TWE_SHARED_CATALOG")
+# Most keys one page may look at before it is returned short, so that a
+# selective filter cannot walk the whole index in one request.
+MAX_PAGE_SCAN = 2000
+# Models decoded from a shared generation are cached, not kept, so that
+# per-worker memory does not grow with the catalog.
+DECODED_CACHE_SIZE = 10000
 
-events: List[Event] = [
-    Event(
-        id=1,
-        name="東京アートフェスティバル",
-        description="週末に開催される東京最大のアートフェスティバル。様々なアーティストによる展示やパフォーマンスをお楽しみください。",
-        start_datetime=datetime.now() + timedelta(days=2, hours=10),
-        end_datetime=datetime.now() + timedelta(days=2, hours=18),
-        location=Location(
-            name="上野公園",
-            address="東京都台東区上野公園",
-            coordinates=Coordinates(latitude=35.7151, longitude=139.7734),
-            area="上野",
-            station="上野駅"
-        ),
-        category="アート",
-        external_links=ExternalLinks(
-            website="https://example.com/tokyo-art-festival",
-            instagram="https://instagram.com/tokyoartfest",
-            twitter="https://twitter.com/tokyoartfest"
-        ),
-        price=1000,
-        capacity=5000
-    ),
-    Event(
-        id=2,
-        name="渋谷ミュージックフェス",
-        description="渋谷の中心部で開催される音楽フェスティバル。人気バンドやDJによるライブパフォーマンスを体験しよう。",
-        start_datetime=datetime.now() + timedelta(days=3, hours=12),
-        end_datetime=datetime.now() + timedelta(days=3, hours=22),
-        location=Location(
-            name="渋谷ストリームホール",
-            address="東京都渋谷区渋谷3-21-3",
-            coordinates=Coordinates(latitude=35.6580, longitude=139.7016),
-            area="渋谷",
-            station="渋谷駅"
-        ),
-        category="音楽",
-        external_links=ExternalLinks(
-            website="https://example.com/shibuya-music-fest",
-            instagram="https://instagram.com/shibuyamusicfest",
-            twitter="https://twitter.com/shibuyamusicfest"
-        ),
-        price=3500,
-        capacity=2000
-    ),
-    Event(
-        id=3,
-        name="池袋フードフェスティバル",
-        description="池袋エリアの飲食店が集結する食のイベント。様々な国の料理や地元の名物を楽しめます。",
-        start_datetime=datetime.now() + timedelta(days=1, hours=11),
-        end_datetime=datetime.now() + timedelta(days=1, hours=20),
-        location=Location(
-            name="池袋西口公園",
-            address="東京都豊島区西池袋1-8-26",
-            coordinates=Coordinates(latitude=35.7295, longitude=139.7109),
-            area="池袋",
-            station="池袋駅"
-        ),
-        category="フード",
-        external_links=ExternalLinks(
-            website="https://example.com/ikebukuro-food-fest",
-            instagram="https://instagram.com/ikebukurofoodfest"
-        ),
-        price=500,
-        capacity=3000
-    ),
-    Event(
-        id=4,
-        name="新宿アニメコンベンション",
-        description="アニメファン必見のイベント。コスプレコンテスト、声優トークショー、グッズ販売などが行われます。",
-        start_datetime=datetime.now() + timedelta(days=4, hours=10),
-        end_datetime=datetime.now() + timedelta(days=5, hours=18),
-        location=Location(
-            name="新宿NSビル",
-            address="東京都新宿区西新宿2-4-1",
-            coordinates=Coordinates(latitude=35.6934, longitude=139.6935),
-            area="新宿",
-            station="新宿駅"
-        ),
-        category="アニメ",
-        external_links=ExternalLinks(
-            website="https://example.com/shinjuku-anime-con",
-            twitter="https://twitter.com/shinjukuanimecon"
-        ),
-        price=2000,
-        capacity=10000
-    ),
-    Event(
-        id=5,
-        name="北千住クラフトマーケット",
-        description="手作りの工芸品や雑貨が集まるマーケット。地元作家によるワークショップも開催されます。",
-        start_datetime=datetime.now() + timedelta(days=6, hours=10),
-        end_datetime=datetime.now() + timedelta(days=6, hours=16),
-        location=Location(
-            name="北千住マルイ前広場",
-            address="東京都足立区千住3-92",
-            coordinates=Coordinates(latitude=35.7489, longitude=139.8007),
-            area="北千住",
-            station="北千住駅"
-        ),
-        category="マーケット",
-        external_links=ExternalLinks(
-            instagram="https://instagram.com/kitasenju_craftmarket"
-        ),
-        price=0,
-        capacity=1000
-    ),
-    Event(
-        id=6,
-        name="六本木アートナイト",
-        description="一夜限りのアートの祭典。美術館やギャラリーが深夜まで開館し、街中がアート作品で彩られます。",
-        start_datetime=datetime.now() + timedelta(days=5, hours=16),
-        end_datetime=datetime.now() + timedelta(days=6, hours=5),
-        location=Location(
-            name="六本木ヒルズ",
-            address="東京都港区六本木6-10-1",
-            coordinates=Coordinates(latitude=35.6604, longitude=139.7292),
-            area="六本木",
-            station="六本木駅"
-        ),
-        category="アート",
-        external_links=ExternalLinks(
-            website="https://example.com/roppongi-art-night",
-            instagram="https://instagram.com/roppongiartnightofficial",
-            twitter="https://twitter.com/roppongiartnigh"
-        ),
-        price=0,
-        capacity=50000
-    ),
-    Event(
-        id=7,
-        name="お台場ビーチフェスティバル",
-        description="都心の人工ビーチで開催される夏のフェスティバル。ビーチスポーツやBBQ、音楽ライブなどが楽しめます。",
-        start_datetime=datetime.now() + timedelta(days=7, hours=10),
-        end_datetime=datetime.now() + timedelta(days=7, hours=20),
-        location=Location(
-            name="お台場海浜公園",
-            address="東京都港区台場1-4-1",
-            coordinates=Coordinates(latitude=35.6300, longitude=139.7750),
-            area="お台場",
-            station="お台場海浜公園駅"
-        ),
-        category="フェスティバル",
-        external_links=ExternalLinks(
-            website="https://example.com/odaiba-beach-festival",
-            instagram="https://instagram.com/odaibabeachfest"
-        ),
-        price=1500,
-        capacity=8000
-    ),
-    Event(
-        id=8,
-        name="銀座ファッションウィーク",
-        description="銀座の各ショップが参加するファッションイベント。最新トレンドのファッションショーやワークショップが開催されます。",
-        start_datetime=datetime.now() + timedelta(days=8, hours=11),
-        end_datetime=datetime.now() + timedelta(days=14, hours=20),
-        location=Location(
-            name="銀座三越",
-            address="東京都中央区銀座4-6-16",
-            coordinates=Coordinates(latitude=35.6713, longitude=139.7636),
-            area="銀座",
-            station="銀座駅"
-        ),
-        category="ファッション",
-        external_links=ExternalLinks(
-            website="https://example.com/ginza-fashion-week",
-            instagram="https://instagram.com/ginzafashionweek",
-            twitter="https://twitter.com/ginzafashionwk"
-        ),
-        price=0,
-        capacity=None
-    ),
-    Event(
-        id=9,
-        name="東京駅グルメフェア",
-        description="東京駅構内の飲食店が参加するグルメイベント。限定メニューや特別価格のセットが楽しめます。",
-        start_datetime=datetime.now() + timedelta(days=2, hours=10),
-        end_datetime=datetime.now() + timedelta(days=8, hours=22),
-        location=Location(
-            name="東京駅一番街",
-            address="東京都千代田区丸の内1-9-1",
-            coordinates=Coordinates(latitude=35.6812, longitude=139.7671),
-            area="東京",
-            station="東京駅"
-        ),
-        category="フード",
-        external_links=ExternalLinks(
-            website="https://example.com/tokyo-station-gourmet-fair"
-        ),
-        price=0,
-        capacity=None
-    ),
-    Event(
-        id=10,
-        name="日比谷音楽祭",
-        description="日比谷公園で開催される無料の音楽フェスティバル。様々なジャンルのミュージシャンによるライブが楽しめます。",
-        start_datetime=datetime.now() + timedelta(days=9, hours=12),
-        end_datetime=datetime.now() + timedelta(days=10, hours=20),
-        location=Location(
-            name="日比谷公園大音楽堂",
-            address="東京都千代田区日比谷公園1-5",
-            coordinates=Coordinates(latitude=35.6731, longitude=139.7588),
-            area="日比谷",
-            station="日比谷駅"
-        ),
-        category="音楽",
-        external_links=ExternalLinks(
-            website="https://example.com/hibiya-music-festival",
-            twitter="https://twitter.com/hibiyamusicfest"
-        ),
-        price=0,
-        capacity=3000
-    ),
-    Event(
-        id=11,
-        name="丸の内イルミネーション",
-        description="丸の内エリア一帯で開催される冬の風物詩。約200本の街路樹が約100万球のLEDで彩られます。",
-        start_datetime=datetime.now() + timedelta(days=10, hours=17),
-        end_datetime=datetime.now() + timedelta(days=90, hours=23),
-        location=Location(
-            name="丸の内仲通り",
-            address="東京都千代田区丸の内1丁目",
-            coordinates=Coordinates(latitude=35.6809, longitude=139.7650),
-            area="丸の内",
-            station="東京駅"
-        ),
-        category="イルミネーション",
-        external_links=ExternalLinks(
-            website="https://example.com/marunouchi-illumination",
-            instagram="https://instagram.com/marunouchiillumination"
-        ),
-        price=0,
-        capacity=None
-    ),
-    Event(
-        id=12,
-        name="浅草三社祭",
-        description="浅草神社の例大祭。神輿の担ぎ手や纏持ちなど約500人の町会員が参加する勇壮な祭りです。",
-        start_datetime=datetime.now() + timedelta(days=15, hours=9),
-        end_datetime=datetime.now() + timedelta(days=17, hours=18),
-        location=Location(
-            name="浅草神社",
-            address="東京都台東区浅草2-3-1",
-            coordinates=Coordinates(latitude=35.7147, longitude=139.7966),
-            area="浅草",
-            station="浅草駅"
-        ),
-        category="祭り",
-        external_links=ExternalLinks(
-            website="https://example.com/asakusa-sanja-matsuri",
-            instagram="https://instagram.com/asakusasanjamatsuri",
-            twitter="https://twitter.com/asakusasanja"
-        ),
-        price=0,
-        capacity=None
-    )
-]
-
-nearby_places: List[NearbyPlace] = [
-    NearbyPlace(
-        id=1,
-        name="上野寿司",
-        type="restaurant",
-        location=Location(
-            name="上野寿司",
-            address="東京都台東区上野7-1-1",
-            coordinates=Coordinates(latitude=35.7141, longitude=139.7744),
-            area="上野",
-            station="上野駅"
-        ),
-        rating=4.5,
-        price_level=3,
-        description="伝統的な江戸前寿司を提供する老舗店"
-    ),
-    NearbyPlace(
-        id=2,
-        name="渋谷カフェ",
-        type="cafe",
-        location=Location(
-            name="渋谷カフェ",
-            address="東京都渋谷区宇田川町15-1",
-            coordinates=Coordinates(latitude=35.6590, longitude=139.7010),
-            area="渋谷",
-            station="渋谷駅"
-        ),
-        rating=4.2,
-        price_level=2,
-        description="おしゃれな空間でくつろげるカフェ"
-    ),
-    NearbyPlace(
-        id=3,
-        name="池袋ホテル",
-        type="hotel",
-        location=Location(
-            name="池袋ホテル",
-            address="東京都豊島区東池袋1-5-6",
-            coordinates=Coordinates(latitude=35.7300, longitude=139.7120),
-            area="池袋",
-            station="池袋駅"
-        ),
-        rating=4.0,
-        price_level=3,
-        description="駅から徒歩5分の便利なビジネスホテル"
-    ),
-    NearbyPlace(
-        id=4,
-        name="新宿居酒屋",
-        type="restaurant",
-        location=Location(
-            name="新宿居酒屋",
-            address="東京都新宿区歌舞伎町1-2-3",
-            coordinates=Coordinates(latitude=35.6938, longitude=139.7030),
-            area="新宿",
-            station="新宿駅"
-        ),
-        rating=4.3,
-        price_level=2,
-        description="新鮮な魚介類と日本酒が自慢の居酒屋"
-    ),
-    NearbyPlace(
-        id=5,
-        name="北千住ネットカフェ",
-        type="entertainment",
-        location=Location(
-            name="北千住ネットカフェ",
-            address="東京都足立区千住2-20",
-            coordinates=Coordinates(latitude=35.7485, longitude=139.8015),
-            area="北千住",
-            station="北千住駅"
-        ),
-        rating=3.8,
-        price_level=1,
-        description="24時間営業の快適なネットカフェ"
-    ),
-    NearbyPlace(
-        id=6,
-        name="六本木バー",
-        type="restaurant",
-        location=Location(
-            name="六本木バー",
-            address="東京都港区六本木7-4-5",
-            coordinates=Coordinates(latitude=35.6622, longitude=139.7310),
-            area="六本木",
-            station="六本木駅"
-        ),
-        rating=4.6,
-        price_level=4,
-        description="夜景が美しい高層階のカクテルバー"
-    ),
-    NearbyPlace(
-        id=7,
-        name="お台場レストラン",
-        type="restaurant",
-        location=Location(
-            name="お台場レストラン",
-            address="東京都港区台場1-7-1",
-            coordinates=Coordinates(latitude=35.6290, longitude=139.7730),
-            area="お台場",
-            station="台場駅"
-        ),
-        rating=4.1,
-        price_level=3,
-        description="海を眺めながら食事ができるレストラン"
-    ),
-    NearbyPlace(
-        id=8,
-        name="銀座高級ホテル",
-        type="hotel",
-        location=Location(
-            name="銀座高級ホテル",
-            address="東京都中央区銀座5-10-1",
-            coordinates=Coordinates(latitude=35.6720, longitude=139.7650),
-            area="銀座",
-            station="銀座駅"
-        ),
-        rating=4.8,
-        price_level=5,
-        description="銀座の中心に位置する5つ星ホテル"
-    ),
-    NearbyPlace(
-        id=9,
-        name="東京駅カフェ",
-        type="cafe",
-        location=Location(
-            name="東京駅カフェ",
-            address="東京都千代田区丸の内1-9-1",
-            coordinates=Coordinates(latitude=35.6812, longitude=139.7671),
-            area="東京",
-            station="東京駅"
-        ),
-        rating=4.0,
-        price_level=2,
-        description="駅構内にある便利なカフェ"
-    ),
-    NearbyPlace(
-        id=10,
-        name="日比谷バー",
-        type="restaurant",
-        location=Location(
-            name="日比谷バー",
-            address="東京都千代田区有楽町1-1-2",
-            coordinates=Coordinates(latitude=35.6731, longitude=139.7588),
-            area="日比谷",
-            station="日比谷駅"
-        ),
-        rating=4.4,
-        price_level=3,
-        description="クラシックな雰囲気のカクテルバー"
-    ),
-    NearbyPlace(
-        id=11,
-        name="丸の内カフェ",
-        type="cafe",
-        location=Location(
-            name="丸の内カフェ",
-            address="東京都千代田区丸の内2-4-1",
-            coordinates=Coordinates(latitude=35.6809, longitude=139.7650),
-            area="丸の内",
-            station="東京駅"
-        ),
-        rating=4.2,
-        price_level=2,
-        description="ビジネスマンに人気のモダンなカフェ"
-    ),
-    NearbyPlace(
-        id=12,
-        name="浅草旅館",
-        type="hotel",
-        location=Location(
-            name="浅草旅館",
-            address="東京都台東区浅草1-5-3",
-            coordinates=Coordinates(latitude=35.7147, longitude=139.7966),
-            area="浅草",
-            station="浅草駅"
-        ),
-        rating=4.3,
-        price_level=2,
-        description="伝統的な和風旅館"
-    )
-]
+events: List[Event] = []
+nearby_places: List[NearbyPlace] = []
 
 users: List[User] = [
     User(
@@ -463,9 +62,12 @@ users: List[User] = [
     )
 ]
 
+# bcrypt of "password123", precomputed so that importing the store stays cheap.
 password_hashes = {
-    "test@example.com": pwd_context.hash("password123")
+    "test@example.com": "$2b$12$4sNdtKLRLypXR.EgXnkwX.u8hHL7NNeimc12aWHgr2EnbxgbkYSgW"
 }
+# Registrations run on the bcrypt pool; this keeps user ids unique.
+_users_lock = threading.Lock()
 
 favorites: List[Favorite] = [
     Favorite(id=1, user_id=1, event_id=1),
@@ -474,19 +76,642 @@ favorites: List[Favorite] = [
 
 schedules: List[Schedule] = []
 
+# Monotonic version counters, bumped on every mutation, used to derive ETags.
+catalog_version = 0
+_favorites_versions: Dict[int, int] = defaultdict(int)
+_schedule_versions: Dict[int, int] = defaultdict(int)
+
+# Versions restart from zero with the process (or the shared catalog), so
+# sync clients also compare the epoch the version was issued under.
+catalog_epoch = format(time.time_ns(), "x")
+
+# Append-only log of (version, op, event_id) catalog changes. Once it grows
+# past CHANGE_LOG_LIMIT the oldest entries are compacted away and clients
+# older than _change_log_floor have to resync from scratch.
+CHANGE_LOG_LIMIT = 10000
+_change_log: Deque[Tuple[int, str, int]] = deque()
+_change_log_floor = 0
+
+def get_catalog_version() -> int:
+    # Pick up generations other workers published first, or ETags built from
+    # this version would vouch for bodies cached before the change.
+    ensure_catalog()
+    return catalog_version
+
+def get_catalog_epoch() -> str:
+    # A shared catalog's epoch is adopted from its first generation.
+    ensure_catalog()
+    return catalog_epoch
+
+def _record_changes(op: str, event_ids: List[int]):
+    """Bump the catalog version once for a whole batch of changes."""
+    global catalog_version, _change_log_floor
+    catalog_version += 1
+    _change_log.extend((catalog_version, op, event_id) for event_id in event_ids)
+    while len(_change_log) > CHANGE_LOG_LIMIT:
+        _change_log_floor = _change_log.popleft()[0]
+    streaming.publish("catalog", {"version": catalog_version, "op": op, "event_ids": event_ids})
+
+def get_changes_since(since: int) -> Optional[Tuple[List[Event], List[int]]]:
+    """Return (upserted events, deleted ids) after version ``since``.
+
+    Returns None when the log no longer reaches back to ``since`` (or ``since``
+    is from the future), meaning the client needs a full resync.
+    """
+    ensure_catalog()
+    if since < _change_log_floor or since > catalog_version:
+        return None
+    latest: Dict[int, str] = {}
+    i = len(_change_log)
+    # Walk back from the newest entry; the first op seen per event wins.
+    while i > 0 and _change_log[i - 1][0] > since:
+        i -= 1
+        _, op, event_id = _change_log[i]
+        latest.setdefault(event_id, op)
+    upserts = [_event(event_id) for event_id, op in latest.items() if op == "upsert"]
+    upserts = [e for e in upserts if e is not None]
+    deleted = [event_id for event_id, op in latest.items() if op == "delete"]
+    return upserts, deleted
+
+def get_favorites_version(user_id: int) -> int:
+    return _favorites_versions[user_id]
+
+def get_schedule_version(user_id: int) -> int:
+    return _schedule_versions[user_id]
+
+# Secondary indexes kept sorted by (start_datetime, id) so that pages can be
+# served by bisecting to the cursor instead of scanning from the beginning.
+_events_by_id: Dict[int, Event] = {}
+_event_keys: List[EventKey] = []
+_event_keys_by_area: Dict[str, List[EventKey]] = defaultdict(list)
+_places_by_id: Dict[int, NearbyPlace] = {}
+_place_keys: List[PlaceKey] = []
+_place_keys_by_area: Dict[str, List[PlaceKey]] = defaultdict(list)
+
+def _event_key(event: Event) -> EventKey:
+    return (event.start_datetime, event.id)
+
+# Below this many keys per batch, bisecting each key in is cheaper than a
+# linear merge of the whole index.
+_MERGE_THRESHOLD = 32
+
+def _insert_keys(index: list, items: List, key: Optional[Callable] = None):
+    """Insert ``items`` into an ``index`` sorted by ``key`` (the items themselves by default)."""
+    items.sort(key=key)
+    if len(items) < _MERGE_THRESHOLD:
+        for item in items:
+            insort(index, item, key=key)
+    else:
+        index[:] = list(heapq.merge(index, items, key=key))
+
+def _remove_keys(index: list, items: List, key: Optional[Callable] = None):
+    key = key or (lambda item: item)
+    keys = [key(item) for item in items]
+    if len(keys) < _MERGE_THRESHOLD:
+        for k in keys:
+            i = bisect_left(index, k, key=key)
+            if i < len(index) and key(index[i]) == k:
+                del index[i]
+    else:
+        drop = set(keys)
+        index[:] = [item for item in index if key(item) not in drop]
+
+def _keys_by_area(batch: List[Event]) -> Dict[str, List[EventKey]]:
+    grouped: Dict[str, List[EventKey]] = defaultdict(list)
+    for event in batch:
+        grouped[event.location.area].append(_event_key(event))
+    return grouped
+
+# ``events`` is kept in key order too, so a write finds an event by bisecting
+# instead of walking the list.
+def _index_events(batch: List[Event]):
+    for event in batch:
+        _events_by_id[event.id] = event
+    _insert_keys(events, list(batch), _event_key)
+    _insert_keys(_event_keys, [_event_key(e) for e in batch])
+    for area, keys in _keys_by_area(batch).items():
+        _insert_keys(_event_keys_by_area[area], keys)
+
+def _unindex_events(batch: List[Event]):
+    for event in batch:
+        _events_by_id.pop(event.id, None)
+    _remove_keys(events, batch, _event_key)
+    _remove_keys(_event_keys, [_event_key(e) for e in batch])
+    for area, keys in _keys_by_area(batch).items():
+        _remove_keys(_event_keys_by_area[area], keys)
+
+def _build_indexes():
+    _events_by_id.clear()
+    _event_keys.clear()
+    _event_keys_by_area.clear()
+    events.sort(key=_event_key)
+    for event in events:
+        _events_by_id[event.id] = event
+        _event_keys_by_area[event.location.area].append(_event_key(event))
+    _event_keys.extend(_event_key(e) for e in events)
+
+    _places_by_id.clear()
+    _place_keys.clear()
+    _place_keys_by_area.clear()
+    for place in sorted(nearby_places, key=lambda p: p.id):
+        _places_by_id[place.id] = place
+        _place_keys.append((place.id,))
+        _place_keys_by_area[place.location.area].append((place.id,))
+
+_catalog_lock = threading.RLock()
+_catalog_loaded = False
+_similarity_loaded = False
+# Ids written while the similarity index is built off the loop; None otherwise.
+_similarity_changes: Optional[set] = None
+# Near-duplicate index of the catalog, built by the first deduplicating ingest.
+_dedupe_index: Optional[dedupe.Index] = None
+# Event JSON read from a snapshot and not yet decoded into an Event. Pages
+# and lookups decode what they touch; writes decode everything first.
+_undecoded: Dict[int, bytes] = {}
+_decoded: "OrderedDict[int, Event]" = OrderedDict()
+
+_shared: Optional[shared_catalog.SharedCatalog] = None
+_shared_generation = 0
+_shared_segment = None
+# The catalog version in the generation this worker published or follows.
+_published_version = 0
+# While above zero, coalesced_writes() publishes instead of each write.
+_publish_deferred = 0
+# Earlier generations whose memoryviews were still in use when we moved on.
+_retired_segments: list = []
+
+def _event(event_id: int) -> Optional[Event]:
+    event = _events_by_id.get(event_id)
+    if event is not None:
+        return event
+    body = _undecoded.get(event_id)
+    if body is None:
+        return None
+    if _shared_segment is None:
+        event = _events_by_id[event_id] = Event.model_validate_json(bytes(body))
+        _undecoded.pop(event_id, None)
+        return event
+    event = _decoded.get(event_id)
+    if event is None:
+        event = _decoded[event_id] = Event.model_validate_json(bytes(body))
+        if len(_decoded) > DECODED_CACHE_SIZE:
+            _decoded.popitem(last=False)
+    else:
+        _decoded.move_to_end(event_id)
+    return event
+
+def _peek_event(event_id: int) -> Optional[Event]:
+    """Like _event, but an event not decoded yet is decoded without being kept."""
+    event = _events_by_id.get(event_id) or _decoded.get(event_id)
+    if event is not None:
+        return event
+    body = _undecoded.get(event_id)
+    return None if body is None else Event.model_validate_json(bytes(body))
+
+def _decode_all():
+    if not _undecoded:
+        return
+    with _catalog_lock:
+        if _undecoded:
+            for key in _event_keys:
+                event_id = key[-1]
+                if event_id not in _events_by_id:
+                    event = _decoded.get(event_id) or Event.model_validate_json(bytes(_undecoded[event_id]))
+                    _events_by_id[event_id] = event
+            events[:] = [_events_by_id[key[-1]] for key in _event_keys]
+            _undecoded.clear()
+            _decoded.clear()
+
+@contextmanager
+def _writing():
+    """Hold the catalog for a write, which needs every event as a model.
+
+    With a shared catalog the write also holds the publish lock. Under it the
+    worker first catches up with the newest generation, so the write applies
+    on top of every other worker's, and publishes the result before letting
+    go, so no other worker can publish in between.
+    """
+    ensure_catalog()
+    with _catalog_lock:
+        if _shared is None:
+            _decode_all()
+            yield
+            return
+        # The flock only excludes other processes; _catalog_lock serializes
+        # this process's own writers.
+        with _shared.lock():
+            _follow_shared()
+            _decode_all()
+            yield
+            if not _publish_deferred and catalog_version != _published_version:
+                _publish_shared()
+
+@contextmanager
+def coalesced_writes():
+    """Publish the writes made meanwhile as one shared generation at the end.
+
+    For bulk loads driven from a worker thread, whose batches would otherwise
+    each encode and publish the whole catalog. The publish lock is held
+    throughout, so other workers' writes wait for it, and the final encode
+    runs on the calling thread.
+    """
+    global _publish_deferred
+    ensure_catalog()
+    if _shared is None:
+        yield
+        return
+    with _shared.lock():
+        _follow_shared()
+        with _catalog_lock:
+            _publish_deferred += 1
+        try:
+            yield
+        finally:
+            with _catalog_lock:
+                _publish_deferred -= 1
+                if not _publish_deferred and catalog_version != _published_version:
+                    _publish_shared()
+
+def _scan() -> Iterator[Event]:
+    """Every event, decoding lazily-loaded ones as the scan reaches them."""
+    ensure_catalog()
+    if not _undecoded:
+        return iter(events)
+    return (_event(key[-1]) for key in _event_keys)
+
+def _events_with_ids(event_ids: Collection[int]) -> List[Event]:
+    if not _undecoded:
+        return [e for e in events if e.id in event_ids]
+    return [_event(key[-1]) for key in _event_keys if key[-1] in event_ids]
+
+def _catalog_rows() -> Tuple[List[snapshot.EventRow], List[snapshot.PlaceRow]]:
+    """Snapshot rows straight from the indexes, without decoding any event."""
+    event_rows = []
+    for area, keys in _event_keys_by_area.items():
+        for key in keys:
+            body, summary = serialization.event_fragments(key[-1])
+            event_rows.append((key, area, body, summary))
+    place_rows = [(place.id, place.location.area, serialization.place_json(place.id))
+                  for place in nearby_places]
+    return event_rows, place_rows
+
+def _load_snapshot(snap: snapshot.Snapshot):
+    _events_by_id.clear()
+    _event_keys.clear()
+    _event_keys_by_area.clear()
+    _undecoded.clear()
+    _decoded.clear()
+    serialization.clear()
+    # Rows come in index order, so the key lists are built already sorted.
+    for key, area, body, summary in snap.event_rows():
+        _undecoded[key[-1]] = body
+        _event_keys.append(key)
+        _event_keys_by_area[area].append(key)
+        serialization.load_event(key[-1], body, summary)
+    places = []
+    _places_by_id.clear()
+    _place_keys.clear()
+    _place_keys_by_area.clear()
+    for place_id, area, body in snap.place_rows():
+        place = NearbyPlace.model_validate_json(bytes(body))
+        places.append(place)
+        _places_by_id[place_id] = place
+        _place_keys.append((place_id,))
+        _place_keys_by_area[area].append((place_id,))
+        serialization.load_place(place_id, body)
+    _place_keys.sort()
+    events.clear()
+    nearby_places[:] = places
+
+def _load_local():
+    if CATALOG_SNAPSHOT and os.path.exists(CATALOG_SNAPSHOT):
+        snap = snapshot.Snapshot.open(CATALOG_SNAPSHOT)
+        try:
+            _load_snapshot(snap)
+        finally:
+            snap.close()
+    else:
+        events[:] = seed.seed_events()
+        nearby_places[:] = seed.seed_places()
+        _build_indexes()
+        serialization.rebuild(events, nearby_places)
+
+def _attach_shared() -> Optional[dict]:
+    """Serve the current shared generation and return its catalog state.
+
+    Returns None if no generation is published yet.
+    """
+    global _shared_generation, _shared_segment
+    attached = _shared.attach()
+    if attached is None:
+        return None
+    generation, segment = attached
+    state, body = shared_catalog.contents(segment)
+    _load_snapshot(snapshot.Snapshot(body, zero_copy=True))
+    if _shared_segment is not None:
+        _retired_segments.append(_shared_segment)
+    _shared_segment = segment
+    _shared_generation = generation
+    _close_retired()
+    return json.loads(state)
+
+def _shared_state() -> bytes:
+    return json.dumps({"epoch": catalog_epoch, "version": catalog_version,
+                       "floor": _change_log_floor, "log": list(_change_log)}).encode()
+
+def _adopt_state(state: dict):
+    """Take over the version, epoch and change log of an attached generation.
+
+    Streams on this worker are sent the changes it has not seen, as if they
+    had been made here, or told to reload if the log no longer covers them.
+    """
+    global catalog_version, catalog_epoch, _change_log_floor, _published_version
+    seen_version, seen_epoch = catalog_version, catalog_epoch
+    catalog_epoch, catalog_version = state["epoch"], state["version"]
+    _published_version = catalog_version
+    _change_log_floor = state["floor"]
+    _change_log.clear()
+    _change_log.extend((version, op, event_id) for version, op, event_id in state["log"])
+    if seen_epoch != catalog_epoch or seen_version < _change_log_floor:
+        streaming.publish("catalog", {"version": catalog_version, "op": "reload", "event_ids": []})
+        return
+    missed: Dict[int, Tuple[str, List[int]]] = {}
+    for version, op, event_id in _change_log:
+        if version > seen_version:
+            missed.setdefault(version, (op, []))[1].append(event_id)
+    for version, (op, event_ids) in missed.items():
+        streaming.publish("catalog", {"version": version, "op": op, "event_ids": event_ids})
+
+def _close_retired():
+    for segment in list(_retired_segments):
+        try:
+            segment.close()
+        except BufferError:
+            continue  # A view into it is still alive; try again next time.
+        _retired_segments.remove(segment)
+
+@atexit.register
+def _release_shared():
+    # Drop our views first so the mappings can be closed cleanly.
+    global _shared_segment
+    if _shared_segment is None:
+        return
+    _undecoded.clear()
+    serialization.clear()
+    _retired_segments.append(_shared_segment)
+    _shared_segment = None
+    _close_retired()
+
+def _open_shared():
+    global _shared
+    _shared = shared_catalog.SharedCatalog(SHARED_CATALOG)
+    # Only one worker builds and publishes the first generation.
+    with _shared.lock():
+        state = _attach_shared()
+        if state is None:
+            _load_local()
+            _publish_shared()
+        else:
+            _adopt_state(state)
+
+def _catalog_replaced():
+    """Drop what was derived from the old catalog once a new one is in place."""
+    global catalog_version, _change_log_floor, _similarity_loaded, _similarity_changes, \
+        _dedupe_index
+    _similarity_loaded = False
+    _similarity_changes = None
+    _dedupe_index = None
+    # There is no per-event log of a replacement, so sync clients resync.
+    catalog_version += 1
+    _change_log.clear()
+    _change_log_floor = catalog_version
+    streaming.publish("catalog", {"version": catalog_version, "op": "reload", "event_ids": []})
+
+def _follow_shared():
+    """Switch to a newer generation published by another worker."""
+    global _similarity_loaded, _similarity_changes, _dedupe_index
+    if _shared.generation() == _shared_generation:
+        return
+    with _catalog_lock:
+        if _shared.generation() == _shared_generation:
+            return
+        state = _attach_shared()
+        if state is None:
+            return
+        _similarity_loaded = False
+        _similarity_changes = None
+        _dedupe_index = None
+        _adopt_state(state)
+
+def _publish_shared():
+    """Publish this worker's catalog as the next shared generation.
+
+    Refuses to replace a generation this worker has not caught up with,
+    since that would silently drop another worker's writes.
+    """
+    global _shared_generation, _published_version
+    with _catalog_lock, _shared.lock():
+        current = _shared.generation()
+        if current != _shared_generation:
+            raise RuntimeError(f"shared catalog is at generation {current}, "
+                               f"this worker at {_shared_generation}")
+        parts, size = snapshot.encode(*_catalog_rows())
+        _shared_generation = _shared.publish(parts, size, _shared_state())
+        _published_version = catalog_version
+
+def ensure_catalog():
+    """Load the catalog and its indexes if this process has not done so yet."""
+    global _catalog_loaded
+    if _catalog_loaded:
+        if _shared is not None:
+            _follow_shared()
+        return
+    with _catalog_lock:
+        if _catalog_loaded:
+            return
+        if SHARED_CATALOG:
+            _open_shared()
+        else:
+            _load_local()
+        rebuild_recommendations()
+        _catalog_loaded = True
+
+def similarity_ready() -> bool:
+    ensure_catalog()
+    return _similarity_loaded
+
+def start_similarity_build() -> List[int]:
+    """Start noting writes for a similarity build; return the ids to build from.
+
+    Call on the loop, run ``build_similarity`` off it, then finish on the
+    loop with ``install_similarity`` or ``abandon_similarity_build``.
+    """
+    global _similarity_changes
+    ensure_catalog()
+    with _catalog_lock:
+        _similarity_changes = set()
+        return [key[-1] for key in _event_keys]
+
+def build_similarity(event_ids: List[int]) -> similarity.Index:
+    # Off the loop: decode without touching the decoded-event caches.
+    events = (_peek_event(event_id) for event_id in event_ids)
+    return similarity.build(event for event in events if event is not None)
+
+def install_similarity(index: similarity.Index):
+    """Swap in a built index and apply the writes made while it was built."""
+    global _similarity_loaded, _similarity_changes
+    with _catalog_lock:
+        if _similarity_changes is None:
+            return  # The catalog was replaced meanwhile, so the index is stale.
+        changed, _similarity_changes = _similarity_changes, None
+        similarity.install(index)
+        present = []
+        for event_id in changed:
+            event = _event(event_id)
+            if event is None:
+                similarity.remove(event_id)
+            else:
+                present.append(event)
+        if present:
+            similarity.index_many(present)
+        _similarity_loaded = True
+
+def abandon_similarity_build():
+    global _similarity_changes
+    _similarity_changes = None
+
+def _ensure_similarity():
+    """Build the similar-events index on the spot if it is not there yet."""
+    global _similarity_loaded
+    ensure_catalog()
+    if _similarity_loaded:
+        return
+    with _catalog_lock:
+        if not _similarity_loaded:
+            similarity.rebuild(_scan())
+            _similarity_loaded = True
+
+def load_catalog(new_events: List[Event], places: List[NearbyPlace]):
+    """Replace the whole catalog, as one write, with ``new_events`` and ``places``."""
+    with _writing():
+        _undecoded.clear()
+        _decoded.clear()
+        events[:] = new_events
+        nearby_places[:] = places
+        _build_indexes()
+        serialization.rebuild(events, nearby_places)
+        _catalog_replaced()
+
+def dedupe_index() -> dedupe.Index:
+    """The catalog's near-duplicate index; built once, then kept current by writes."""
+    global _dedupe_index
+    ensure_catalog()
+    with _catalog_lock:
+        if _dedupe_index is None:
+            _dedupe_index = dedupe.Index(_scan())
+        return _dedupe_index
+
+def write_snapshot(path: Optional[str] = None) -> Tuple[str, int, int]:
+    """Write the current catalog to ``path`` (default TWE_CATALOG_SNAPSHOT)."""
+    path = path or CATALOG_SNAPSHOT
+    if not path:
+        raise ValueError("No snapshot path configured")
+    ensure_catalog()
+    with _catalog_lock:
+        snapshot.write(path, *_catalog_rows())
+    return path, len(_event_keys), len(nearby_places)
+
 def get_all_events():
-    return events
+    ensure_catalog()
+    return events if not _undecoded else list(_scan())
 
 def get_event_by_id(event_id: int):
-    for event in events:
-        if event.id == event_id:
-            return event
-    return None
+    ensure_catalog()
+    return _event(event_id)
+
+def get_event_start(event_id: int) -> Optional[datetime]:
+    event = get_event_by_id(event_id)
+    return event.start_datetime if event is not None else None
+
+@metrics.timed
+def resolve_event_ids(event_ids: Iterable[int]) -> Tuple[List[int], List[int]]:
+    """Split ids into (found, missing), each in request order and deduplicated.
+
+    Only the id index is consulted, so lazily-loaded events are not decoded;
+    callers render the found ids from the serialization cache.
+    """
+    ensure_catalog()
+    found, missing = [], []
+    for event_id in dict.fromkeys(event_ids):
+        known = event_id in _events_by_id or event_id in _undecoded
+        (found if known else missing).append(event_id)
+    return found, missing
+
+@metrics.timed
+def upsert_events(batch: List[Event]) -> int:
+    """Insert or replace a batch of events with a single catalog version bump."""
+    with _writing():
+        incoming = {event.id: event for event in batch}
+        if not incoming:
+            return 0
+        replaced = [_events_by_id[event_id] for event_id in incoming if event_id in _events_by_id]
+        _unindex_events(replaced)
+        _index_events(list(incoming.values()))
+        for existing in replaced:
+            update = incoming[existing.id]
+            if update.start_datetime != existing.start_datetime:
+                reminders.move_event(existing.id, update.start_datetime)
+            if update.capacity != existing.capacity:
+                reservations.resize(existing.id, update.capacity)
+        for event in incoming.values():
+            serialization.store_event(event)
+        # Until someone asks for similar events there is no index to maintain.
+        if _similarity_loaded and len(incoming) == 1:
+            similarity.upsert(batch[0])
+        elif _similarity_loaded:
+            similarity.index_many(incoming.values())
+        elif _similarity_changes is not None:
+            _similarity_changes.update(incoming)
+        if _dedupe_index is not None:
+            # Events a deduplicating ingest already signed are skipped.
+            for event in incoming.values():
+                _dedupe_index.add(event)
+        _record_changes("upsert", list(incoming))
+        return len(incoming)
 
+def upsert_event(event: Event) -> Event:
+    upsert_events([event])
+    return event
+
+@metrics.timed
+def delete_event(event_id: int) -> bool:
+    with _writing():
+        existing = _events_by_id.get(event_id)
+        if existing is None:
+            return False
+        _unindex_events([existing])
+        serialization.drop_event(event_id)
+        reminders.cancel_event(event_id)
+        if _similarity_loaded:
+            similarity.remove(event_id)
+        elif _similarity_changes is not None:
+            _similarity_changes.add(event_id)
+        if _dedupe_index is not None:
+            _dedupe_index.remove(event_id)
+        _record_changes("delete", [event_id])
+        return True
+
+@metrics.timed
+def get_similar_events(event_id: int, limit: int = 10) -> List[Event]:
+    _ensure_similarity()
+    similar = [get_event_by_id(other_id) for other_id in similarity.similar_to(event_id, limit)]
+    return [e for e in similar if e is not None]
+
+@metrics.timed
 def filter_events(area: str = None, station: str = None, 
                  start_date: datetime = None, end_date: datetime = None,
                  category: str = None):
-    filtered = events
+    filtered = _scan()
     
     if area:
         filtered = [e for e in filtered if e.location.area == area]
@@ -503,21 +728,101 @@ def filter_events(area: str = None, station: str = None,
     if category:
         filtered = [e for e in filtered if e.category == category]
     
-    return filtered
+    return filtered if isinstance(filtered, list) else list(filtered)
+
+def _page(keys: list, lookup: Callable, after, limit: int, lo: int = 0,
+          predicate: Optional[Callable] = None, hi: Optional[int] = None,
+          ids: bool = False):
+    """Walk a sorted key index from just past ``after`` and collect one page.
+
+    Only keys before ``hi`` can match, and at most MAX_PAGE_SCAN are looked
+    at: with a selective predicate the page may come back short, or empty,
+    with a key to resume from. Returns the page and that key, or None once
+    the index is exhausted. With ``ids`` the page holds ids rather than
+    models, and ``lookup`` is only called when there is a predicate to test.
+    """
+    if after is not None:
+        lo = max(lo, bisect_right(keys, after))
+    hi = len(keys) if hi is None else min(hi, len(keys))
+    stop = min(hi, lo + MAX_PAGE_SCAN)
+    page = []
+    for i in range(lo, stop):
+        item_id = keys[i][-1]
+        if ids and predicate is None:
+            page.append(item_id)
+        else:
+            item = lookup(item_id)
+            if predicate is not None and not predicate(item):
+                continue
+            page.append(item_id if ids else item)
+        if len(page) == limit:
+            return page, keys[i] if i + 1 < hi else None
+    return page, keys[stop - 1] if stop < hi else None
+
+def _event_filter(area: Optional[str], station: Optional[str], start_date: Optional[datetime],
+                  end_date: Optional[datetime], category: Optional[str]):
+    """Return (keys, lo, hi, predicate or None) for paging filtered events."""
+    keys = _event_keys_by_area.get(area, []) if area else _event_keys
+    lo = bisect_left(keys, (start_date,)) if start_date else 0
+    # Events end after they start, so none starting past end_date can match.
+    hi = bisect_right(keys, (end_date, math.inf)) if end_date else None
 
+    def matches(e: Event) -> bool:
+        return ((not station or e.location.station == station) and
+                (not end_date or e.end_datetime <= end_date) and
+                (not category or e.category == category))
+
+    filtered = bool(station or end_date or category)
+    return keys, lo, hi, matches if filtered else None
+
+@metrics.timed
+def filter_events_page(after: Optional[EventKey], limit: int,
+                       area: str = None, station: str = None,
+                       start_date: datetime = None, end_date: datetime = None,
+                       category: str = None) -> Tuple[List[Event], Optional[EventKey]]:
+    ensure_catalog()
+    keys, lo, hi, matches = _event_filter(area, station, start_date, end_date, category)
+    return _page(keys, _event, after, limit, lo, matches, hi)
+
+@metrics.timed
+def filter_event_ids_page(after: Optional[EventKey], limit: int,
+                          area: str = None, station: str = None,
+                          start_date: datetime = None, end_date: datetime = None,
+                          category: str = None) -> Tuple[List[int], Optional[EventKey]]:
+    """Like filter_events_page, but returns ids, for callers that only need cached JSON.
+
+    Events are decoded only to test a filter, and not kept afterwards.
+    """
+    ensure_catalog()
+    keys, lo, hi, matches = _event_filter(area, station, start_date, end_date, category)
+    return _page(keys, _peek_event, after, limit, lo, matches, hi, ids=True)
+
+def _matches_query(e: Event, query: str) -> bool:
+    return (query in e.name.lower() or 
+            query in e.description.lower() or 
+            query in e.category.lower() or 
+            query in e.location.area.lower() or 
+            bool(e.location.station and query in e.location.station.lower()))
+
+@metrics.timed
 def search_events(query: str):
     if not query:
-        return events
+        return get_all_events()
     
     query = query.lower()
-    return [e for e in events if 
-            query in e.name.lower() or 
-            query in e.description.lower() or 
-            query in e.category.lower() or 
-            query in e.location.area.lower() or 
-            (e.location.station and query in e.location.station.lower())]
+    return [e for e in _scan() if _matches_query(e, query)]
+
+@metrics.timed
+def search_events_page(query: str, after: Optional[EventKey],
+                       limit: int) -> Tuple[List[Event], Optional[EventKey]]:
+    ensure_catalog()
+    query = query.lower()
+    matches = (lambda e: _matches_query(e, query)) if query else None
+    return _page(_event_keys, _event, after, limit, predicate=matches)
 
+@metrics.timed
 def get_nearby_places(area: str = None, place_type: str = None):
+    ensure_catalog()
     filtered = nearby_places
     
     if area:
@@ -528,18 +833,39 @@ def get_nearby_places(area: str = None, place_type: str = None):
     
     return filtered
 
+@metrics.timed
+def get_nearby_places_page(area: Optional[str], place_type: str = None,
+                           after: Optional[PlaceKey] = None,
+                           limit: int = 20) -> Tuple[List[NearbyPlace], Optional[PlaceKey]]:
+    ensure_catalog()
+    keys = _place_keys_by_area.get(area, []) if area else _place_keys
+    matches = (lambda p: p.type == place_type) if place_type else None
+    return _page(keys, _places_by_id.get, after, limit, predicate=matches)
+
+def get_nearby_place_ids_page(area: Optional[str], place_type: str = None,
+                              after: Optional[PlaceKey] = None,
+                              limit: int = 20) -> Tuple[List[int], Optional[PlaceKey]]:
+    ensure_catalog()
+    keys = _place_keys_by_area.get(area, []) if area else _place_keys
+    matches = (lambda p: p.type == place_type) if place_type else None
+    return _page(keys, _places_by_id.get, after, limit, predicate=matches, ids=True)
+
 def get_user_by_email(email: str) -> Optional[User]:
     for user in users:
         if user.email == email:
             return user
     return None
 
+def is_admin(user: User) -> bool:
+    return user.email in ADMIN_EMAILS
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+@metrics.timed
 def authenticate_user(email: str, password: str) -> Optional[User]:
     user = get_user_by_email(email)
     if not user:
@@ -558,23 +884,37 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+@metrics.timed
 def create_user(email: str, username: str, password: str) -> User:
-    if get_user_by_email(email):
-        return None
-    
-    user_id = max([u.id for u in users], default=0) + 1
-    new_user = User(id=user_id, email=email, username=username, is_active=True)
-    users.append(new_user)
-    
-    password_hashes[email] = get_password_hash(password)
+    # Hash outside the lock: this runs on the bcrypt pool, several at a time.
+    hashed_password = get_password_hash(password)
+    with _users_lock:
+        if get_user_by_email(email):
+            return None
+        
+        user_id = max([u.id for u in users], default=0) + 1
+        new_user = User(id=user_id, email=email, username=username, is_active=True)
+        password_hashes[email] = hashed_password
+        users.append(new_user)
     
     return new_user
 
+def _publish_user_change(kind: str, op: str, user_id: int, event_id: int):
+    versions = _favorites_versions if kind == "favorites" else _schedule_versions
+    streaming.publish(kind, {"version": versions[user_id], "op": op, "event_id": event_id},
+                      user_id=user_id)
+
+@metrics.timed
 def get_user_favorites(user_id: int) -> List[Event]:
-    user_favorite_ids = [f.event_id for f in favorites if f.user_id == user_id]
-    return [e for e in events if e.id in user_favorite_ids]
+    ensure_catalog()
+    user_favorite_ids = {f.event_id for f in favorites if f.user_id == user_id}
+    return _events_with_ids(user_favorite_ids)
+
+def get_favorite(user_id: int, event_id: int) -> Optional[Favorite]:
+    return next((f for f in favorites if f.user_id == user_id and f.event_id == event_id), None)
 
 def add_favorite(user_id: int, event_id: int) -> Favorite:
+    ensure_catalog()
     for fav in favorites:
         if fav.user_id == user_id and fav.event_id == event_id:
             return fav
@@ -582,20 +922,37 @@ def add_favorite(user_id: int, event_id: int) -> Favorite:
     favorite_id = max([f.id for f in favorites], default=0) + 1
     new_favorite = Favorite(id=favorite_id, user_id=user_id, event_id=event_id)
     favorites.append(new_favorite)
+    _favorites_versions[user_id] += 1
+    _publish_user_change("favorites", "add", user_id, event_id)
+    recommendations.record_interaction(user_id, event_id)
     return new_favorite
 
 def remove_favorite(user_id: int, event_id: int) -> bool:
+    ensure_catalog()
     for i, fav in enumerate(favorites):
         if fav.user_id == user_id and fav.event_id == event_id:
             favorites.pop(i)
+            _favorites_versions[user_id] += 1
+            _publish_user_change("favorites", "remove", user_id, event_id)
+            recommendations.remove_interaction(user_id, event_id)
             return True
     return False
 
+@metrics.timed
 def get_user_schedule(user_id: int) -> List[Event]:
-    user_schedule_ids = [s.event_id for s in schedules if s.user_id == user_id]
-    return [e for e in events if e.id in user_schedule_ids]
+    ensure_catalog()
+    user_schedule_ids = {s.event_id for s in schedules if s.user_id == user_id}
+    return _events_with_ids(user_schedule_ids)
+
+def get_schedule_reminders(user_id: int) -> set:
+    """Ids of the scheduled events the user asked to be reminded about."""
+    return {s.event_id for s in schedules if s.user_id == user_id and s.reminder}
+
+def get_schedule_entry(user_id: int, event_id: int) -> Optional[Schedule]:
+    return next((s for s in schedules if s.user_id == user_id and s.event_id == event_id), None)
 
 def add_to_schedule(user_id: int, event_id: int, reminder: bool = False) -> Schedule:
+    ensure_catalog()
     for sched in schedules:
         if sched.user_id == user_id and sched.event_id == event_id:
             return sched
@@ -603,11 +960,47 @@ def add_to_schedule(user_id: int, event_id: int, reminder: bool = False) -> Sche
     schedule_id = max([s.id for s in schedules], default=0) + 1
     new_schedule = Schedule(id=schedule_id, user_id=user_id, event_id=event_id, reminder=reminder)
     schedules.append(new_schedule)
+    event = _event(event_id) if reminder else None
+    if event is not None:
+        reminders.schedule(user_id, event_id, event.start_datetime)
+    _schedule_versions[user_id] += 1
+    ical.invalidate_user(user_id)
+    _publish_user_change("schedule", "add", user_id, event_id)
+    recommendations.record_interaction(user_id, event_id)
     return new_schedule
 
 def remove_from_schedule(user_id: int, event_id: int) -> bool:
+    ensure_catalog()
     for i, sched in enumerate(schedules):
         if sched.user_id == user_id and sched.event_id == event_id:
             schedules.pop(i)
+            if sched.reminder:
+                reminders.cancel(user_id, event_id)
+            _schedule_versions[user_id] += 1
+            ical.invalidate_user(user_id)
+            _publish_user_change("schedule", "remove", user_id, event_id)
+            recommendations.remove_interaction(user_id, event_id)
             return True
     return False
+
+@metrics.timed
+def get_user_recommendations(user_id: int, limit: int = 10) -> List[Event]:
+    ensure_catalog()
+    event_ids = recommendations.recommend_for_user(user_id, limit)
+    recommended = [get_event_by_id(event_id) for event_id in event_ids]
+    return [e for e in recommended if e is not None]
+
+def get_interactions() -> List[Tuple[int, int]]:
+    """Every (user_id, event_id) favorite and schedule entry, for recommendations."""
+    interactions = [(f.user_id, f.event_id) for f in favorites]
+    interactions.extend((s.user_id, s.event_id) for s in schedules)
+    return interactions
+
+def rebuild_recommendations():
+    recommendations.rebuild(get_interactions())
+
+def rebuild_reminders():
+    """Queue a reminder for every schedule entry that asks for one."""
+    ensure_catalog()
+    starts = ((s.user_id, s.event_id, get_event_start(s.event_id)) for s in schedules if s.reminder)
+    reminders.replace(entry for entry in starts if entry[2] is not None)
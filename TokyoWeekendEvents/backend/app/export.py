@@ -0,0 +1,58 @@
+"""
+Streaming NDJSON export for Tokyo Weekend Events API
+
+Exports walk the same sorted key indexes as paginated endpoints, one page of
+BATCH_SIZE ids at a time, and write each record's cached JSON as one line.
+Pages hold ids, not models: an event is only decoded to test a filter, and
+is dropped again, so memory stays flat however large the catalog grows and
+however it was loaded. Resuming each page from the last key also keeps the
+walk consistent while the catalog changes underneath it.
+
+The lines are produced by async generators. Starlette awaits each send
+before asking for the next chunk, and the server only completes a send once
+the socket can take more. So a slow client slows the export down instead of
+piling it up in memory.
+
+Fetches run on the event loop, like every other store read, so each one must
+be short. The page functions look at no more than MAX_PAGE_SCAN keys per
+call (see ``database._page``), and return a short or empty page when a
+selective filter matches little. Between pages the generator yields to the
+loop, so other requests wait at most one bounded page.
+
+Clients that accept gzip get the stream compressed with a single
+``zlib.compressobj``, which also needs only constant memory.
+"""
+import asyncio
+import zlib
+from typing import AsyncIterator, Callable, List, Optional, Tuple
+
+BATCH_SIZE = 500
+MEDIA_TYPE = "application/x-ndjson"
+COMPRESSION_LEVEL = 6
+
+# fetch(after, limit) -> (record ids, key to resume after or None when done)
+PageFetcher = Callable[[Optional[tuple], int], Tuple[List[int], Optional[tuple]]]
+
+
+async def ndjson(fetch: PageFetcher, encode: Callable[[int], bytes]) -> AsyncIterator[bytes]:
+    """Yield one chunk of newline-terminated records per page."""
+    after = None
+    while True:
+        page, after = fetch(after, BATCH_SIZE)
+        # Pages are bounded by keys scanned, not matches: they may be empty.
+        if page:
+            # Cached JSON may be a memoryview into a snapshot; join takes it as is.
+            yield b"\n".join(encode(record_id) for record_id in page) + b"\n"
+        if after is None:
+            return
+        await asyncio.sleep(0)
+
+
+async def gzipped(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        # zlib holds small inputs back until it has a full block to emit.
+        if compressed:
+            yield compressed
+    yield compressor.flush()
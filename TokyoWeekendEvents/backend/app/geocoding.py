@@ -0,0 +1,215 @@
+"""
+Offline reverse geocoding for Tokyo Weekend Events API
+
+Fills ``Location.station`` and ``Location.area`` from coordinates so that
+events from feeds with missing or inconsistent values still match the exact
+string filters on ``/events`` and ``/nearby``.
+
+Stations (``data/stations.csv``) live in a 2-d tree over a local planar
+projection, so the nearest one is found in O(log n). Areas
+(``data/areas.json``) are coarse neighborhood polygons bucketed into a grid;
+a point is only tested against the few polygons whose bounding boxes touch
+its cell. Walking time is the straight-line distance times a detour factor
+at a fixed walking speed.
+"""
+import csv
+import json
+import math
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.geo import haversine_m
+from app.models import Event, Location
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+STATIONS_FILE = os.path.join(DATA_DIR, "stations.csv")
+AREAS_FILE = os.path.join(DATA_DIR, "areas.json")
+
+MAX_STATION_DISTANCE_M = 2000
+WALKING_METERS_PER_MINUTE = 80
+DETOUR_FACTOR = 1.3
+GRID_DEGREES = 0.01
+
+# Meters per degree around central Tokyo; good enough to order candidates.
+_REFERENCE_LATITUDE = 35.68
+_M_PER_DEG_LAT = 110574.0
+_M_PER_DEG_LON = 111320.0 * math.cos(math.radians(_REFERENCE_LATITUDE))
+
+Polygon = List[Tuple[float, float]]
+
+_stations: List[Tuple[str, float, float]] = []
+_station_index: Dict[str, int] = {}
+# Flat 2-d tree: node i holds station _tree_point[i], split on axis depth % 2.
+_tree_point: List[int] = []
+_tree_left: List[int] = []
+_tree_right: List[int] = []
+_tree_root = -1
+
+_areas: List[Tuple[str, Polygon, Tuple[float, float, float, float]]] = []
+_area_names: set = set()
+_grid: Dict[Tuple[int, int], List[int]] = {}
+_loaded = False
+
+
+def _project(latitude: float, longitude: float) -> Tuple[float, float]:
+    return longitude * _M_PER_DEG_LON, latitude * _M_PER_DEG_LAT
+
+
+def _build_tree(indices: List[int], points: List[Tuple[float, float]], depth: int) -> int:
+    if not indices:
+        return -1
+    axis = depth % 2
+    indices.sort(key=lambda i: points[i][axis])
+    middle = len(indices) // 2
+    node = len(_tree_point)
+    _tree_point.append(indices[middle])
+    _tree_left.append(-1)
+    _tree_right.append(-1)
+    _tree_left[node] = _build_tree(indices[:middle], points, depth + 1)
+    _tree_right[node] = _build_tree(indices[middle + 1:], points, depth + 1)
+    return node
+
+
+def _cell(latitude: float, longitude: float) -> Tuple[int, int]:
+    return int(math.floor(latitude / GRID_DEGREES)), int(math.floor(longitude / GRID_DEGREES))
+
+
+def load(stations_file: str = STATIONS_FILE, areas_file: str = AREAS_FILE):
+    """(Re)build the station tree and the area grid from the data files."""
+    global _tree_root, _loaded
+
+    with open(stations_file, encoding="utf-8", newline="") as stream:
+        stations = [(row["name"], float(row["latitude"]), float(row["longitude"]))
+                    for row in csv.DictReader(stream)]
+    with open(areas_file, encoding="utf-8") as stream:
+        areas = json.load(stream)
+
+    _stations[:] = stations
+    _station_index.clear()
+    _station_index.update((name, i) for i, (name, _, _) in enumerate(stations))
+    del _tree_point[:], _tree_left[:], _tree_right[:]
+    points = [_project(lat, lon) for _, lat, lon in stations]
+    _tree_root = _build_tree(list(range(len(stations))), points, 0)
+
+    _areas.clear()
+    _grid.clear()
+    for name, vertices in areas.items():
+        polygon = [(float(lat), float(lon)) for lat, lon in vertices]
+        lats = [lat for lat, _ in polygon]
+        lons = [lon for _, lon in polygon]
+        bbox = (min(lats), min(lons), max(lats), max(lons))
+        _areas.append((name, polygon, bbox))
+        low, high = _cell(bbox[0], bbox[1]), _cell(bbox[2], bbox[3])
+        for i in range(low[0], high[0] + 1):
+            for j in range(low[1], high[1] + 1):
+                _grid.setdefault((i, j), []).append(len(_areas) - 1)
+    _area_names.clear()
+    _area_names.update(areas)
+    _loaded = True
+
+
+def _ensure_loaded():
+    if not _loaded:
+        load()
+
+
+def nearest_station(latitude: float, longitude: float) -> Optional[Tuple[str, float]]:
+    """Return (station name, straight-line meters) of the closest station."""
+    _ensure_loaded()
+    if _tree_root < 0:
+        return None
+    x, y = _project(latitude, longitude)
+    target = (x, y)
+    best, best_d2 = -1, math.inf
+    stack = [(_tree_root, 0)]
+    while stack:
+        node, depth = stack.pop()
+        if node < 0:
+            continue
+        index = _tree_point[node]
+        _, lat, lon = _stations[index]
+        px, py = _project(lat, lon)
+        d2 = (px - x) ** 2 + (py - y) ** 2
+        if d2 < best_d2:
+            best, best_d2 = index, d2
+        axis = depth % 2
+        diff = target[axis] - (px, py)[axis]
+        near, far = (_tree_left[node], _tree_right[node]) if diff < 0 else \
+            (_tree_right[node], _tree_left[node])
+        # Visit the far side only if the splitting line is closer than the best.
+        if diff * diff < best_d2:
+            stack.append((far, depth + 1))
+        stack.append((near, depth + 1))
+    name, lat, lon = _stations[best]
+    return name, haversine_m(latitude, longitude, lat, lon)
+
+
+def walking_minutes(distance_m: float) -> int:
+    return max(1, round(distance_m * DETOUR_FACTOR / WALKING_METERS_PER_MINUTE))
+
+
+def _contains(polygon: Polygon, latitude: float, longitude: float) -> bool:
+    inside = False
+    j = len(polygon) - 1
+    for i in range(len(polygon)):
+        lat_i, lon_i = polygon[i]
+        lat_j, lon_j = polygon[j]
+        if (lat_i > latitude) != (lat_j > latitude):
+            crossing = lon_i + (latitude - lat_i) * (lon_j - lon_i) / (lat_j - lat_i)
+            if longitude < crossing:
+                inside = not inside
+        j = i
+    return inside
+
+
+def area_at(latitude: float, longitude: float) -> Optional[str]:
+    _ensure_loaded()
+    for index in _grid.get(_cell(latitude, longitude), ()):
+        name, polygon, (min_lat, min_lon, max_lat, max_lon) = _areas[index]
+        if (min_lat <= latitude <= max_lat and min_lon <= longitude <= max_lon
+                and _contains(polygon, latitude, longitude)):
+            return name
+    return None
+
+
+def fill_location(location: Location) -> Location:
+    """Return ``location`` with station, walking time and area filled in.
+
+    Values the feed supplied are kept when they name a known station or area;
+    anything else is replaced by the geocoded value when there is one.
+    """
+    _ensure_loaded()
+    latitude = location.coordinates.latitude
+    longitude = location.coordinates.longitude
+    update = {}
+
+    station = location.station
+    if station and station not in _station_index and station + "駅" in _station_index:
+        station = update["station"] = station + "駅"
+    if station in _station_index:
+        if location.walking_minutes is None:
+            _, lat, lon = _stations[_station_index[station]]
+            update["walking_minutes"] = walking_minutes(haversine_m(latitude, longitude, lat, lon))
+    elif not station:
+        found = nearest_station(latitude, longitude)
+        if found is not None and found[1] <= MAX_STATION_DISTANCE_M:
+            update["station"] = found[0]
+            update["walking_minutes"] = walking_minutes(found[1])
+
+    if location.area not in _area_names:
+        area = area_at(latitude, longitude)
+        if area is not None:
+            update["area"] = area
+
+    return location.model_copy(update=update) if update else location
+
+
+def fill_events(events: Iterable[Event]) -> List[Event]:
+    """Batch form of ``fill_location`` for ingestion."""
+    filled = []
+    for event in events:
+        location = fill_location(event.location)
+        if location is not event.location:
+            event = event.model_copy(update={"location": location})
+        filled.append(event)
+    return filled
@@ -0,0 +1,174 @@
+"""
+Conditional GET and response body caching for Tokyo Weekend Events API
+
+Read endpoints derive a strong ETag from the store's version counters and the
+request's query string, so an unchanged resource can be answered with
+``304 Not Modified`` before any filtering or serialization happens.
+
+Because the ETag changes with every catalog version, it also keys a small LRU
+of finished response bodies. Cached bodies are stored together with their
+gzip and brotli variants, compressed once per version and picked by
+``Accept-Encoding``; uncached bodies above a size threshold are compressed on
+the fly instead.
+"""
+import gzip
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request, Response
+
+from app.database_updated import get_catalog_epoch
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+COMPRESSION_THRESHOLD = 1024
+MAX_CACHED_BODIES = 256
+MAX_TRACKED_KEYS = 10000
+POPULAR_AFTER = 2
+ENCODINGS: Tuple[str, ...] = ("br", "gzip") if brotli is not None else ("gzip",)
+FORWARDED_HEADERS = ("x-next-cursor", "link")
+
+def make_etag(request: Request, *versions) -> str:
+    # Versions restart from zero with the catalog, so every tag is scoped to
+    # the epoch it was issued under; workers sharing a catalog share one.
+    parts = [get_catalog_epoch(), request.url.path, request.url.query]
+    parts.extend(str(v) for v in versions)
+    digest = hashlib.blake2b("\0".join(parts).encode(), digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+
+def _matching_tag(request: Request, etag: str) -> Optional[str]:
+    """The tag in If-None-Match that names a representation of ``etag``, if any."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    if header.strip() == "*":
+        return etag
+    # If-None-Match uses the weak comparison function (RFC 9110, 13.1.2).
+    for tag in header.split(","):
+        tag = tag.strip()
+        if _base_etag(tag.removeprefix("W/")) == etag:
+            return tag
+    return None
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    return _matching_tag(request, etag) is not None
+
+
+def _encoded_etag(etag: str, encoding: Optional[str]) -> str:
+    # Each content-coding is a distinct representation and needs its own tag.
+    return f'{etag[:-1]}-{encoding}"' if encoding else etag
+
+
+def _base_etag(tag: str) -> str:
+    for encoding in ENCODINGS:
+        suffix = f'-{encoding}"'
+        if tag.endswith(suffix):
+            return tag[:-len(suffix)] + '"'
+    return tag
+
+
+def not_modified(request: Request, etag: str) -> Response:
+    # Repeat the validator the client holds, which may be an encoded variant's.
+    return Response(status_code=304, headers={"ETag": _matching_tag(request, etag) or etag})
+
+
+class _CachedBody:
+    __slots__ = ("media_type", "headers", "variants")
+
+    def __init__(self, body: bytes, media_type: str, headers: Dict[str, str]):
+        self.media_type = media_type
+        self.headers = headers
+        self.variants = {None: body}
+        if len(body) >= COMPRESSION_THRESHOLD:
+            for encoding in ENCODINGS:
+                self.variants[encoding] = _compress(body, encoding)
+
+
+_bodies: "OrderedDict[str, _CachedBody]" = OrderedDict()
+_requests_seen: Dict[str, int] = {}
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+
+def choose_encoding(request: Request, offered: Tuple[str, ...] = ENCODINGS) -> Optional[str]:
+    header = request.headers.get("accept-encoding")
+    if not header:
+        return None
+    weights = {}
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding.strip().lower()] = q
+    for encoding in offered:
+        if weights.get(encoding, weights.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def _encoded_response(request: Request, etag: str, body: bytes, media_type: str,
+                      headers: Dict[str, str], variants: Optional[Dict] = None) -> Response:
+    encoding = choose_encoding(request)
+    if variants is not None:
+        encoding = encoding if encoding in variants else None
+        content = variants[encoding]
+    elif encoding and len(body) >= COMPRESSION_THRESHOLD:
+        content = _compress(body, encoding)
+    else:
+        encoding = None
+        content = body
+    headers = dict(headers, ETag=_encoded_etag(etag, encoding), Vary="Accept-Encoding")
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=content, media_type=media_type, headers=headers)
+
+
+def is_popular(etag: str) -> bool:
+    """Count a request for this representation; True once it is worth caching."""
+    if len(_requests_seen) >= MAX_TRACKED_KEYS:
+        _requests_seen.clear()
+    seen = _requests_seen.get(etag, 0) + 1
+    _requests_seen[etag] = seen
+    return seen >= POPULAR_AFTER
+
+
+def cached_response(request: Request, etag: str) -> Optional[Response]:
+    entry = _bodies.get(etag)
+    if entry is None:
+        return None
+    _bodies.move_to_end(etag)
+    return _encoded_response(request, etag, entry.variants[None], entry.media_type,
+                             entry.headers, entry.variants)
+
+
+def finalize(request: Request, response: Response, etag: str, cache: bool = False) -> Response:
+    """Tag a freshly built response and pick (or produce) its encoded variant.
+
+    With ``cache`` set, the body and its precompressed variants are kept for
+    the lifetime of this ETag.
+    """
+    headers = {name: response.headers[name] for name in FORWARDED_HEADERS
+               if name in response.headers}
+    media_type = response.media_type or "application/json"
+    if not cache:
+        return _encoded_response(request, etag, response.body, media_type, headers)
+    entry = _CachedBody(response.body, media_type, headers)
+    _bodies[etag] = entry
+    while len(_bodies) > MAX_CACHED_BODIES:
+        _bodies.popitem(last=False)
+    return _encoded_response(request, etag, response.body, media_type, headers, entry.variants)
@@ -0,0 +1,207 @@
+"""
+iCalendar feeds for Tokyo Weekend Events API
+
+Each user has a private feed of their schedule, and there are public feeds
+of events by category and area. Calendar apps cannot send a bearer token, so
+the private feed URL carries a feed token instead. The feed token is the user
+id signed with HMAC. It does not expire, and rotating SECRET_KEY revokes all
+feed tokens.
+
+Calendar apps poll feeds often, so every rendered feed is kept together with
+the store versions it was rendered from and its ETag. A poll looks the feed
+up by key, compares versions, and usually answers ``304`` or the cached body
+without touching the store. A feed that is missing or stale is rendered as
+a stream of VEVENT chunks and enters the cache once the stream completes.
+Schedule changes drop the user's feed right away, and catalog changes make
+the other feeds stale through the version check. Streams finish, and so
+store feeds, in threadpool threads, so the cache is guarded by a lock.
+"""
+import hashlib
+import hmac
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Collection, Iterable, Iterator, List, Optional, Tuple
+
+from app import reminders
+from app.models import Event
+
+MEDIA_TYPE = "text/calendar; charset=utf-8"
+EVENTS_PER_CHUNK = 64
+MAX_CACHED_FEEDS = 10000
+MAX_CACHED_BYTES = 64 * 1024 * 1024
+# Larger feeds are streamed every time rather than crowding out the rest.
+MAX_CACHED_FEED_BYTES = 4 * 1024 * 1024
+UID_DOMAIN = "tokyo-weekend-events"
+TIMEZONE = "Asia/Tokyo"
+
+_CALENDAR_HEADER = (
+    "BEGIN:VCALENDAR\r\n"
+    "VERSION:2.0\r\n"
+    "PRODID:-//Tokyo Weekend Events//Feeds//JA\r\n"
+    "CALSCALE:GREGORIAN\r\n"
+    "METHOD:PUBLISH\r\n"
+    "{name}"
+    "X-WR-TIMEZONE:Asia/Tokyo\r\n"
+    "BEGIN:VTIMEZONE\r\n"
+    "TZID:Asia/Tokyo\r\n"
+    "BEGIN:STANDARD\r\n"
+    "DTSTART:19700101T000000\r\n"
+    "TZOFFSETFROM:+0900\r\n"
+    "TZOFFSETTO:+0900\r\n"
+    "TZNAME:JST\r\n"
+    "END:STANDARD\r\n"
+    "END:VTIMEZONE\r\n"
+)
+_CALENDAR_FOOTER = b"END:VCALENDAR\r\n"
+
+FeedKey = Tuple
+
+
+class _Feed:
+    __slots__ = ("versions", "etag", "body")
+
+    def __init__(self, versions: tuple, etag: str, body: bytes):
+        self.versions = versions
+        self.etag = etag
+        self.body = body
+
+
+_feeds: "OrderedDict[FeedKey, _Feed]" = OrderedDict()
+_cached_bytes = 0
+_lock = threading.Lock()
+
+
+def feed_token(user_id: int, secret: str) -> str:
+    signature = hmac.new(secret.encode(), f"ics:{user_id}".encode(), hashlib.sha256).hexdigest()
+    return f"{user_id}-{signature[:32]}"
+
+
+def feed_user(token: str, secret: str) -> Optional[int]:
+    """The user id a feed token was issued for, or None if it is not genuine."""
+    user_id, _, _ = token.partition("-")
+    if not user_id.isdigit():
+        return None
+    return int(user_id) if hmac.compare_digest(token, feed_token(int(user_id), secret)) else None
+
+
+def lookup(key: FeedKey, versions: tuple) -> Optional[_Feed]:
+    with _lock:
+        feed = _feeds.get(key)
+        if feed is None or feed.versions != versions:
+            return None
+        _feeds.move_to_end(key)
+        return feed
+
+
+def _store(key: FeedKey, feed: _Feed):
+    global _cached_bytes
+    if len(feed.body) > MAX_CACHED_FEED_BYTES:
+        return
+    with _lock:
+        _drop(key)
+        _feeds[key] = feed
+        _cached_bytes += len(feed.body)
+        while len(_feeds) > MAX_CACHED_FEEDS or _cached_bytes > MAX_CACHED_BYTES:
+            _, evicted = _feeds.popitem(last=False)
+            _cached_bytes -= len(evicted.body)
+
+
+def invalidate(key: FeedKey):
+    with _lock:
+        _drop(key)
+
+
+def _drop(key: FeedKey):
+    global _cached_bytes
+    feed = _feeds.pop(key, None)
+    if feed is not None:
+        _cached_bytes -= len(feed.body)
+
+
+def user_key(user_id: int) -> FeedKey:
+    return ("user", user_id)
+
+
+def invalidate_user(user_id: int):
+    invalidate(user_key(user_id))
+
+
+def _text(value: str) -> str:
+    return (value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def _line(name: str, value: str) -> bytes:
+    """One content line, folded at 75 octets without splitting a UTF-8 sequence."""
+    data = f"{name}:{value}".encode()
+    if len(data) <= 75:
+        return data + b"\r\n"
+    parts = []
+    start, limit = 0, 75
+    while start < len(data):
+        end = min(start + limit, len(data))
+        while end < len(data) and data[end] & 0xC0 == 0x80:
+            end -= 1
+        parts.append(data[start:end])
+        # Continuation lines begin with a space, which counts towards the 75.
+        start, limit = end, 74
+    return b"\r\n ".join(parts) + b"\r\n"
+
+
+def _local(value: datetime) -> str:
+    return value.strftime("%Y%m%dT%H%M%S")
+
+
+def vevent(event: Event, stamp: str, reminder: bool = False) -> bytes:
+    location = event.location
+    lines = [
+        b"BEGIN:VEVENT\r\n",
+        _line("UID", f"event-{event.id}@{UID_DOMAIN}"),
+        _line("DTSTAMP", stamp),
+        _line(f"DTSTART;TZID={TIMEZONE}", _local(event.start_datetime)),
+        _line(f"DTEND;TZID={TIMEZONE}", _local(event.end_datetime)),
+        _line("SUMMARY", _text(event.name)),
+        _line("DESCRIPTION", _text(event.description)),
+        _line("LOCATION", _text(f"{location.name}, {location.address}")),
+        _line("GEO", f"{location.coordinates.latitude};{location.coordinates.longitude}"),
+        _line("CATEGORIES", _text(event.category)),
+    ]
+    if event.external_links.website:
+        lines.append(_line("URL", str(event.external_links.website)))
+    if reminder:
+        minutes = int(reminders.LEAD_TIME.total_seconds() // 60)
+        lines += [
+            b"BEGIN:VALARM\r\n",
+            _line("TRIGGER", f"-PT{minutes}M"),
+            b"ACTION:DISPLAY\r\n",
+            _line("DESCRIPTION", _text(event.name)),
+            b"END:VALARM\r\n",
+        ]
+    lines.append(b"END:VEVENT\r\n")
+    return b"".join(lines)
+
+
+def render(name: str, events: Iterable[Event],
+           reminder_ids: Collection[int] = ()) -> Iterator[bytes]:
+    """Yield a calendar of ``events`` in chunks of EVENTS_PER_CHUNK VEVENTs."""
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    yield _CALENDAR_HEADER.format(name=_line("X-WR-CALNAME", _text(name)).decode()).encode()
+    chunk: List[bytes] = []
+    for event in events:
+        chunk.append(vevent(event, stamp, event.id in reminder_ids))
+        if len(chunk) == EVENTS_PER_CHUNK:
+            yield b"".join(chunk)
+            chunk = []
+    if chunk:
+        yield b"".join(chunk)
+    yield _CALENDAR_FOOTER
+
+
+def caching(key: FeedKey, versions: tuple, etag: str, chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """Pass ``chunks`` through, caching the whole feed once the last one is sent."""
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    _store(key, _Feed(versions, etag, b"".join(parts)))
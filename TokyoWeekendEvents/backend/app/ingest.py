@@ -0,0 +1,279 @@
+"""
+Streaming bulk event ingestion for Tokyo Weekend Events API
+
+Events are read from JSONL or CSV one chunk at a time, validated as pydantic
+``Event`` models across a process pool and handed to the store in batches,
+one catalog version bump per batch. Only a bounded number of chunks is ever
+in flight, so memory stays flat no matter how large the input is.
+
+Load a file into a running server's catalog:
+
+    python -m app.ingest events.jsonl --url http://localhost:8000 --token <admin token>
+
+Without ``--url`` the file is validated and loaded into a local store, which
+is useful for checking a feed and measuring throughput. ``--dedupe merge`` or
+``--dedupe flag`` adds the near-duplicate stage from ``app.dedupe``. Missing or
+unknown stations and areas are filled in by ``app.geocoding``.
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from pydantic import ValidationError
+
+from app import geocoding
+from app.clock import TOKYO
+from app.dedupe import MODES as DEDUPE_MODES, Deduplicator, signature
+from app.models import Event, IngestError, IngestReport
+
+CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+FORMATS = ("jsonl", "csv")
+
+Record = Tuple[int, object]
+ChunkResult = Tuple[List[Event], List[Tuple[int, str]], Optional[List[bytes]]]
+
+class InvalidHeader(ValueError):
+    pass
+
+
+def detect_format(name: Optional[str]) -> str:
+    if name and name.lower().endswith(".csv"):
+        return "csv"
+    return "jsonl"
+
+
+def _unflatten(row: Dict[str, str]) -> dict:
+    """Turn CSV columns like ``location.coordinates.latitude`` into nested dicts."""
+    nested: dict = {}
+    for column, value in row.items():
+        if column is None or value is None or value == "":
+            continue
+        target = nested
+        *parents, leaf = column.strip().split(".")
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        target[leaf] = value
+    return nested
+
+
+def _undecodable(value) -> bool:
+    """True if ``value`` holds bytes that were not UTF-8 (see ``iter_records``)."""
+    if isinstance(value, dict):
+        return any(_undecodable(v) for v in value.values())
+    try:
+        value.encode()
+    except UnicodeEncodeError:
+        return True
+    return False
+
+
+def _check_header(columns: List[str]):
+    """Reject CSV columns that cannot be unflattened into one record."""
+    if any(_undecodable(column) for column in columns):
+        raise InvalidHeader("CSV header is not valid UTF-8")
+    paths = {column.strip() for column in columns}
+    for path in paths:
+        parts = path.split(".")
+        for i in range(1, len(parts)):
+            parent = ".".join(parts[:i])
+            if parent in paths:
+                raise InvalidHeader(f"CSV columns {parent!r} and {path!r} conflict")
+
+
+def iter_records(stream: TextIO, fmt: str) -> Iterator[Record]:
+    """Yield (line number, raw record) pairs without reading the whole stream.
+
+    Open ``stream`` with ``errors="surrogateescape"``: bytes that are not
+    UTF-8 then fail validation as errors of their own record instead of
+    aborting the whole stream. A CSV header that cannot be unflattened
+    raises InvalidHeader before any record is yielded.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        _check_header(reader.fieldnames or [])
+        for row in reader:
+            record = _unflatten(row)
+            # A CSV row cannot express an empty object, so no links means {}.
+            record.setdefault("external_links", {})
+            yield reader.line_num, record
+        return
+    for line_number, line in enumerate(stream, start=1):
+        if line.strip():
+            yield line_number, line
+
+
+def _to_local_time(event: Event) -> Event:
+    """Convert offsets in a feed to the naive Tokyo time events are kept in."""
+    update = {}
+    for name in ("start_datetime", "end_datetime"):
+        value = getattr(event, name)
+        if value.tzinfo is not None:
+            update[name] = value.astimezone(TOKYO).replace(tzinfo=None)
+    return event.model_copy(update=update) if update else event
+
+
+def _validate_chunk(chunk: List[Record], with_signatures: bool = False) -> ChunkResult:
+    valid: List[Event] = []
+    errors: List[Tuple[int, str]] = []
+    for line_number, raw in chunk:
+        if _undecodable(raw):
+            errors.append((line_number, "record: not valid UTF-8"))
+            continue
+        try:
+            if isinstance(raw, str):
+                event = Event.model_validate_json(raw)
+            else:
+                event = Event.model_validate(raw)
+        except ValidationError as exc:
+            errors.append((line_number, "; ".join(
+                f"{'.'.join(str(p) for p in err['loc']) or 'record'}: {err['msg']}"
+                for err in exc.errors()
+            )))
+            continue
+        valid.append(_to_local_time(event))
+    valid = geocoding.fill_events(valid)
+    # MinHash signatures are the expensive part of deduplication, so they are
+    # computed here, in parallel, rather than in the parent process.
+    signatures = [signature(e) for e in valid] if with_signatures else None
+    return valid, errors, signatures
+
+
+def _chunks(records: Iterable[Record], size: int) -> Iterator[List[Record]]:
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def process_pool(workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """A validation pool whose workers are spawned, never forked.
+
+    Forking a multithreaded server copies locks other threads may be holding
+    at that moment, which can deadlock the child.
+    """
+    return ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1,
+                               mp_context=multiprocessing.get_context("spawn"))
+
+
+def ingest(records: Iterable[Record], apply_batch: Callable[[List[Event]], int],
+           chunk_size: int = CHUNK_SIZE, workers: Optional[int] = None,
+           deduplicator: Optional[Deduplicator] = None,
+           pool: Optional[Executor] = None) -> IngestReport:
+    """Validate ``records`` chunk by chunk and pass each valid batch to ``apply_batch``.
+
+    Batches are applied in input order, after ``deduplicator`` (if any) has
+    merged or flagged near-duplicates. Chunks are validated on ``pool``, or
+    on a pool of ``workers`` processes started for this call.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    report = IngestReport()
+    started = time.perf_counter()
+
+    def collect(result: ChunkResult):
+        valid, errors, signatures = result
+        report.received += len(valid) + len(errors)
+        report.rejected += len(errors)
+        for line_number, error in errors:
+            if len(report.errors) < MAX_REPORTED_ERRORS:
+                report.errors.append(IngestError(line=line_number, error=error))
+        if deduplicator is not None:
+            valid = deduplicator.process(valid, signatures)
+        if valid:
+            report.upserted += apply_batch(valid)
+            report.batches += 1
+
+    chunks = _chunks(records, chunk_size)
+    validate = partial(_validate_chunk, with_signatures=deduplicator is not None)
+    if workers <= 1:
+        for chunk in chunks:
+            collect(validate(chunk))
+    elif pool is not None:
+        _ingest_parallel(pool, validate, chunks, workers * 2, collect)
+    else:
+        with process_pool(workers) as own_pool:
+            _ingest_parallel(own_pool, validate, chunks, workers * 2, collect)
+
+    if deduplicator is not None:
+        report.duplicates = deduplicator.duplicates
+        report.duplicate_matches = deduplicator.matches
+    report.seconds = time.perf_counter() - started
+    if report.seconds > 0:
+        report.events_per_second = report.received / report.seconds
+    return report
+
+
+def _ingest_parallel(pool: Executor, validate: Callable, chunks: Iterator[List[Record]],
+                     max_in_flight: int, collect: Callable):
+    in_flight: deque = deque()
+    for chunk in chunks:
+        in_flight.append(pool.submit(validate, chunk))
+        if len(in_flight) >= max_in_flight:
+            collect(in_flight.popleft().result())
+    while in_flight:
+        collect(in_flight.popleft().result())
+
+
+def _upload(path: str, fmt: str, url: str, token: str, dedupe: Optional[str]) -> dict:
+    from urllib.request import Request, urlopen
+
+    endpoint = f"{url.rstrip('/')}/admin/events/ingest?format={fmt}"
+    if dedupe:
+        endpoint += f"&dedupe={dedupe}"
+    with open(path, "rb") as body:
+        request = Request(endpoint, data=body, method="POST", headers={
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "text/csv" if fmt == "csv" else "application/x-ndjson",
+            "Content-Length": str(os.path.getsize(path)),
+        })
+        with urlopen(request) as response:
+            return json.load(response)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Stream events from JSONL/CSV into the catalog")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=FORMATS)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--dedupe", choices=DEDUPE_MODES, help="Merge or flag near-duplicates")
+    parser.add_argument("--url", help="Base URL of a running API to load into")
+    parser.add_argument("--token", help="Admin bearer token for --url")
+    args = parser.parse_args(argv)
+    fmt = args.format or detect_format(args.path)
+
+    if args.url:
+        if not args.token:
+            parser.error("--url requires --token")
+        result = _upload(args.path, fmt, args.url, args.token, args.dedupe)
+    else:
+        from app.database_updated import coalesced_writes, dedupe_index, upsert_events
+
+        deduplicator = None
+        if args.dedupe:
+            deduplicator = Deduplicator(args.dedupe, index=dedupe_index())
+        with open(args.path, encoding="utf-8", errors="surrogateescape", newline="") as stream, \
+                coalesced_writes():
+            try:
+                result = ingest(iter_records(stream, fmt), upsert_events,
+                                args.chunk_size, args.workers, deduplicator).model_dump()
+            except InvalidHeader as exc:
+                parser.error(str(exc))
+    json.dump(result, sys.stdout, ensure_ascii=False, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,150 @@
+import asyncio
+import io
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 from typing import List, Optional
-from fastapi import FastAPI, Query, HTTPException, Depends, status
+from fastapi import FastAPI, Query, Header, HTTPException, Depends, Request, Response, status
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from starlette.concurrency import run_in_threadpool
+import anyio
 from jose import JWTError, jwt
 
-from app.models import Event, RouteOption, NearbyPlace, User, UserCreate, UserLogin, Token, Favorite, Schedule
+from app.dedupe import Deduplicator
+from app.ingest import FORMATS, InvalidHeader, ingest, iter_records, process_pool
+from app.models import AllocationReport, Availability, CalendarFeed, Event, EventBatch, EventBatchRequest, EventBundle, EventChanges, IngestReport, SnapshotInfo, RouteOption, NearbyPlace, User, UserCreate, UserLogin, Token, Favorite, Schedule, Reservation
+from app.serialization import (
+    SUMMARY, event_ids_json, event_json, events_json, object_json, parse_fields, place_json,
+    places_json, project, project_ids, to_json
+)
+from app import export, ical, metrics, profiling, recommendations, reminders, reservations, streaming
+from app.metrics import MetricsMiddleware
+from app.profiling import ProfilingMiddleware
+from app.rate_limit import TOKEN_CACHE_SECONDS, Limit, RateLimitMiddleware
+from app.http_cache import (
+    cached_response, choose_encoding, etag_matches, finalize, is_popular, make_etag, not_modified
+)
+from app.pagination import (
+    decode_event_cursor, decode_place_cursor, encode_event_cursor, encode_place_cursor
+)
 from app.database_updated import (
-    get_all_events, get_event_by_id, filter_events, get_nearby_places, search_events,
+    get_all_events, get_event_by_id, get_event_start, resolve_event_ids, filter_events, get_nearby_places, search_events,
+    filter_events_page, search_events_page, get_nearby_places_page,
+    filter_event_ids_page, get_nearby_place_ids_page,
     authenticate_user, create_user, create_access_token, get_user_by_email,
-    get_user_favorites, add_favorite, remove_favorite,
-    get_user_schedule, add_to_schedule, remove_from_schedule,
+    get_user_favorites, get_favorite, add_favorite, remove_favorite,
+    get_user_schedule, get_schedule_reminders, get_schedule_entry, add_to_schedule, remove_from_schedule,
+    get_user_recommendations, get_interactions, get_similar_events,
+    similarity_ready, start_similarity_build, build_similarity, install_similarity,
+    abandon_similarity_build,
+    get_catalog_version, get_favorites_version, get_schedule_version,
+    get_changes_since, get_catalog_epoch, upsert_events, is_admin, ensure_catalog, write_snapshot,
+    dedupe_index, coalesced_writes,
     SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
 )
 
-app = FastAPI(title="Tokyo Weekend Events API")
+RECOMMENDATION_REBUILD_SECONDS = 15 * 60
+
+async def rebuild_recommendations_periodically():
+    while True:
+        await asyncio.sleep(RECOMMENDATION_REBUILD_SECONDS)
+        # Favorites and schedules are written on the loop, so the snapshot and
+        # the swap happen here; only the build itself runs off the loop.
+        recommendations.start_rebuild()
+        try:
+            index = await run_in_threadpool(recommendations.build, get_interactions())
+        except BaseException:
+            recommendations.abandon_rebuild()
+            raise
+        recommendations.install(index)
+
+# The similarity build in flight, shared by every request waiting on it.
+_similarity_build: Optional[asyncio.Future] = None
+
+async def _build_similarity():
+    global _similarity_build
+    # Same split as recommendations: writes are noted on the loop while the
+    # index is built off it, then replayed onto it at the swap.
+    event_ids = start_similarity_build()
+    try:
+        index = await run_in_threadpool(build_similarity, event_ids)
+    except BaseException:
+        abandon_similarity_build()
+        raise
+    finally:
+        _similarity_build = None
+    install_similarity(index)
+
+async def ensure_similarity():
+    global _similarity_build
+    # A catalog replaced mid-build leaves the index unbuilt, so go again.
+    while not similarity_ready():
+        if _similarity_build is None:
+            _similarity_build = asyncio.ensure_future(_build_similarity())
+        await asyncio.shield(_similarity_build)
+
+async def deliver_reminders():
+    # Checking a reminder against its event needs the catalog; wait for it off the loop.
+    await run_in_threadpool(ensure_catalog)
+    if reminders.SNAPSHOT_PATH and os.path.exists(reminders.SNAPSHOT_PATH):
+        await run_in_threadpool(reminders.load_snapshot, reminders.SNAPSHOT_PATH)
+    await reminders.run(reminders.default_sink(), get_event_start)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tasks = [
+        # Load the catalog in the background; the worker starts serving at once.
+        asyncio.create_task(run_in_threadpool(ensure_catalog)),
+        asyncio.create_task(rebuild_recommendations_periodically()),
+        asyncio.create_task(streaming.heartbeat()),
+        asyncio.create_task(deliver_reminders()),
+    ]
+    if reminders.SNAPSHOT_PATH:
+        tasks.append(asyncio.create_task(reminders.snapshot_periodically(reminders.SNAPSHOT_PATH)))
+    yield
+    for task in tasks:
+        task.cancel()
+    ingest_pool.shutdown(wait=False, cancel_futures=True)
+    if reminders.SNAPSHOT_PATH:
+        reminders.write_snapshot(reminders.SNAPSHOT_PATH)
+
+app = FastAPI(title="Tokyo Weekend Events API", lifespan=lifespan)
+
+def token_subject(token: str) -> Optional[str]:
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except JWTError:
+        return None
+
+# Requests per period per client on CPU-heavy routes (bcrypt, search, routing).
+RATE_LIMITS = {
+    ("POST", "/token"): Limit(5, 60),
+    ("POST", "/users/register"): Limit(3, 60),
+    ("GET", "/events/search"): Limit(10, 1, burst=20, per="user"),
+    ("GET", "/events/{event_id}/routes"): Limit(5, 1, burst=10, per="user"),
+    ("GET", "/events/{event_id}/bundle"): Limit(5, 1, burst=10, per="user"),
+    ("POST", "/events/{event_id}/reserve"): Limit(10, 1, burst=20, per="user"),
+    ("GET", "/export/events.ndjson"): Limit(10, 60),
+    ("GET", "/export/places.ndjson"): Limit(10, 60),
+}
+
+def token_is_admin(token: str) -> bool:
+    email = token_subject(token)
+    user = email and get_user_by_email(email)
+    return bool(user) and is_admin(user)
+
+# Innermost first: requests are timed once routed, and rate limit
+# rejections (counted separately) still carry CORS headers.
+app.add_middleware(ProfilingMiddleware, authorize=token_is_admin)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(RateLimitMiddleware, limits=RATE_LIMITS, identify=token_subject,
+                   token_ttl=min(TOKEN_CACHE_SECONDS, ACCESS_TOKEN_EXPIRE_MINUTES * 60))
 
 app.add_middleware(
     CORSMiddleware,
@@ -25,6 +155,7 @@ app.add_middleware(
 )
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
@@ -44,61 +175,198 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         raise credentials_exception
     return user
 
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 200
+
+def decode_cursor(decoder, cursor: Optional[str]):
+    if cursor is None:
+        return None
+    try:
+        return decoder(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def set_next_cursor(request: Request, response: Response, cursor: Optional[str]):
+    if cursor is None:
+        return response
+    response.headers["X-Next-Cursor"] = cursor
+    next_url = request.url.include_query_params(cursor=cursor)
+    response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return response
+
+FIELDS_DESCRIPTION = "Comma-separated Event fields to return, or 'summary' for EventSummary"
+
+def parse_fields_param(fields: Optional[str]):
+    try:
+        return parse_fields(fields)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+def parse_date(value: Optional[str], name: str) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name} format. Use YYYY-MM-DD")
+
+def json_response(body: bytes) -> Response:
+    return Response(content=body, media_type="application/json")
+
+def render_events(events: List[Event], fields=None) -> Response:
+    """Assemble a list response from the cached per-event JSON fragments."""
+    if fields is None:
+        return json_response(events_json(events))
+    if fields == (SUMMARY,):
+        return json_response(events_json(events, summary=True))
+    return JSONResponse(project(events, fields))
+
+async def get_current_admin(current_user: User = Depends(get_current_user)):
+    if not is_admin(current_user):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="管理者権限が必要です",
+        )
+    return current_user
+
+@app.get("/metrics", include_in_schema=False)
+async def read_metrics():
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to Tokyo Weekend Events API"}
 
 @app.get("/events", response_model=List[Event])
 async def read_events(
+    request: Request,
     area: Optional[str] = Query(None, description="Filter by area (e.g., 北千住, 池袋)"),
     station: Optional[str] = Query(None, description="Filter by station (e.g., 新宿駅, 東京駅)"),
     start_date: Optional[str] = Query(None, description="Filter by start date (YYYY-MM-DD)"),
     end_date: Optional[str] = Query(None, description="Filter by end date (YYYY-MM-DD)"),
-    category: Optional[str] = Query(None, description="Filter by category")
+    category: Optional[str] = Query(None, description="Filter by category"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE,
+                                 description="Page size; enables pagination ordered by start time"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from X-Next-Cursor"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION)
 ):
-    start_datetime = None
-    end_datetime = None
+    etag = make_etag(request, get_catalog_version())
+    if etag_matches(request, etag):
+        return not_modified(request, etag)
+    cached = cached_response(request, etag)
+    if cached is not None:
+        return cached
     
-    if start_date:
-        try:
-            start_datetime = datetime.strptime(start_date, "%Y-%m-%d")
-        except ValueError:
-            raise HTTPException(status_code=400, detail="Invalid start_date format. Use YYYY-MM-DD")
+    projection = parse_fields_param(fields)
+    # The unfiltered catalog is always worth caching; filtered views once popular.
+    cache = not request.url.query or is_popular(etag)
+    start_datetime = parse_date(start_date, "start_date")
+    end_datetime = parse_date(end_date, "end_date")
     
-    if end_date:
-        try:
-            end_datetime = datetime.strptime(end_date, "%Y-%m-%d")
-        except ValueError:
-            raise HTTPException(status_code=400, detail="Invalid end_date format. Use YYYY-MM-DD")
+    if limit is None and cursor is None:
+        events = filter_events(area, station, start_datetime, end_datetime, category)
+        return finalize(request, render_events(events, projection), etag, cache)
     
-    return filter_events(area, station, start_datetime, end_datetime, category)
+    after = decode_cursor(decode_event_cursor, cursor)
+    page, next_key = filter_events_page(after, limit or DEFAULT_PAGE_SIZE, area, station,
+                                        start_datetime, end_datetime, category)
+    response = set_next_cursor(request, render_events(page, projection),
+                               next_key and encode_event_cursor(next_key))
+    return finalize(request, response, etag, cache)
 
 @app.get("/events/search", response_model=List[Event])
-async def search_events_endpoint(query: str = Query(..., description="Search query")):
-    results = search_events(query)
-    if not results:
-        return []
-    return results
+async def search_events_endpoint(
+    request: Request,
+    query: str = Query(..., description="Search query"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE,
+                                 description="Page size; enables pagination ordered by start time"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from X-Next-Cursor"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION)
+):
+    projection = parse_fields_param(fields)
+    if limit is not None or cursor is not None:
+        after = decode_cursor(decode_event_cursor, cursor)
+        page, next_key = search_events_page(query, after, limit or DEFAULT_PAGE_SIZE)
+        return set_next_cursor(request, render_events(page, projection),
+                               next_key and encode_event_cursor(next_key))
+    
+    return render_events(search_events(query), projection)
+
+@app.get("/events/changes", response_model=EventChanges)
+async def read_event_changes(
+    since: int = Query(..., ge=0, description="Catalog version the client last synced"),
+    epoch: Optional[str] = Query(None, description="Epoch returned with that version")
+):
+    version, current_epoch = get_catalog_version(), get_catalog_epoch()
+    changes = None if epoch not in (None, current_epoch) else get_changes_since(since)
+    upserts, deleted = changes or ([], [])
+    return json_response(object_json({
+        "epoch": to_json(current_epoch),
+        "version": to_json(version),
+        "full_resync": to_json(changes is None),
+        "upserts": events_json(upserts),
+        "deleted": to_json(deleted)
+    }))
+
+MAX_BATCH_IDS = 500
+
+def render_event_batch(event_ids: List[int], fields: Optional[str]) -> Response:
+    """Resolve ids in one pass over the id index and join their cached JSON."""
+    if len(event_ids) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_IDS} ids per batch")
+    projection = parse_fields_param(fields)
+    found, missing = resolve_event_ids(event_ids)
+    if projection is None or projection == (SUMMARY,):
+        events = event_ids_json(found, summary=projection is not None)
+    else:
+        events = to_json(project_ids(found, projection))
+    return json_response(object_json({"events": events, "missing": to_json(missing)}))
+
+@app.get("/events/batch", response_model=EventBatch)
+async def read_event_batch(
+    request: Request,
+    ids: str = Query(..., description="Comma-separated event ids; order is preserved"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION)
+):
+    try:
+        event_ids = [int(value) for value in ids.split(",") if value.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be comma-separated integers")
+    etag = make_etag(request, get_catalog_version())
+    if etag_matches(request, etag):
+        return not_modified(request, etag)
+    return finalize(request, render_event_batch(event_ids, fields), etag)
+
+@app.post("/events/batch", response_model=EventBatch)
+async def read_event_batch_post(
+    batch: EventBatchRequest,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION)
+):
+    """Same as GET /events/batch, for id lists too long for a query string."""
+    return render_event_batch(batch.ids, fields)
 
 @app.get("/events/{event_id}", response_model=Event)
-async def read_event(event_id: int):
+async def read_event(request: Request, event_id: int):
+    etag = make_etag(request, get_catalog_version())
+    if etag_matches(request, etag):
+        return not_modified(request, etag)
+    
     event = get_event_by_id(event_id)
     if event is None:
         raise HTTPException(status_code=404, detail="Event not found")
-    return event
+    return finalize(request, json_response(event_json(event.id)), etag)
 
-@app.get("/events/{event_id}/routes", response_model=List[RouteOption])
-async def get_routes(
+@app.get("/events/{event_id}/similar", response_model=List[Event])
+async def read_similar_events(
     event_id: int,
-    from_lat: float = Query(..., description="Starting point latitude"),
-    from_lng: float = Query(..., description="Starting point longitude"),
-    transport_types: Optional[str] = Query("walking,driving,transit", 
-                                          description="Comma-separated list of transport types")
+    limit: int = Query(10, ge=1, le=20, description="Maximum number of similar events")
 ):
-    event = get_event_by_id(event_id)
-    if event is None:
+    if get_event_by_id(event_id) is None:
         raise HTTPException(status_code=404, detail="Event not found")
-    
+    await ensure_similarity()
+    return render_events(get_similar_events(event_id, limit))
+
+def plan_routes(event: Event, transport_types: str) -> List[RouteOption]:
     types = transport_types.split(",")
     routes = []
     
@@ -154,19 +422,184 @@ async def get_routes(
     
     return routes
 
+@app.get("/events/{event_id}/routes", response_model=List[RouteOption])
+async def get_routes(
+    event_id: int,
+    from_lat: float = Query(..., description="Starting point latitude"),
+    from_lng: float = Query(..., description="Starting point longitude"),
+    transport_types: Optional[str] = Query("walking,driving,transit", 
+                                          description="Comma-separated list of transport types")
+):
+    event = get_event_by_id(event_id)
+    if event is None:
+        raise HTTPException(status_code=404, detail="Event not found")
+    return plan_routes(event, transport_types)
+
+BUNDLE_SECTIONS = ("nearby", "routes", "favorite", "schedule")
+
+def timed_section(timings: dict, name: str, function, *args):
+    """Run a section inline and record how long it took."""
+    started = time.perf_counter()
+    try:
+        return function(*args)
+    finally:
+        timings[name] = time.perf_counter() - started
+
+def server_timing(timings: dict) -> str:
+    return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings.items())
+
+def model_json(value) -> bytes:
+    return to_json(jsonable_encoder(value))
+
+@app.get("/events/{event_id}/bundle", response_model=EventBundle)
+async def read_event_bundle(
+    event_id: int,
+    include: str = Query(",".join(BUNDLE_SECTIONS),
+                         description="Comma-separated sections: " + ", ".join(BUNDLE_SECTIONS)),
+    from_lat: Optional[float] = Query(None, description="Starting point latitude, for routes"),
+    from_lng: Optional[float] = Query(None, description="Starting point longitude, for routes"),
+    transport_types: Optional[str] = Query("walking,driving,transit",
+                                           description="Comma-separated list of transport types"),
+    token: Optional[str] = Depends(optional_oauth2_scheme)
+):
+    """Everything the event detail screen needs, in one round trip.
+
+    The event is resolved once, then each requested section is added. Every
+    section is an in-memory lookup that takes microseconds, so they run inline
+    on the loop: a threadpool hop per section cost more than the sections did,
+    and would read the store off the loop thread. A section that has to wait on
+    I/O belongs in the threadpool, or should be made async and gathered.
+    Per-section durations are reported in Server-Timing.
+    """
+    started = time.perf_counter()
+    sections = [name.strip() for name in include.split(",") if name.strip()]
+    unknown = [name for name in sections if name not in BUNDLE_SECTIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown sections: {', '.join(unknown)}")
+    if "routes" in sections and (from_lat is None or from_lng is None):
+        raise HTTPException(status_code=400, detail="from_lat and from_lng are required for routes")
+    
+    timings = {}
+    user = None
+    if "favorite" in sections or "schedule" in sections:
+        if token is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="認証情報が無効です",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        user = await get_current_user(token)
+    
+    event = timed_section(timings, "event", get_event_by_id, event_id)
+    if event is None:
+        raise HTTPException(status_code=404, detail="Event not found")
+    
+    calls = {
+        "nearby": (get_nearby_places, event.location.area),
+        "routes": (plan_routes, event, transport_types),
+        "favorite": (get_favorite, user and user.id, event_id),
+        "schedule": (get_schedule_entry, user and user.id, event_id),
+    }
+    members = {"event": event_json(event.id)}
+    for name in BUNDLE_SECTIONS:
+        if name in sections:
+            result = timed_section(timings, name, *calls[name])
+            members[name] = places_json(result) if name == "nearby" else model_json(result)
+    timings["total"] = time.perf_counter() - started
+    response = json_response(object_json(members))
+    response.headers["Server-Timing"] = server_timing(timings)
+    return response
+
 @app.get("/nearby/{area}", response_model=List[NearbyPlace])
 async def get_nearby_places_by_area(
+    request: Request,
     area: str,
-    place_type: Optional[str] = Query(None, description="Filter by place type (restaurant, cafe, hotel, entertainment)")
+    place_type: Optional[str] = Query(None, description="Filter by place type (restaurant, cafe, hotel, entertainment)"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE,
+                                 description="Page size; enables pagination ordered by id"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from X-Next-Cursor")
 ):
+    etag = make_etag(request, get_catalog_version())
+    if etag_matches(request, etag):
+        return not_modified(request, etag)
+    cached = cached_response(request, etag)
+    if cached is not None:
+        return cached
+    
+    if limit is not None or cursor is not None:
+        after = decode_cursor(decode_place_cursor, cursor)
+        places, next_key = get_nearby_places_page(area, place_type, after, limit or DEFAULT_PAGE_SIZE)
+        if not places and after is None and next_key is None:
+            raise HTTPException(status_code=404, detail=f"No places found in {area}")
+        response = set_next_cursor(request, json_response(places_json(places)),
+                                   next_key and encode_place_cursor(next_key))
+        return finalize(request, response, etag, cache=True)
+    
     places = get_nearby_places(area, place_type)
     if not places:
         raise HTTPException(status_code=404, detail=f"No places found in {area}")
-    return places
+    return finalize(request, json_response(places_json(places)), etag, cache=True)
+
+def export_response(request: Request, chunks, filename: str) -> StreamingResponse:
+    headers = {
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "X-Catalog-Version": str(get_catalog_version()),
+        "Vary": "Accept-Encoding",
+    }
+    if choose_encoding(request, ("gzip",)):
+        chunks = export.gzipped(chunks)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(chunks, media_type=export.MEDIA_TYPE, headers=headers)
+
+@app.get("/export/events.ndjson")
+async def export_events(
+    request: Request,
+    area: Optional[str] = Query(None, description="Filter by area (e.g., 北千住, 池袋)"),
+    station: Optional[str] = Query(None, description="Filter by station (e.g., 新宿駅, 東京駅)"),
+    start_date: Optional[str] = Query(None, description="Filter by start date (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="Filter by end date (YYYY-MM-DD)"),
+    category: Optional[str] = Query(None, description="Filter by category")
+):
+    """Every matching event as one JSON object per line, ordered by start time.
+
+    The output can be fed back into ``/admin/events/ingest`` as jsonl.
+    """
+    start_datetime = parse_date(start_date, "start_date")
+    end_datetime = parse_date(end_date, "end_date")
+    fetch = lambda after, limit: filter_event_ids_page(after, limit, area, station,
+                                                       start_datetime, end_datetime, category)
+    return export_response(request, export.ndjson(fetch, event_json), "events.ndjson")
+
+@app.get("/export/places.ndjson")
+async def export_places(
+    request: Request,
+    area: Optional[str] = Query(None, description="Filter by area"),
+    place_type: Optional[str] = Query(None, description="Filter by place type (restaurant, cafe, hotel, entertainment)")
+):
+    """Every matching nearby place as one JSON object per line, ordered by id."""
+    fetch = lambda after, limit: get_nearby_place_ids_page(area, place_type, after, limit)
+    return export_response(request, export.ndjson(fetch, place_json), "places.ndjson")
+
+# bcrypt releases the GIL, so hashing runs on its own small pool where it can
+# use every core without starving the default threadpool.
+PASSWORD_THREADS = min(4, os.cpu_count() or 1)
+password_pool = ThreadPoolExecutor(max_workers=PASSWORD_THREADS, thread_name_prefix="bcrypt")
+# Hashes submitted and not finished yet; only touched on the loop.
+_password_tasks = 0
+metrics.Gauge("twe_bcrypt_queue_depth", "Password hashing tasks waiting for a bcrypt thread.",
+              lambda: max(0, _password_tasks - PASSWORD_THREADS))
+
+async def run_in_password_pool(function, *args):
+    global _password_tasks
+    _password_tasks += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(password_pool, function, *args)
+    finally:
+        _password_tasks -= 1
 
 @app.post("/token", response_model=Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = authenticate_user(form_data.username, form_data.password)
+    user = await run_in_password_pool(authenticate_user, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -187,16 +620,152 @@ async def register_user(user_data: UserCreate):
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="このメールアドレスは既に登録されています",
         )
-    user = create_user(user_data.email, user_data.username, user_data.password)
+    user = await run_in_password_pool(create_user, user_data.email, user_data.username,
+                                      user_data.password)
     return user
 
+@app.get("/stream")
+async def stream_changes(
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+    access_token: Optional[str] = Query(None, description="Bearer token for clients that cannot set headers")
+):
+    user_id = None
+    if token or access_token:
+        user_id = (await get_current_user(token or access_token)).id
+    return StreamingResponse(
+        streaming.subscribe(user_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+INGEST_SPOOL_BYTES = 8 * 1024 * 1024
+# Created once; its workers are spawned on the first ingest and then reused.
+ingest_pool = process_pool()
+
+@app.post("/admin/events/ingest", response_model=IngestReport)
+async def ingest_events(
+    request: Request,
+    format: Optional[str] = Query(None, description="jsonl or csv; defaults from Content-Type"),
+    chunk_size: int = Query(1000, ge=1, le=50000, description="Events validated and upserted per batch"),
+    dedupe: Optional[str] = Query(None, pattern="^(merge|flag)$",
+                                  description="Merge or flag near-duplicate events"),
+    admin: User = Depends(get_current_admin)
+):
+    fmt = format or ("csv" if "csv" in request.headers.get("content-type", "") else "jsonl")
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {fmt}")
+    
+    # Spool the upload (to disk beyond INGEST_SPOOL_BYTES) so memory stays bounded.
+    with tempfile.SpooledTemporaryFile(max_size=INGEST_SPOOL_BYTES) as spool:
+        async for chunk in request.stream():
+            spool.write(chunk)
+        spool.seek(0)
+        # Bytes that are not UTF-8 become errors of their own row (see iter_records).
+        stream = io.TextIOWrapper(spool, encoding="utf-8", errors="surrogateescape", newline="")
+        
+        def apply_batch(batch: List[Event]) -> int:
+            # Store writes always happen on the event loop thread.
+            return anyio.from_thread.run_sync(upsert_events, batch)
+        
+        def run() -> IngestReport:
+            deduplicator = None
+            if dedupe:
+                deduplicator = Deduplicator(dedupe, index=dedupe_index())
+            # A shared catalog is encoded and published once, here, not per batch.
+            with coalesced_writes():
+                return ingest(iter_records(stream, fmt), apply_batch, chunk_size,
+                              deduplicator=deduplicator, pool=ingest_pool)
+        
+        try:
+            report = await run_in_threadpool(run)
+        except InvalidHeader as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        finally:
+            stream.detach()
+    return report
+
+@app.post("/admin/snapshot", response_model=SnapshotInfo)
+async def save_snapshot(admin: User = Depends(get_current_admin)):
+    """Write the catalog to TWE_CATALOG_SNAPSHOT for the next worker start."""
+    try:
+        path, event_count, place_count = await run_in_threadpool(write_snapshot)
+    except ValueError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    return SnapshotInfo(path=path, events=event_count, places=place_count)
+
+@app.post("/admin/profile/cpu")
+async def profile_cpu(
+    seconds: float = Query(10, gt=0, le=60, description="How long to sample"),
+    interval_ms: float = Query(5, ge=1, le=100, description="Time between samples"),
+    admin: User = Depends(get_current_admin)
+):
+    """Sample every thread's stack; returns collapsed stacks for flamegraph.pl."""
+    try:
+        stacks, samples = await run_in_threadpool(profiling.sample_cpu, seconds, interval_ms / 1000)
+    except profiling.ProfilerBusy as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    return Response(content=profiling.collapsed(stacks), media_type="text/plain",
+                    headers={"X-Samples": str(samples)})
+
+@app.post("/admin/profile/allocations/start", status_code=204)
+async def start_allocation_profile(
+    frames: int = Query(1, ge=1, le=25, description="Stack frames kept per allocation"),
+    admin: User = Depends(get_current_admin)
+):
+    try:
+        profiling.start_allocations(frames)
+    except profiling.ProfilerBusy as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+
+@app.get("/admin/profile/allocations", response_model=AllocationReport)
+async def read_allocation_diff(
+    limit: int = Query(25, ge=1, le=200),
+    group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$"),
+    admin: User = Depends(get_current_admin)
+):
+    """Allocation growth since the previous call (or since tracing started)."""
+    try:
+        entries, traced, peak = await run_in_threadpool(profiling.allocation_diff, limit, group_by)
+    except ValueError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    return AllocationReport(traced_bytes=traced, peak_bytes=peak, top=entries)
+
+@app.post("/admin/profile/allocations/stop", status_code=204)
+async def stop_allocation_profile(admin: User = Depends(get_current_admin)):
+    profiling.stop_allocations()
+
+@app.get("/admin/profile/requests/{profile_id}")
+async def read_request_profile(profile_id: str, admin: User = Depends(get_current_admin)):
+    """The cProfile report of a request sent with X-Profile: 1."""
+    report = profiling.request_profile(profile_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return Response(content=report, media_type="text/plain")
+
 @app.get("/users/me", response_model=User)
 async def read_users_me(current_user: User = Depends(get_current_user)):
     return current_user
 
 @app.get("/users/favorites", response_model=List[Event])
-async def get_favorites(current_user: User = Depends(get_current_user)):
-    return get_user_favorites(current_user.id)
+async def get_favorites(
+    request: Request,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    current_user: User = Depends(get_current_user)
+):
+    etag = make_etag(request, current_user.id, get_favorites_version(current_user.id),
+                     get_catalog_version())
+    if etag_matches(request, etag):
+        return not_modified(request, etag)
+    
+    response = render_events(get_user_favorites(current_user.id), parse_fields_param(fields))
+    return finalize(request, response, etag)
+
+@app.get("/users/recommendations", response_model=List[Event])
+async def get_recommendations(
+    limit: int = Query(10, ge=1, le=50, description="Maximum number of recommended events"),
+    current_user: User = Depends(get_current_user)
+):
+    return render_events(get_user_recommendations(current_user.id, limit))
 
 @app.post("/events/{event_id}/favorite", response_model=Favorite)
 async def favorite_event(event_id: int, current_user: User = Depends(get_current_user)):
@@ -219,8 +788,18 @@ async def unfavorite_event(event_id: int, current_user: User = Depends(get_curre
     return None
 
 @app.get("/users/schedule", response_model=List[Event])
-async def get_schedule(current_user: User = Depends(get_current_user)):
-    return get_user_schedule(current_user.id)
+async def get_schedule(
+    request: Request,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    current_user: User = Depends(get_current_user)
+):
+    etag = make_etag(request, current_user.id, get_schedule_version(current_user.id),
+                     get_catalog_version())
+    if etag_matches(request, etag):
+        return not_modified(request, etag)
+    
+    response = render_events(get_user_schedule(current_user.id), parse_fields_param(fields))
+    return finalize(request, response, etag)
 
 @app.post("/events/{event_id}/schedule", response_model=Schedule)
 async def schedule_event(
@@ -245,3 +824,103 @@ async def unschedule_event(event_id: int, current_user: User = Depends(get_curre
     if not success:
         raise HTTPException(status_code=404, detail="Schedule not found")
     return None
+
+def calendar_response(request: Request, key: ical.FeedKey, versions: tuple, name: str,
+                      load) -> Response:
+    """Answer a feed poll from the feed cache, or stream the feed and cache it.
+
+    ``load`` returns the feed's events and the ids of those with a reminder;
+    it is only called when the cached feed is missing or stale.
+    """
+    feed = ical.lookup(key, versions)
+    if feed is not None:
+        if etag_matches(request, feed.etag):
+            return not_modified(request, feed.etag)
+        return Response(content=feed.body, media_type=ical.MEDIA_TYPE, headers={"ETag": feed.etag})
+    etag = make_etag(request, *versions)
+    if etag_matches(request, etag):
+        return not_modified(request, etag)
+    events, reminder_ids = load()
+    chunks = ical.caching(key, versions, etag, ical.render(name, events, reminder_ids))
+    return StreamingResponse(chunks, media_type=ical.MEDIA_TYPE, headers={"ETag": etag})
+
+@app.get("/users/schedule/feed", response_model=CalendarFeed)
+async def get_schedule_feed(request: Request, current_user: User = Depends(get_current_user)):
+    """URL of the user's schedule as an iCalendar feed, for calendar apps to subscribe to."""
+    token = ical.feed_token(current_user.id, SECRET_KEY)
+    return CalendarFeed(url=str(request.url_for("user_calendar", token=token)))
+
+@app.get("/users/{token}/schedule.ics", name="user_calendar")
+async def get_user_calendar(request: Request, token: str):
+    user_id = ical.feed_user(token, SECRET_KEY)
+    if user_id is None:
+        raise HTTPException(status_code=404, detail="Calendar not found")
+    versions = (get_schedule_version(user_id), get_catalog_version())
+    return calendar_response(
+        request, ical.user_key(user_id), versions, "Tokyo Weekend Events",
+        lambda: (get_user_schedule(user_id), get_schedule_reminders(user_id))
+    )
+
+@app.get("/feeds/events.ics")
+async def get_events_calendar(
+    request: Request,
+    category: Optional[str] = Query(None, description="Only events in this category"),
+    area: Optional[str] = Query(None, description="Only events in this area")
+):
+    name = " / ".join(part for part in ("Tokyo Weekend Events", area, category) if part)
+    return calendar_response(
+        request, ("public", category, area), (get_catalog_version(),), name,
+        lambda: (filter_events(area=area, category=category), ())
+    )
+
+def reservable_event(event_id: int) -> Event:
+    event = get_event_by_id(event_id)
+    if event is None:
+        raise HTTPException(status_code=404, detail="Event not found")
+    if event.capacity is None:
+        raise HTTPException(status_code=409, detail="Event does not take reservations")
+    return event
+
+@app.post("/events/{event_id}/reserve", response_model=Reservation, status_code=201)
+async def reserve_seats(
+    event_id: int,
+    response: Response,
+    quantity: int = Query(1, ge=1, le=reservations.MAX_SEATS_PER_RESERVATION,
+                          description="Number of seats"),
+    idempotency_key: Optional[str] = Header(None, max_length=200,
+                                            description="Retries with the same key reserve once"),
+    current_user: User = Depends(get_current_user)
+):
+    """Reserve seats; 201 when confirmed, 202 when the event is full and the request is waitlisted."""
+    event = reservable_event(event_id)
+    try:
+        reservation, replayed = reservations.reserve(event_id, event.capacity, current_user.id,
+                                                     quantity, idempotency_key)
+    except reservations.IdempotencyConflict as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    if replayed:
+        response.status_code = 200
+        response.headers["Idempotent-Replayed"] = "true"
+    elif reservation.status == reservations.WAITLISTED:
+        response.status_code = 202
+    return reservation
+
+@app.delete("/events/{event_id}/reservations/{reservation_id}", response_model=Reservation)
+async def release_seats(event_id: int, reservation_id: int,
+                        current_user: User = Depends(get_current_user)):
+    """Release a reservation's seats, or leave the waitlist."""
+    reservation = reservations.release(current_user.id, event_id, reservation_id)
+    if reservation is None:
+        raise HTTPException(status_code=404, detail="Reservation not found")
+    return reservation
+
+@app.get("/events/{event_id}/availability", response_model=Availability)
+async def read_availability(event_id: int):
+    event = reservable_event(event_id)
+    remaining, waitlisted = reservations.availability(event_id, event.capacity)
+    return Availability(event_id=event_id, capacity=event.capacity, remaining=remaining,
+                        waitlisted=waitlisted)
+
+@app.get("/users/reservations", response_model=List[Reservation])
+async def read_user_reservations(current_user: User = Depends(get_current_user)):
+    return reservations.user_reservations(current_user.id)
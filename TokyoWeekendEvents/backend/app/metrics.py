@@ -0,0 +1,221 @@
+"""
+Prometheus metrics for Tokyo Weekend Events API
+
+``GET /metrics`` renders everything recorded here in the Prometheus text
+exposition format: request latency histograms per route, method and status,
+the number of requests in flight, the bcrypt pool queue depth and timings of
+the store functions decorated with ``timed``.
+
+Recording takes no locks. Each thread writes to its own shard (a dict of
+series kept in a ``threading.local``) and only ``render`` walks and merges
+all shards, so the event loop and threadpool workers never contend. Shards
+outlive their threads, which keeps counters monotonic. Histograms use fixed
+log-spaced buckets, doubling from 25 microseconds to about a minute; the
+bucket of an observation is the bit length of its multiple of the smallest
+bucket, found without a search.
+"""
+import functools
+import threading
+import time
+from typing import Callable, Dict, List, Sequence
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+BUCKET_BASE_SECONDS = 25e-6
+BUCKET_COUNT = 22
+BOUNDS = [BUCKET_BASE_SECONDS * 2 ** i for i in range(BUCKET_COUNT)]
+_LE = [f'le="{bound:.6g}"' for bound in BOUNDS] + ['le="+Inf"']
+_BUCKETS_PER_SECOND = 1 / BUCKET_BASE_SECONDS
+_STATUS = {code: str(code) for code in range(100, 600)}
+_perf_counter = time.perf_counter
+
+_metrics: List["_Metric"] = []
+_in_flight = 0
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        # Per-thread shards of label values -> counts.
+        self._local = threading.local()
+        self._shards: List[Dict[tuple, list]] = []
+        self._shards_lock = threading.Lock()
+        _metrics.append(self)
+
+    def _new_shard(self) -> Dict[tuple, list]:
+        series = self._local.series = {}
+        with self._shards_lock:
+            self._shards.append(series)
+        return series
+
+    def merged(self) -> Dict[tuple, list]:
+        with self._shards_lock:
+            shards = list(self._shards)
+        merged: Dict[tuple, list] = {}
+        for shard in shards:
+            # The owning thread may add a series while we copy; retry the copy.
+            while True:
+                try:
+                    items = list(shard.items())
+                    break
+                except RuntimeError:
+                    continue
+            for labels, counts in items:
+                totals = merged.get(labels)
+                if totals is None:
+                    merged[labels] = list(counts)
+                else:
+                    for i, value in enumerate(counts):
+                        totals[i] += value
+        return merged
+
+    def _labels(self, values: tuple, extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self, merged: Dict[tuple, list]) -> List[str]:
+        raise NotImplementedError
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def observe(self, labels: tuple, seconds: float):
+        """Record one duration for the series with the given label values."""
+        try:
+            series = self._local.series
+        except AttributeError:
+            series = self._new_shard()
+        counts = series.get(labels)
+        if counts is None:
+            # One count per bucket, one for +Inf, then the sum.
+            counts = series[labels] = [0] * (BUCKET_COUNT + 1) + [0.0]
+        # Bucket i holds [base * 2**(i-1), base * 2**i): the bit length of seconds / base.
+        # (Prometheus bounds are inclusive; only exact powers of two land one higher.)
+        index = int(seconds * _BUCKETS_PER_SECOND).bit_length()
+        counts[index if index < BUCKET_COUNT else BUCKET_COUNT] += 1
+        counts[-1] += seconds
+
+    def render(self, merged: Dict[tuple, list]) -> List[str]:
+        lines = []
+        for labels, counts in sorted(merged.items()):
+            cumulative = 0
+            for le, count in zip(_LE, counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{self._labels(labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(labels)} {counts[-1]:.9g}")
+            lines.append(f"{self.name}_count{self._labels(labels)} {cumulative}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        try:
+            series = self._local.series
+        except AttributeError:
+            series = self._new_shard()
+        counts = series.get(labels)
+        if counts is None:
+            counts = series[labels] = [0]
+        counts[0] += amount
+
+    def render(self, merged: Dict[tuple, list]) -> List[str]:
+        return [f"{self.name}_total{self._labels(labels)} {counts[0]}"
+                for labels, counts in sorted(merged.items())]
+
+
+class Gauge(_Metric):
+    """A value read when metrics are rendered, from ``function``."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, function: Callable[[], float]):
+        super().__init__(name, help)
+        self.function = function
+
+    def render(self, merged: Dict[tuple, list]) -> List[str]:
+        return [f"{self.name} {self.function()}"]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render() -> bytes:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render(metric.merged()))
+    return ("\n".join(lines) + "\n").encode()
+
+
+REQUEST_SECONDS = Histogram(
+    "twe_http_request_duration_seconds", "HTTP request latency by route, method and status.",
+    ("route", "method", "status"))
+STORE_SECONDS = Histogram(
+    "twe_store_duration_seconds", "Time spent in store functions.", ("function",))
+RATE_LIMITED = Counter(
+    "twe_rate_limited_requests", "Requests rejected by the rate limiter.", ("rule",))
+Gauge("twe_http_requests_in_flight", "HTTP requests currently being handled.", lambda: _in_flight)
+
+
+def timed(function: Callable) -> Callable:
+    """Record the duration of every call to ``function`` in STORE_SECONDS."""
+    labels = (function.__name__,)
+    observe = STORE_SECONDS.observe
+    perf_counter = time.perf_counter
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        started = perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            observe(labels, perf_counter() - started)
+
+    return wrapper
+
+
+class MetricsMiddleware:
+    """Times every HTTP request and counts those in flight.
+
+    The route label is the matched path template (``/events/{event_id}``),
+    which FastAPI leaves in the scope after routing; requests that match no
+    route share the label ``unmatched``.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global _in_flight
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = 500
+
+        # A plain function handing back send's awaitable: no extra coroutine per message.
+        def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            return send(message)
+
+        started = _perf_counter()
+        _in_flight += 1
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _in_flight -= 1
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(
+                (route.path if route is not None else "unmatched", scope["method"], _STATUS[status]),
+                _perf_counter() - started)
@@ -14,6 +14,7 @@ class Location(BaseModel):
     coordinates: Coordinates
     area: str
     station: Optional[str] = None
+    walking_minutes: Optional[int] = None
 
 
 class ExternalLinks(BaseModel):
@@ -35,6 +36,76 @@ class Event(BaseModel):
     capacity: Optional[int] = None
 
 
+class EventSummary(BaseModel):
+    id: int
+    name: str
+    start_datetime: datetime
+    end_datetime: datetime
+    area: str
+    category: str
+
+
+class EventChanges(BaseModel):
+    epoch: str
+    version: int
+    full_resync: bool = False
+    upserts: List[Event] = []
+    deleted: List[int] = []
+
+
+class EventBatchRequest(BaseModel):
+    ids: List[int]
+
+
+class EventBatch(BaseModel):
+    events: List[Event] = []
+    missing: List[int] = []
+
+
+class IngestError(BaseModel):
+    line: int
+    error: str
+
+
+class DuplicateMatch(BaseModel):
+    event_id: int
+    duplicate_of: int
+    similarity: float
+    distance_m: float
+
+
+class IngestReport(BaseModel):
+    received: int = 0
+    upserted: int = 0
+    rejected: int = 0
+    duplicates: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+    events_per_second: float = 0.0
+    errors: List[IngestError] = []
+    duplicate_matches: List[DuplicateMatch] = []
+
+
+class SnapshotInfo(BaseModel):
+    path: str
+    events: int
+    places: int
+
+
+class AllocationDiff(BaseModel):
+    location: str
+    size_diff: int
+    size: int
+    count_diff: int
+    count: int
+
+
+class AllocationReport(BaseModel):
+    traced_bytes: int
+    peak_bytes: int
+    top: List[AllocationDiff] = []
+
+
 class RouteOption(BaseModel):
     transport_type: str  # "walking", "driving", "transit", "bicycle", "taxi"
     duration_minutes: int
@@ -115,3 +186,34 @@ class Schedule(ScheduleBase):
 
     class Config:
         orm_mode = True
+
+
+class EventBundle(BaseModel):
+    event: Event
+    nearby: Optional[List[NearbyPlace]] = None
+    routes: Optional[List[RouteOption]] = None
+    favorite: Optional[Favorite] = None
+    schedule: Optional[Schedule] = None
+
+
+class Reservation(BaseModel):
+    id: int
+    event_id: int
+    user_id: int
+    quantity: int
+    # confirmed, waitlisted, released or cancelled (left the waitlist)
+    status: str
+    # Place among the reservations still waiting, as of the response.
+    position: Optional[int] = None
+    created_at: datetime
+
+
+class CalendarFeed(BaseModel):
+    url: str
+
+
+class Availability(BaseModel):
+    event_id: int
+    capacity: int
+    remaining: int
+    waitlisted: int
@@ -0,0 +1,62 @@
+"""
+Opaque keyset cursors for Tokyo Weekend Events API
+
+A cursor is the sort key of the last item on the previous page, JSON encoded
+and wrapped in URL-safe base64 so clients treat it as an opaque token.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Tuple
+
+EventKey = Tuple[datetime, int]
+PlaceKey = Tuple[int]
+
+
+def _encode(values: list) -> str:
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode(cursor: str) -> list:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def _is_id(value) -> bool:
+    # bool is an int subclass, but true/false are not ids.
+    return isinstance(value, int) and type(value) is not bool
+
+
+def encode_event_cursor(key: EventKey) -> str:
+    start_datetime, event_id = key
+    return _encode(["e", start_datetime.isoformat(), event_id])
+
+
+def decode_event_cursor(cursor: str) -> EventKey:
+    values = _decode(cursor)
+    if (len(values) != 3 or values[0] != "e" or not isinstance(values[1], str)
+            or not _is_id(values[2])):
+        raise ValueError("Invalid cursor")
+    start_datetime = datetime.fromisoformat(values[1])
+    # Store keys are naive Tokyo times; an aware one cannot be compared with them.
+    if start_datetime.tzinfo is not None:
+        raise ValueError("Invalid cursor")
+    return start_datetime, values[2]
+
+
+def encode_place_cursor(key: PlaceKey) -> str:
+    return _encode(["p", key[0]])
+
+
+def decode_place_cursor(cursor: str) -> PlaceKey:
+    values = _decode(cursor)
+    if len(values) != 2 or values[0] != "p" or not _is_id(values[1]):
+        raise ValueError("Invalid cursor")
+    return (values[1],)
@@ -0,0 +1,216 @@
+"""
+On-demand profiling for Tokyo Weekend Events API
+
+Admin endpoints use this module to profile the live process:
+
+* ``sample_cpu`` samples the stacks of every thread with
+  ``sys._current_frames()`` for a number of seconds and returns them in the
+  collapsed format read by flamegraph.pl and speedscope. The sampling loop
+  runs on the thread that asked for it, so there is no sampler thread at all
+  outside a profile.
+* ``start_allocations`` / ``allocation_diff`` / ``stop_allocations`` wrap
+  ``tracemalloc``: each diff compares a new snapshot with the previous one.
+* ``ProfilingMiddleware`` runs a single request under ``cProfile`` when it
+  carries ``X-Profile: 1`` and an admin bearer token, and answers with an
+  ``X-Profile-Id`` to fetch the report from. Other requests keep running on
+  the same loop meanwhile, so the profiler is switched on only while the
+  profiled request's own coroutine runs, and off at every ``await`` that
+  suspends it.
+
+When nothing is being profiled the only cost is the middleware looking for
+the ``X-Profile`` header.
+"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+MAX_STORED_PROFILES = 20
+REPORT_LINES = 60
+
+_cpu_lock = threading.Lock()
+# cProfile hooks the interpreter's profiler slot, so one request at a time.
+_request_lock = threading.Lock()
+_request_profiles: "OrderedDict[str, str]" = OrderedDict()
+_allocation_baseline: Optional[tracemalloc.Snapshot] = None
+
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+def _frame_name(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample_cpu(seconds: float, interval: float = 0.005) -> Tuple[Dict[str, int], int]:
+    """Sample all other threads for ``seconds``; return (collapsed stacks, samples)."""
+    if not _cpu_lock.acquire(blocking=False):
+        raise ProfilerBusy("A CPU profile is already running")
+    try:
+        own = threading.get_ident()
+        stacks: Counter = Counter()
+        samples = 0
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                stacks[";".join(reversed(stack))] += 1
+            samples += 1
+            time.sleep(interval)
+        return dict(stacks), samples
+    finally:
+        _cpu_lock.release()
+
+
+def collapsed(stacks: Dict[str, int]) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+
+
+def start_allocations(frames: int = 1):
+    """Start tracing allocations and take the first snapshot to diff against."""
+    global _allocation_baseline
+    if tracemalloc.is_tracing():
+        raise ProfilerBusy("Allocation tracing is already running")
+    tracemalloc.start(frames)
+    _allocation_baseline = _snapshot()
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+    ))
+
+
+def allocation_diff(limit: int = 25, group_by: str = "lineno") -> Tuple[List[dict], int, int]:
+    """Diff a new snapshot against the previous one; return (top entries, traced, peak)."""
+    global _allocation_baseline
+    if not tracemalloc.is_tracing() or _allocation_baseline is None:
+        raise ValueError("Allocation tracing is not running")
+    snapshot = _snapshot()
+    stats = snapshot.compare_to(_allocation_baseline, group_by)
+    _allocation_baseline = snapshot
+    entries = [{
+        "location": " <- ".join(f"{os.path.basename(frame.filename)}:{frame.lineno}"
+                                for frame in stat.traceback),
+        "size_diff": stat.size_diff,
+        "size": stat.size,
+        "count_diff": stat.count_diff,
+        "count": stat.count,
+    } for stat in stats[:limit]]
+    traced, peak = tracemalloc.get_traced_memory()
+    return entries, traced, peak
+
+
+def stop_allocations():
+    global _allocation_baseline
+    tracemalloc.stop()
+    _allocation_baseline = None
+
+
+def request_profile(profile_id: str) -> Optional[str]:
+    return _request_profiles.get(profile_id)
+
+
+def _report(profile: cProfile.Profile, method: str, target: str, seconds: float) -> str:
+    stream = io.StringIO()
+    stream.write(f"{method} {target} in {seconds * 1000:.2f} ms\n\n")
+    pstats.Stats(profile, stream=stream).sort_stats("cumulative").print_stats(REPORT_LINES)
+    return stream.getvalue()
+
+
+class _Profiled:
+    """Await ``coroutine``, profiling each step it runs but none of the others."""
+
+    def __init__(self, coroutine, profile: cProfile.Profile):
+        self._coroutine = coroutine
+        self._profile = profile
+
+    def __await__(self):
+        value, error = None, None
+        while True:
+            self._profile.enable()
+            try:
+                if error is None:
+                    suspended_on = self._coroutine.send(value)
+                else:
+                    suspended_on = self._coroutine.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                self._profile.disable()
+            try:
+                value, error = (yield suspended_on), None
+            except BaseException as exc:
+                value, error = None, exc
+
+
+class ProfilingMiddleware:
+    """Profile requests sent with ``X-Profile: 1`` by an admin.
+
+    ``authorize`` decides whether a bearer token belongs to an admin. Only the
+    profiled request's task is measured, which is where endpoints call the
+    store. Coroutines of other requests that run while it waits are left
+    out. So is work it hands elsewhere: threadpool calls, and tasks it starts
+    (Starlette sends a streamed body from one). Those show up as time spent
+    waiting for them, and the wall time in the report's first line still
+    includes them.
+    """
+
+    def __init__(self, app, authorize: Callable[[str], bool]):
+        self.app = app
+        self._authorize = authorize
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        flag = token = None
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                flag = value
+            elif name == b"authorization":
+                token = value
+        if flag != b"1" or token is None or token[:7].lower() != b"bearer " \
+                or not self._authorize(token[7:].decode("latin-1")):
+            return await self.app(scope, receive, send)
+        if not _request_lock.acquire(blocking=False):
+            return await self.app(scope, receive, _with_header(send, b"busy"))
+
+        profile_id = uuid.uuid4().hex[:16]
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            await _Profiled(self.app(scope, receive, _with_header(send, profile_id.encode())),
+                            profile)
+        finally:
+            _request_lock.release()
+            target = scope["path"] + ("?" + scope["query_string"].decode("latin-1")
+                                      if scope["query_string"] else "")
+            _request_profiles[profile_id] = _report(profile, scope["method"], target,
+                                                    time.perf_counter() - started)
+            while len(_request_profiles) > MAX_STORED_PROFILES:
+                _request_profiles.popitem(last=False)
+
+
+def _with_header(send, profile_id: bytes):
+    def send_with_header(message):
+        if message["type"] == "http.response.start":
+            message = dict(message, headers=list(message.get("headers", ())) +
+                           [(b"x-profile-id", profile_id)])
+        return send(message)
+    return send_with_header
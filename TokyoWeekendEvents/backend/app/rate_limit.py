@@ -0,0 +1,395 @@
+"""
+Rate limiting for Tokyo Weekend Events API
+
+Endpoints that burn CPU per request (bcrypt in ``/token`` and
+``/users/register``, search, route planning) are limited per client with
+token buckets, configured per route on ``RateLimitMiddleware``. A rule is
+keyed either by client IP or, for ``per="user"``, by the authenticated user
+(falling back to the IP for anonymous requests).
+
+Buckets are kept as GCRA state: a single float per key, the time at which
+the bucket will be full again. That is equivalent to a token bucket but needs
+no separate token count, and keys whose time has passed carry no information,
+so a periodic sweep drops them and the table only holds recently limited
+clients. Rejected requests get ``429`` with ``Retry-After``.
+
+Each worker limits on its own by default. With TWE_RATE_LIMIT_URL set to
+``redis://host:port`` the buckets live in a server speaking the Redis
+protocol and its ``CL.THROTTLE`` command (redis-cell), shared by all workers;
+``python -m app.rate_limit serve`` runs a small stand-in for local use.
+"""
+import argparse
+import asyncio
+import logging
+import math
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlparse
+
+from app import metrics
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_URL = os.getenv("TWE_RATE_LIMIT_URL")
+SWEEP_SECONDS = 60.0
+MAX_CACHED_TOKENS = 10000
+# How long a token's user is trusted; keep within the token lifetime.
+TOKEN_CACHE_SECONDS = 15 * 60
+DEFAULT_PORT = 6390
+
+
+class Limit(NamedTuple):
+    count: int
+    period: float
+    burst: int = 0
+    per: str = "ip"
+
+    @property
+    def capacity(self) -> int:
+        """Requests allowed back to back from a full bucket."""
+        return self.burst or self.count
+
+
+def _path_pattern(path: str) -> str:
+    parts = re.split(r"(\{[^}]+\})", path)
+    return "".join("[^/]+" if part.startswith("{") else re.escape(part) for part in parts)
+
+
+class RateTable:
+    """GCRA buckets: key -> time at which the bucket is full again."""
+
+    __slots__ = ("_full_at", "_next_sweep")
+
+    def __init__(self):
+        self._full_at: Dict[str, float] = {}
+        self._next_sweep = 0.0
+
+    def __len__(self) -> int:
+        return len(self._full_at)
+
+    def take(self, key: str, interval: float, tolerance: float, now: float,
+             quantity: int = 1) -> Tuple[float, float]:
+        """Take ``quantity`` tokens; return (retry after, seconds until full).
+
+        ``interval`` is the time one token takes to refill and ``tolerance``
+        the time the rest of the bucket does. A retry-after of 0 means the
+        request is allowed.
+        """
+        if now >= self._next_sweep:
+            self.sweep(now)
+        full_at = self._full_at.get(key, now)
+        if full_at < now:
+            full_at = now
+        new_full_at = full_at + interval * quantity
+        allowed_at = new_full_at - tolerance - interval
+        if allowed_at > now:
+            return allowed_at - now, full_at - now
+        self._full_at[key] = new_full_at
+        return 0.0, new_full_at - now
+
+    def sweep(self, now: float):
+        """Forget every key whose bucket has refilled."""
+        self._full_at = {key: at for key, at in self._full_at.items() if at > now}
+        self._next_sweep = now + SWEEP_SECONDS
+
+
+class RespClient:
+    """A single connection to a Redis-protocol server issuing CL.THROTTLE."""
+
+    def __init__(self, url: str):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or DEFAULT_PORT
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def throttle(self, key: str, limit: Limit) -> float:
+        """Return seconds to wait, 0 if allowed. Raises OSError when unreachable."""
+        command = ["CL.THROTTLE", key, str(limit.capacity - 1), str(limit.count),
+                   str(limit.period)]
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            try:
+                if self._writer is None:
+                    self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+                self._writer.write(encode_command(command))
+                await self._writer.drain()
+                reply = await read_reply(self._reader)
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                self.close()
+                raise OSError(f"rate limit server {self.host}:{self.port} unavailable")
+        if isinstance(reply, Exception):
+            raise OSError(str(reply))
+        limited, _, _, retry_after, _ = reply
+        return float(max(retry_after, 1)) if limited else 0.0
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+
+class _Rule:
+    __slots__ = ("name", "limit", "per_user", "interval", "tolerance", "table")
+
+    def __init__(self, method: str, path: str, limit: Limit):
+        self.name = f"{method} {path}"
+        self.limit = limit
+        self.per_user = limit.per == "user"
+        self.interval = limit.period / limit.count
+        self.tolerance = (limit.capacity - 1) * self.interval
+        self.table = RateTable()
+
+
+class RateLimitMiddleware:
+    """Pure ASGI middleware applying ``limits`` keyed by (method, route path).
+
+    Route paths may contain ``{parameters}``. ``identify`` maps a bearer token
+    to a user id (or None if it is invalid) for ``per="user"`` rules; results
+    are cached per token for ``token_ttl`` seconds, at most MAX_CACHED_TOKENS
+    of them, least recently used first out.
+    """
+
+    def __init__(self, app, limits: Dict[Tuple[str, str], Limit],
+                 identify: Optional[Callable[[str], Optional[str]]] = None,
+                 url: Optional[str] = RATE_LIMIT_URL,
+                 token_ttl: float = TOKEN_CACHE_SECONDS):
+        self.app = app
+        self._identify = identify
+        # token -> (bucket key of its user or None, monotonic expiry)
+        self._users: "OrderedDict[str, Tuple[Optional[str], float]]" = OrderedDict()
+        self._token_ttl = token_ttl
+        self._remote = RespClient(url) if url else None
+        self._remote_down_until = 0.0
+        # path -> method -> rule; paths with {parameters} share one regex with
+        # a group per path, tried only when the path ends like one of them.
+        self._static: Dict[str, Dict[str, _Rule]] = {}
+        templated: Dict[str, Dict[str, _Rule]] = {}
+        for (method, path), limit in limits.items():
+            rules = templated if "{" in path else self._static
+            rules.setdefault(path, {})[method] = _Rule(method, path, limit)
+        self._templated = list(templated.values())
+        self._suffixes = tuple({path.rsplit("}", 1)[1] for path in templated})
+        self._pattern = re.compile("|".join(
+            f"({_path_pattern(path)})" for path in templated
+        )) if templated else None
+
+    def bucket_count(self) -> int:
+        rules = list(self._static.values()) + self._templated
+        return sum(len(rule.table) for methods in rules for rule in methods.values())
+
+    def _rule(self, scope) -> Optional[_Rule]:
+        path = scope["path"]
+        rules = self._static.get(path)
+        if rules is None:
+            if self._pattern is None or not path.endswith(self._suffixes):
+                return None
+            match = self._pattern.fullmatch(path)
+            if match is None:
+                return None
+            rules = self._templated[match.lastindex - 1]
+        return rules.get(scope["method"])
+
+    def _client(self, scope, rule: _Rule) -> str:
+        if rule.per_user and self._identify is not None:
+            for name, value in scope["headers"]:
+                if name == b"authorization" and value[:7].lower() == b"bearer ":
+                    user = self._user(value[7:].decode("latin-1"))
+                    if user is not None:
+                        return user
+                    break
+        client = scope.get("client")
+        return client[0] if client else "-"
+
+    def _user(self, token: str) -> Optional[str]:
+        now = time.monotonic()
+        entry = self._users.get(token)
+        if entry is not None and entry[1] > now:
+            self._users.move_to_end(token)
+            return entry[0]
+        user = self._identify(token)
+        # Prefixed so that a user id can never share a bucket with an IP.
+        user = None if user is None else "user:" + user
+        self._users[token] = (user, now + self._token_ttl)
+        self._users.move_to_end(token)
+        if len(self._users) > MAX_CACHED_TOKENS:
+            self._users.popitem(last=False)
+        return user
+
+    def check(self, scope) -> float:
+        """Seconds the request must wait (0 to let it through), using the local table."""
+        rule = self._rule(scope)
+        if rule is None:
+            return 0.0
+        return rule.table.take(self._client(scope, rule), rule.interval, rule.tolerance,
+                               time.monotonic())[0]
+
+    async def _check_remote(self, scope) -> float:
+        rule = self._rule(scope)
+        if rule is None:
+            return 0.0
+        if time.monotonic() >= self._remote_down_until:
+            key = f"twe:{rule.name} {self._client(scope, rule)}"
+            try:
+                return await self._remote.throttle(key, rule.limit)
+            except OSError as exc:
+                logger.warning("%s; limiting locally for %ss", exc, SWEEP_SECONDS)
+                self._remote_down_until = time.monotonic() + SWEEP_SECONDS
+        return self.check(scope)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        if self._remote is None:
+            retry_after = self.check(scope)
+        else:
+            retry_after = await self._check_remote(scope)
+        if not retry_after:
+            return await self.app(scope, receive, send)
+        metrics.RATE_LIMITED.inc((self._rule(scope).name,))
+        body = b'{"detail":"Too many requests"}'
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(math.ceil(retry_after)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def encode_command(arguments: List[str]) -> bytes:
+    parts = [f"*{len(arguments)}\r\n".encode()]
+    for argument in arguments:
+        data = argument.encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+def _encode_reply(value) -> bytes:
+    if isinstance(value, Exception):
+        return f"-ERR {value}\r\n".encode()
+    if isinstance(value, str):
+        return f"+{value}\r\n".encode()
+    if isinstance(value, int):
+        return f":{value}\r\n".encode()
+    return f"*{len(value)}\r\n".encode() + b"".join(_encode_reply(v) for v in value)
+
+
+async def read_reply(reader: asyncio.StreamReader):
+    """Read one RESP value; error replies are returned as exceptions."""
+    line = (await reader.readuntil(b"\r\n"))[:-2]
+    kind, rest = line[:1], line[1:]
+    if kind == b"+":
+        return rest.decode()
+    if kind == b"-":
+        return ValueError(rest.decode())
+    if kind == b":":
+        return int(rest)
+    if kind == b"$":
+        length = int(rest)
+        return None if length < 0 else (await reader.readexactly(length + 2))[:-2]
+    if kind == b"*":
+        return [await read_reply(reader) for _ in range(int(rest))]
+    raise ValueError(f"Unexpected RESP reply {line[:20]!r}")
+
+
+async def _read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+    try:
+        line = (await reader.readuntil(b"\r\n"))[:-2]
+    except asyncio.IncompleteReadError:
+        return None
+    if not line.startswith(b"*"):
+        return line.split()  # inline command, e.g. from telnet
+    arguments = []
+    for _ in range(int(line[1:])):
+        header = (await reader.readuntil(b"\r\n"))[:-2]
+        if not header.startswith(b"$"):
+            raise ValueError("Expected a bulk string")
+        arguments.append((await reader.readexactly(int(header[1:]) + 2))[:-2])
+    return arguments
+
+
+def throttle(table: RateTable, arguments: List[bytes], now: float) -> List[int]:
+    """CL.THROTTLE key max_burst count period [quantity], as in redis-cell."""
+    if len(arguments) not in (4, 5):
+        raise ValueError("wrong number of arguments for 'cl.throttle' command")
+    key = arguments[0].decode()
+    max_burst, count = int(arguments[1]), int(arguments[2])
+    period = float(arguments[3])
+    quantity = int(arguments[4]) if len(arguments) == 5 else 1
+    if count <= 0 or period <= 0 or max_burst < 0:
+        raise ValueError("invalid rate")
+    interval = period / count
+    retry_after, reset_after = table.take(key, interval, max_burst * interval, now, quantity)
+    remaining = max(0, max_burst + 1 - math.ceil(reset_after / interval - 1e-9))
+    if retry_after:
+        return [1, max_burst + 1, remaining, math.ceil(retry_after), math.ceil(reset_after)]
+    return [0, max_burst + 1, remaining, -1, math.ceil(reset_after)]
+
+
+async def _serve_client(table: RateTable, reader: asyncio.StreamReader,
+                        writer: asyncio.StreamWriter):
+    try:
+        while True:
+            try:
+                arguments = await _read_command(reader)
+            except ValueError as exc:
+                writer.write(_encode_reply(exc))
+                break
+            if arguments is None:
+                break
+            if not arguments:
+                continue
+            command = arguments[0].upper()
+            try:
+                if command == b"CL.THROTTLE":
+                    reply = throttle(table, arguments[1:], time.monotonic())
+                elif command == b"PING":
+                    reply = "PONG"
+                elif command == b"QUIT":
+                    writer.write(_encode_reply("OK"))
+                    break
+                elif command == b"COMMAND":
+                    reply = []
+                else:
+                    reply = ValueError(f"unknown command '{arguments[0].decode(errors='replace')}'")
+            except ValueError as exc:
+                reply = exc
+            writer.write(_encode_reply(reply))
+            await writer.drain()
+    finally:
+        writer.close()
+
+
+async def serve(host: str = "127.0.0.1", port: int = DEFAULT_PORT):
+    """Run a stand-in Redis-protocol server that only knows CL.THROTTLE and PING."""
+    table = RateTable()
+    server = await asyncio.start_server(
+        lambda reader, writer: _serve_client(table, reader, writer), host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared rate limit server (CL.THROTTLE over RESP)")
+    parser.add_argument("command", choices=("serve",))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+    print(f"listening on {args.host}:{args.port}", flush=True)
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
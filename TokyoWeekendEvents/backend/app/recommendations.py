@@ -0,0 +1,172 @@
+"""
+Item-item recommendations for Tokyo Weekend Events API
+
+Favorites and schedules are treated as implicit (user, event) interactions.
+A sparse co-occurrence matrix is kept as dict-of-dicts and normalized with
+cosine similarity; each event keeps a precomputed top-k neighbor list so that
+serving a user is only a merge of a few short lists.
+
+A full rebuild is computed by ``build`` without touching the live structures,
+so it can run on a worker thread, and then swapped in at once by
+``install``. Interactions recorded in between are journaled and replayed
+onto the new structures.
+"""
+import heapq
+import math
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+TOP_K = 20
+
+# user_id -> {event_id: number of sources (favorite, schedule) holding it}
+_user_items: Dict[int, Dict[int, int]] = defaultdict(dict)
+# event_id -> number of distinct users interacting with it
+_item_users: Dict[int, int] = defaultdict(int)
+# event_id -> {other_event_id: number of users interacting with both}
+_cooccurrence: Dict[int, Dict[int, int]] = defaultdict(dict)
+# event_id -> [(similarity, other_event_id)] sorted by descending similarity
+_neighbors: Dict[int, List[Tuple[float, int]]] = {}
+# (user_id, event_id, +1 or -1) recorded since start_rebuild(); None otherwise.
+_journal: Optional[List[Tuple[int, int, int]]] = None
+
+Index = Tuple[Dict[int, Dict[int, int]], Dict[int, int], Dict[int, Dict[int, int]],
+              Dict[int, List[Tuple[float, int]]]]
+
+
+def _top_neighbors(event_id: int, row: Dict[int, int],
+                   item_users: Dict[int, int]) -> List[Tuple[float, int]]:
+    return heapq.nlargest(
+        TOP_K,
+        ((count / math.sqrt(item_users[event_id] * item_users[other_id]), other_id)
+         for other_id, count in row.items())
+    )
+
+
+def _refresh_neighbors(event_id: int):
+    row = _cooccurrence.get(event_id)
+    if not row:
+        _neighbors.pop(event_id, None)
+        return
+    _neighbors[event_id] = _top_neighbors(event_id, row, _item_users)
+
+
+def _link(event_id: int, others: Iterable[int], delta: int) -> List[int]:
+    touched = []
+    for other_id in others:
+        if other_id == event_id:
+            continue
+        for a, b in ((event_id, other_id), (other_id, event_id)):
+            count = _cooccurrence[a].get(b, 0) + delta
+            if count > 0:
+                _cooccurrence[a][b] = count
+            else:
+                _cooccurrence[a].pop(b, None)
+        touched.append(other_id)
+    return touched
+
+
+def record_interaction(user_id: int, event_id: int):
+    if _journal is not None:
+        _journal.append((user_id, event_id, 1))
+    items = _user_items[user_id]
+    if event_id in items:
+        items[event_id] += 1
+        return
+
+    touched = _link(event_id, list(items), 1)
+    items[event_id] = 1
+    _item_users[event_id] += 1
+
+    # The popularity of event_id changed, so every similarity in its row did.
+    touched.extend(_cooccurrence.get(event_id, {}))
+    _refresh_neighbors(event_id)
+    for other_id in set(touched):
+        _refresh_neighbors(other_id)
+
+
+def remove_interaction(user_id: int, event_id: int):
+    if _journal is not None:
+        _journal.append((user_id, event_id, -1))
+    items = _user_items.get(user_id)
+    if not items or event_id not in items:
+        return
+    items[event_id] -= 1
+    if items[event_id] > 0:
+        return
+
+    del items[event_id]
+    affected = list(_cooccurrence.get(event_id, {}))
+    _link(event_id, list(items), -1)
+    _item_users[event_id] -= 1
+    if _item_users[event_id] <= 0:
+        del _item_users[event_id]
+    _refresh_neighbors(event_id)
+    for other_id in affected:
+        _refresh_neighbors(other_id)
+
+
+def build(interactions: Iterable[Tuple[int, int]]) -> Index:
+    """Compute every structure from scratch out of (user_id, event_id) pairs.
+
+    Only reads ``interactions``, so it is safe to run on another thread.
+    """
+    user_items: Dict[int, Dict[int, int]] = defaultdict(dict)
+    for user_id, event_id in interactions:
+        items = user_items[user_id]
+        items[event_id] = items.get(event_id, 0) + 1
+
+    item_users: Dict[int, int] = defaultdict(int)
+    cooccurrence: Dict[int, Dict[int, int]] = defaultdict(dict)
+    for items in user_items.values():
+        event_ids = list(items)
+        for i, event_id in enumerate(event_ids):
+            item_users[event_id] += 1
+            row = cooccurrence[event_id]
+            for other_id in event_ids[:i] + event_ids[i + 1:]:
+                row[other_id] = row.get(other_id, 0) + 1
+
+    neighbors = {event_id: _top_neighbors(event_id, row, item_users)
+                 for event_id, row in cooccurrence.items() if row}
+    return user_items, item_users, cooccurrence, neighbors
+
+
+def start_rebuild():
+    """Journal interactions from now on, for ``install`` to replay."""
+    global _journal
+    _journal = []
+
+
+def abandon_rebuild():
+    global _journal
+    _journal = None
+
+
+def install(index: Index):
+    """Swap in structures from ``build`` and replay what was journaled meanwhile."""
+    global _user_items, _item_users, _cooccurrence, _neighbors, _journal
+    journal, _journal = _journal or [], None
+    _user_items, _item_users, _cooccurrence, _neighbors = index
+    for user_id, event_id, delta in journal:
+        if delta > 0:
+            record_interaction(user_id, event_id)
+        else:
+            remove_interaction(user_id, event_id)
+
+
+def rebuild(interactions: Iterable[Tuple[int, int]]):
+    install(build(interactions))
+
+
+def recommend_for_user(user_id: int, limit: int = 10) -> List[int]:
+    items = _user_items.get(user_id, {})
+    scores: Dict[int, float] = defaultdict(float)
+    for event_id in items:
+        for similarity, other_id in _neighbors.get(event_id, ()):
+            if other_id not in items:
+                scores[other_id] += similarity
+    if not scores:
+        # Cold start: fall back to the most popular events the user has not seen.
+        scores.update((event_id, float(count)) for event_id, count in _item_users.items()
+                      if event_id not in items)
+    best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+    return [event_id for event_id, _ in best]
@@ -0,0 +1,417 @@
+"""
+Event reminders for Tokyo Weekend Events API
+
+A schedule entry with ``reminder`` set asks for a reminder LEAD_TIME before
+its event starts. Pending reminders are kept in a min-heap keyed on that due
+time, so the delivery task only ever looks at the top of the heap and sleeps
+until it falls due, however many reminders are pending. Moving or cancelling
+a reminder does not search the heap: ``_pending`` records which heap entry
+is live for each (user, event), superseded entries are skipped when they
+surface, and the heap is compacted once they outnumber the live ones.
+
+Due reminders are handed in batches of up to BATCH_SIZE to a sink, an async
+callable taking a list of ``Reminder``: ``log_sink``, or ``WebhookSink``
+posting JSON to TWE_REMINDER_WEBHOOK when that is set. A batch the sink
+fails on is retried after RETRY_SECONDS. Right before delivery each reminder
+is checked against its event's current start time, which also catches
+events moved or deleted by another worker.
+
+With TWE_REMINDER_SNAPSHOT set, pending reminders are written there every
+SNAPSHOT_SECONDS when they changed and at shutdown, and loaded again at
+startup. Like schedules, reminders are per process, so every worker needs
+its own snapshot path. For local testing, a stand-in webhook that prints
+the batches it receives:
+
+    python -m app.reminders serve --port 8091
+"""
+import argparse
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import os
+import struct
+import tempfile
+import threading
+import urllib.request
+from collections import defaultdict
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from app import clock, metrics
+
+logger = logging.getLogger(__name__)
+
+LEAD_TIME = timedelta(minutes=int(os.environ.get("TWE_REMINDER_LEAD_MINUTES", "60")))
+WEBHOOK_URL = os.environ.get("TWE_REMINDER_WEBHOOK")
+SNAPSHOT_PATH = os.environ.get("TWE_REMINDER_SNAPSHOT")
+BATCH_SIZE = 500
+RETRY_SECONDS = 30
+SNAPSHOT_SECONDS = 60
+# Wake up at least this often, so a wall clock change is noticed.
+MAX_SLEEP_SECONDS = 60
+COMPACT_MIN_STALE = 1024
+DEFAULT_PORT = 8091
+
+MAGIC = b"TWER"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<4sHHQ")
+# user id, event id, due time, event start time (microseconds since the epoch)
+_ROW = struct.Struct("<qqqq")
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+Key = Tuple[int, int]
+
+
+class Reminder(NamedTuple):
+    user_id: int
+    event_id: int
+    due: datetime
+    start_datetime: datetime
+
+
+Sink = Callable[[List[Reminder]], Awaitable[None]]
+
+_lock = threading.Lock()
+# (due, sequence, (user_id, event_id)); the sequence also identifies the live entry.
+_heap: List[Tuple[datetime, int, Key]] = []
+# (user_id, event_id) -> (sequence of its live heap entry, event start time)
+_pending: Dict[Key, Tuple[int, datetime]] = {}
+# event_id -> user ids with a pending reminder for it
+_by_event: Dict[int, Set[int]] = defaultdict(set)
+_sequence = itertools.count()
+_dirty = False
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_wake: Optional[asyncio.Event] = None
+
+OUTCOMES = metrics.Counter("twe_reminders", "Due reminders by outcome.", ("outcome",))
+metrics.Gauge("twe_reminders_pending", "Reminders waiting to fall due.", lambda: len(_pending))
+
+
+def _micros(value: datetime) -> int:
+    return (value - _EPOCH) // _MICROSECOND
+
+
+def _push(key: Key, start_datetime: datetime, now: datetime,
+          due: Optional[datetime] = None) -> bool:
+    """Queue or move the reminder for ``key``; return whether it is now the next due."""
+    if start_datetime <= now:
+        _discard(key)
+        return False
+    sequence = next(_sequence)
+    due = start_datetime - LEAD_TIME if due is None else due
+    _pending[key] = (sequence, start_datetime)
+    _by_event[key[1]].add(key[0])
+    heapq.heappush(_heap, (due, sequence, key))
+    return _heap[0][1] == sequence
+
+
+def _discard(key: Key) -> bool:
+    if _pending.pop(key, None) is None:
+        return False
+    users = _by_event.get(key[1])
+    if users is not None:
+        users.discard(key[0])
+        if not users:
+            del _by_event[key[1]]
+    return True
+
+
+def _is_live(entry: Tuple[datetime, int, Key]) -> bool:
+    live = _pending.get(entry[2])
+    return live is not None and live[0] == entry[1]
+
+
+def _changed():
+    global _dirty
+    _dirty = True
+    stale = len(_heap) - len(_pending)
+    if stale > COMPACT_MIN_STALE and stale > len(_pending):
+        _heap[:] = [entry for entry in _heap if _is_live(entry)]
+        heapq.heapify(_heap)
+
+
+def _notify():
+    """Wake the delivery task so it looks at the new top of the heap."""
+    if _loop is None or _wake is None:
+        return
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is _loop:
+        _wake.set()
+    else:
+        _loop.call_soon_threadsafe(_wake.set)
+
+
+def schedule(user_id: int, event_id: int, start_datetime: datetime):
+    """Remind ``user_id`` of ``event_id``, replacing any reminder already pending."""
+    with _lock:
+        earliest = _push((user_id, event_id), start_datetime, clock.now())
+        _changed()
+    if earliest:
+        _notify()
+
+
+def cancel(user_id: int, event_id: int):
+    with _lock:
+        if _discard((user_id, event_id)):
+            _changed()
+
+
+def move_event(event_id: int, start_datetime: datetime):
+    """Reschedule every pending reminder of an event that now starts at ``start_datetime``."""
+    with _lock:
+        users = _by_event.get(event_id)
+        if not users:
+            return
+        moved = [user_id for user_id in users if _pending[(user_id, event_id)][1] != start_datetime]
+        if not moved:
+            return
+        now = clock.now()
+        earliest = False
+        for user_id in moved:
+            earliest = _push((user_id, event_id), start_datetime, now) or earliest
+        _changed()
+    if earliest:
+        _notify()
+
+
+def cancel_event(event_id: int):
+    with _lock:
+        users = _by_event.get(event_id)
+        if not users:
+            return
+        for user_id in list(users):
+            _discard((user_id, event_id))
+        _changed()
+
+
+def replace(entries: Iterable[Tuple[int, int, datetime]]):
+    """Replace every pending reminder with (user_id, event_id, start_datetime) entries."""
+    now = clock.now()
+    with _lock:
+        _heap.clear()
+        _pending.clear()
+        _by_event.clear()
+        for user_id, event_id, start_datetime in entries:
+            if start_datetime > now:
+                _add_loaded((user_id, event_id), start_datetime - LEAD_TIME, start_datetime)
+        heapq.heapify(_heap)
+        _changed()
+    _notify()
+
+
+def _add_loaded(key: Key, due: datetime, start_datetime: datetime):
+    # Bulk loading appends and leaves the heapify to the caller.
+    sequence = next(_sequence)
+    _pending[key] = (sequence, start_datetime)
+    _by_event[key[1]].add(key[0])
+    _heap.append((due, sequence, key))
+
+
+def pending_count() -> int:
+    return len(_pending)
+
+
+def next_due() -> Optional[datetime]:
+    with _lock:
+        while _heap:
+            if _is_live(_heap[0]):
+                return _heap[0][0]
+            heapq.heappop(_heap)
+    return None
+
+
+def pop_due(now: datetime, limit: int = BATCH_SIZE) -> List[Reminder]:
+    """Remove and return up to ``limit`` reminders due at ``now``, earliest first."""
+    batch = []
+    with _lock:
+        while _heap and _heap[0][0] <= now and len(batch) < limit:
+            entry = heapq.heappop(_heap)
+            if not _is_live(entry):
+                continue
+            due, _, key = entry
+            start_datetime = _pending[key][1]
+            _discard(key)
+            batch.append(Reminder(key[0], key[1], due, start_datetime))
+        if batch:
+            _changed()
+    return batch
+
+
+async def _deliver(sink: Sink, current_start: Callable[[int], Optional[datetime]],
+                   batch: List[Reminder], now: datetime):
+    ready = []
+    for reminder in batch:
+        start_datetime = current_start(reminder.event_id)
+        if start_datetime is None:
+            OUTCOMES.inc(("deleted",))
+        elif start_datetime != reminder.start_datetime:
+            # Moved where this process did not see it (another worker's upsert).
+            OUTCOMES.inc(("moved",))
+            schedule(reminder.user_id, reminder.event_id, start_datetime)
+        elif start_datetime <= now:
+            OUTCOMES.inc(("expired",))
+        else:
+            ready.append(reminder)
+    if not ready:
+        return
+    try:
+        await sink(ready)
+    except Exception:
+        logger.exception("Reminder sink failed; retrying %d reminders in %ss",
+                         len(ready), RETRY_SECONDS)
+        OUTCOMES.inc(("failed",), len(ready))
+        retry_at = now + timedelta(seconds=RETRY_SECONDS)
+        with _lock:
+            for reminder in ready:
+                key = (reminder.user_id, reminder.event_id)
+                # Unless it was scheduled again meanwhile.
+                if key not in _pending:
+                    _push(key, reminder.start_datetime, now, due=retry_at)
+            _changed()
+        return
+    OUTCOMES.inc(("delivered",), len(ready))
+
+
+async def run(sink: Sink, current_start: Callable[[int], Optional[datetime]]):
+    """Deliver reminders as they fall due, until cancelled.
+
+    ``current_start(event_id)`` returns the event's start time now, or None
+    once the event is gone.
+    """
+    global _loop, _wake
+    _loop = asyncio.get_running_loop()
+    _wake = asyncio.Event()
+    try:
+        while True:
+            _wake.clear()
+            due = next_due()
+            now = clock.now()
+            if due is None or due > now:
+                timeout = MAX_SLEEP_SECONDS if due is None else \
+                    min(MAX_SLEEP_SECONDS, (due - now).total_seconds())
+                try:
+                    await asyncio.wait_for(_wake.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await _deliver(sink, current_start, pop_due(now), now)
+    finally:
+        _loop = _wake = None
+
+
+async def log_sink(batch: List[Reminder]):
+    for reminder in batch:
+        logger.info("Reminder for user %s: event %s starts at %s", reminder.user_id,
+                    reminder.event_id, reminder.start_datetime.isoformat())
+
+
+class WebhookSink:
+    """POSTs every batch as JSON to ``url``; any non-2xx response fails the batch."""
+
+    def __init__(self, url: str, timeout: float = 10):
+        self.url = url
+        self.timeout = timeout
+
+    async def __call__(self, batch: List[Reminder]):
+        body = json.dumps({"reminders": [{
+            "user_id": reminder.user_id,
+            "event_id": reminder.event_id,
+            "start_datetime": reminder.start_datetime.isoformat(),
+        } for reminder in batch]}, ensure_ascii=False).encode()
+        await asyncio.get_running_loop().run_in_executor(None, self._post, body)
+
+    def _post(self, body: bytes):
+        request = urllib.request.Request(self.url, data=body, method="POST",
+                                         headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+def default_sink() -> Sink:
+    return WebhookSink(WEBHOOK_URL) if WEBHOOK_URL else log_sink
+
+
+def write_snapshot(path: str) -> int:
+    """Write the pending reminders to ``path``, replacing it atomically."""
+    global _dirty
+    with _lock:
+        rows = [(key[0], key[1], _micros(due), _micros(_pending[key][1]))
+                for due, sequence, key in _heap if _is_live((due, sequence, key))]
+        _dirty = False
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as stream:
+            stream.write(_HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(rows)))
+            stream.writelines(_ROW.pack(*row) for row in rows)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+    return len(rows)
+
+
+def load_snapshot(path: str) -> int:
+    """Add the reminders saved in ``path`` that are still ahead; return how many."""
+    with open(path, "rb") as stream:
+        data = stream.read()
+    magic, version, _, count = _HEADER.unpack_from(data)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError(f"{path} is not a reminder snapshot")
+    rows = memoryview(data)[_HEADER.size:_HEADER.size + count * _ROW.size]
+    now = _micros(clock.now())
+    loaded = 0
+    with _lock:
+        for user_id, event_id, due, start in _ROW.iter_unpack(rows):
+            key = (user_id, event_id)
+            # Anything scheduled since startup is newer than the snapshot.
+            if start <= now or key in _pending:
+                continue
+            _add_loaded(key, _EPOCH + due * _MICROSECOND, _EPOCH + start * _MICROSECOND)
+            loaded += 1
+        heapq.heapify(_heap)
+    _notify()
+    return loaded
+
+
+async def snapshot_periodically(path: str):
+    while True:
+        await asyncio.sleep(SNAPSHOT_SECONDS)
+        if _dirty:
+            await asyncio.get_running_loop().run_in_executor(None, write_snapshot, path)
+
+
+class _PrintingWebhook(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        for reminder in json.loads(body)["reminders"]:
+            print(json.dumps(reminder, ensure_ascii=False), flush=True)
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in reminder webhook that prints batches")
+    parser.add_argument("command", choices=("serve",))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+    print(f"listening on {args.host}:{args.port}", flush=True)
+    try:
+        ThreadingHTTPServer((args.host, args.port), _PrintingWebhook).serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+"""
+Seat reservations for Tokyo Weekend Events API
+
+Every event with a capacity gets a counter of remaining seats split over
+SHARDS slices, each behind its own lock. Each thread draws from its own
+home slice and only moves on to the others when that runs dry. When no
+single slice can cover a request, the reservation locks all of them (in
+order) and takes across slices. Threads reserving the same popular event
+therefore rarely wait on each other. No path takes seats that the slices do
+not hold, so an event can never be oversold.
+
+A request that finds the event full joins the event's FIFO waitlist, and
+newcomers queue behind anyone already waiting. Released seats go to the
+head of the waitlist first. Promotions are announced on the user's event
+stream.
+
+Clients send an ``Idempotency-Key`` header so that a retried request returns
+the original reservation instead of taking seats twice. A key is remembered
+for IDEMPOTENCY_TTL_SECONDS, and only until its reservation is released or
+cancelled; after that it counts as a new key. At most MAX_IDEMPOTENCY_KEYS
+are kept, dropping the oldest first.
+
+Like schedules, reservations live in the process. With several workers,
+reservation requests must be routed to a single one of them.
+"""
+import itertools
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from app import clock, metrics, streaming
+from app.models import Reservation
+
+SHARDS = 8
+KEY_LOCKS = 64
+MAX_SEATS_PER_RESERVATION = 10
+IDEMPOTENCY_TTL_SECONDS = 24 * 60 * 60
+MAX_IDEMPOTENCY_KEYS = 100000
+
+CONFIRMED = "confirmed"
+WAITLISTED = "waitlisted"
+RELEASED = "released"
+CANCELLED = "cancelled"
+
+OUTCOMES = metrics.Counter("twe_reservations", "Reservation requests and changes by outcome.",
+                           ("outcome",))
+
+
+class IdempotencyConflict(ValueError):
+    pass
+
+
+class _Seats:
+    """Remaining seats of one event, split over SHARDS independently locked slices."""
+
+    __slots__ = ("capacity", "slices", "locks", "deficit")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.slices = _spread(capacity)
+        self.locks = [threading.Lock() for _ in range(SHARDS)]
+        # Seats sold beyond a reduced capacity; paid off by releases first.
+        self.deficit = 0
+
+    def remaining(self) -> int:
+        return sum(self.slices) - self.deficit
+
+    def take(self, quantity: int, home: int) -> bool:
+        slices = self.slices
+        for offset in range(SHARDS):
+            i = (home + offset) % SHARDS
+            # Peek without the lock; the lock holder rechecks.
+            if slices[i] < quantity:
+                continue
+            with self.locks[i]:
+                if slices[i] >= quantity:
+                    slices[i] -= quantity
+                    return True
+        # No slice holds enough on its own: take across all of them at once.
+        with _all(self.locks):
+            if sum(slices) < quantity:
+                return False
+            for i in range(SHARDS):
+                taken = min(slices[i], quantity)
+                slices[i] -= taken
+                quantity -= taken
+                if not quantity:
+                    break
+            return True
+
+    def give(self, quantity: int, home: int):
+        if not self.deficit:
+            with self.locks[home]:
+                if not self.deficit:
+                    self.slices[home] += quantity
+                    return
+        with _all(self.locks):
+            paid = min(self.deficit, quantity)
+            self.deficit -= paid
+            self.slices[home] += quantity - paid
+
+    def resize(self, capacity: int):
+        with _all(self.locks):
+            sold = self.capacity - sum(self.slices) + self.deficit
+            self.capacity = capacity
+            self.slices[:] = _spread(max(0, capacity - sold))
+            self.deficit = max(0, sold - capacity)
+
+
+class _all:
+    """Hold every lock of a counter, always acquired in the same order."""
+
+    __slots__ = ("locks",)
+
+    def __init__(self, locks: List[threading.Lock]):
+        self.locks = locks
+
+    def __enter__(self):
+        for lock in self.locks:
+            lock.acquire()
+
+    def __exit__(self, *exc_info):
+        for lock in reversed(self.locks):
+            lock.release()
+
+
+def _spread(seats: int) -> List[int]:
+    base, extra = divmod(seats, SHARDS)
+    return [base + (i < extra) for i in range(SHARDS)]
+
+
+class _EventState:
+    __slots__ = ("seats", "waitlist", "lock")
+
+    def __init__(self, capacity: int):
+        self.seats = _Seats(capacity)
+        self.waitlist: Deque[Reservation] = deque()
+        # Guards the waitlist and every status change of the event's reservations.
+        self.lock = threading.Lock()
+
+
+_states: Dict[int, _EventState] = {}
+_states_lock = threading.Lock()
+_reservations: Dict[int, Reservation] = {}
+_by_user: Dict[int, List[int]] = defaultdict(list)
+# (user_id, Idempotency-Key) -> (reservation id, monotonic expiry), oldest first
+_idempotency: "OrderedDict[Tuple[int, str], Tuple[int, float]]" = OrderedDict()
+# reservation id -> its key, to forget the key when the reservation ends
+_idempotency_keys: Dict[int, Tuple[int, str]] = {}
+_idempotency_lock = threading.Lock()
+_key_locks = [threading.Lock() for _ in range(KEY_LOCKS)]
+_ids = itertools.count(1)
+_homes = itertools.count()
+_local = threading.local()
+
+
+def _home() -> int:
+    """The slice this thread reserves from first."""
+    try:
+        return _local.home
+    except AttributeError:
+        home = _local.home = next(_homes) % SHARDS
+        return home
+
+
+def _state(event_id: int, capacity: int) -> _EventState:
+    state = _states.get(event_id)
+    if state is None:
+        with _states_lock:
+            state = _states.get(event_id)
+            if state is None:
+                state = _states[event_id] = _EventState(capacity)
+    return state
+
+
+def reserve(event_id: int, capacity: int, user_id: int, quantity: int,
+            key: Optional[str] = None) -> Tuple[Reservation, bool]:
+    """Reserve ``quantity`` seats or join the waitlist; return (reservation, replayed).
+
+    ``replayed`` is True when ``key`` was already used by this user, in which
+    case nothing changes and the original reservation is returned.
+    """
+    if key is None:
+        return _reserve(_state(event_id, capacity), event_id, user_id, quantity), False
+    with _key_locks[hash((user_id, key)) % KEY_LOCKS]:
+        existing = _remembered((user_id, key))
+        if existing is not None:
+            reservation = _reservations[existing]
+            if reservation.event_id != event_id or reservation.quantity != quantity:
+                raise IdempotencyConflict("Idempotency-Key was already used for another reservation")
+            return reservation, True
+        reservation = _reserve(_state(event_id, capacity), event_id, user_id, quantity)
+        _remember((user_id, key), reservation.id)
+        return reservation, False
+
+
+def _remembered(user_key: Tuple[int, str]) -> Optional[int]:
+    with _idempotency_lock:
+        entry = _idempotency.get(user_key)
+    if entry is None or entry[1] <= time.monotonic():
+        return None
+    return entry[0]
+
+
+def _remember(user_key: Tuple[int, str], reservation_id: int):
+    now = time.monotonic()
+    with _idempotency_lock:
+        # An expired entry for the same key must not keep its old place.
+        previous = _idempotency.pop(user_key, None)
+        if previous is not None:
+            _idempotency_keys.pop(previous[0], None)
+        _idempotency[user_key] = (reservation_id, now + IDEMPOTENCY_TTL_SECONDS)
+        _idempotency_keys[reservation_id] = user_key
+        # Every entry lives equally long, so the oldest is also the first to expire.
+        while len(_idempotency) > MAX_IDEMPOTENCY_KEYS or next(iter(_idempotency.values()))[1] <= now:
+            _, (evicted, _) = _idempotency.popitem(last=False)
+            _idempotency_keys.pop(evicted, None)
+
+
+def _forget(reservation_id: int):
+    with _idempotency_lock:
+        user_key = _idempotency_keys.pop(reservation_id, None)
+        if user_key is not None:
+            del _idempotency[user_key]
+
+
+def _reserve(state: _EventState, event_id: int, user_id: int, quantity: int) -> Reservation:
+    # Seats released while people wait are theirs: only take seats with nobody queued.
+    # The waitlist is read without state.lock. If it is stale the other way and
+    # we queue needlessly, the _promote below confirms us at once. If someone
+    # joins just after we look, we can only take seats they had already failed
+    # to get, and their own _promote hands them any seats left after ours. So
+    # seats are never oversold and nobody waits while seats are free.
+    confirmed = not state.waitlist and state.seats.take(quantity, _home())
+    reservation = Reservation(id=next(_ids), event_id=event_id, user_id=user_id,
+                              quantity=quantity, status=CONFIRMED if confirmed else WAITLISTED,
+                              created_at=clock.now())
+    _reservations[reservation.id] = reservation
+    _by_user[user_id].append(reservation.id)
+    if confirmed:
+        OUTCOMES.inc((CONFIRMED,))
+        return reservation
+    with state.lock:
+        state.waitlist.append(reservation)
+    OUTCOMES.inc((WAITLISTED,))
+    # Seats may have been released since the attempt above.
+    _promote(state)
+    with state.lock:
+        _update_position(state, reservation)
+    return reservation
+
+
+def _update_position(state: _EventState, reservation: Reservation):
+    """Set a reservation's place among those still waiting; call under state.lock."""
+    if reservation.status != WAITLISTED:
+        reservation.position = None
+        return
+    ahead = 0
+    for waiting in state.waitlist:
+        if waiting is reservation:
+            break
+        ahead += waiting.status == WAITLISTED
+    reservation.position = ahead + 1
+
+
+def _promote(state: _EventState):
+    """Confirm waitlisted reservations in order for as long as seats last."""
+    promoted = []
+    with state.lock:
+        waitlist = state.waitlist
+        while waitlist:
+            head = waitlist[0]
+            if head.status != WAITLISTED:
+                waitlist.popleft()
+                continue
+            if not state.seats.take(head.quantity, _home()):
+                break
+            waitlist.popleft()
+            head.status = CONFIRMED
+            head.position = None
+            promoted.append(head)
+    for reservation in promoted:
+        OUTCOMES.inc(("promoted",))
+        streaming.publish("reservation", {"op": CONFIRMED, "id": reservation.id,
+                                          "event_id": reservation.event_id,
+                                          "quantity": reservation.quantity},
+                          user_id=reservation.user_id)
+
+
+def release(user_id: int, event_id: int, reservation_id: int) -> Optional[Reservation]:
+    """Give back a reservation's seats, or leave the waitlist; None if not the user's.
+
+    Releasing again is harmless and returns the reservation unchanged.
+    """
+    reservation = _reservations.get(reservation_id)
+    if reservation is None or reservation.user_id != user_id or reservation.event_id != event_id:
+        return None
+    state = _states[event_id]
+    with state.lock:
+        if reservation.status == WAITLISTED:
+            reservation.status = CANCELLED
+            reservation.position = None
+            _forget(reservation_id)
+            OUTCOMES.inc((CANCELLED,))
+            return reservation
+        if reservation.status != CONFIRMED:
+            return reservation
+        reservation.status = RELEASED
+    _forget(reservation_id)
+    state.seats.give(reservation.quantity, _home())
+    OUTCOMES.inc((RELEASED,))
+    _promote(state)
+    return reservation
+
+
+def resize(event_id: int, capacity: Optional[int]):
+    """Apply a changed capacity to an event that already has reservations.
+
+    Seats already sold stay sold. If they exceed the new capacity, releases
+    pay off the excess before anyone else gets the seats back.
+    """
+    state = _states.get(event_id)
+    if state is None or capacity is None:
+        return
+    state.seats.resize(capacity)
+    _promote(state)
+
+
+def availability(event_id: int, capacity: int) -> Tuple[int, int]:
+    """Return (remaining seats, reservations waiting) for an event."""
+    state = _states.get(event_id)
+    if state is None:
+        return capacity, 0
+    with state.lock:
+        waiting = sum(1 for reservation in state.waitlist if reservation.status == WAITLISTED)
+    return max(0, state.seats.remaining()), waiting
+
+
+def user_reservations(user_id: int) -> List[Reservation]:
+    """The user's reservations, with waitlist positions as of now."""
+    result = [_reservations[reservation_id] for reservation_id in _by_user.get(user_id, ())]
+    for reservation in result:
+        if reservation.status == WAITLISTED:
+            state = _states[reservation.event_id]
+            with state.lock:
+                _update_position(state, reservation)
+    return result
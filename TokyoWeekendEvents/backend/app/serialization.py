@@ -0,0 +1,159 @@
+"""
+Precomputed response representations for Tokyo Weekend Events API
+
+Every event is serialized once, when it is written: to JSON bytes and to its
+``EventSummary`` projection. Endpoints then build their bodies by joining
+cached byte fragments (or picking keys out of a JSON-ready dict, decoded from
+those bytes on first use, for ``fields=`` subsets) instead of validating and
+serializing pydantic models through ``response_model`` on every request.
+Only the DOCUMENT_CACHE_SIZE most recently used of those dicts are kept.
+"""
+import json
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pydantic import TypeAdapter
+
+from app.models import Event, EventSummary, NearbyPlace
+
+SUMMARY = "summary"
+EVENT_FIELDS = frozenset(Event.model_fields)
+DOCUMENT_CACHE_SIZE = 10000
+
+_event_adapter = TypeAdapter(Event)
+_summary_adapter = TypeAdapter(EventSummary)
+_place_adapter = TypeAdapter(NearbyPlace)
+
+_event_json: Dict[int, bytes] = {}
+_summary_json: Dict[int, bytes] = {}
+_place_json: Dict[int, bytes] = {}
+_documents: "OrderedDict[int, dict]" = OrderedDict()
+
+
+def summarize(event: Event) -> EventSummary:
+    return EventSummary(
+        id=event.id,
+        name=event.name,
+        start_datetime=event.start_datetime,
+        end_datetime=event.end_datetime,
+        area=event.location.area,
+        category=event.category
+    )
+
+
+def store_event(event: Event):
+    load_event(event.id, _event_adapter.dump_json(event),
+               _summary_adapter.dump_json(summarize(event)))
+
+
+def load_event(event_id: int, body: bytes, summary: bytes):
+    """Cache already-serialized JSON for an event, e.g. from a snapshot.
+
+    ``body`` and ``summary`` may be memoryviews into a shared snapshot; they
+    are joined into responses without being copied.
+    """
+    _event_json[event_id] = body
+    _summary_json[event_id] = summary
+    _documents.pop(event_id, None)
+
+
+def drop_event(event_id: int):
+    _event_json.pop(event_id, None)
+    _summary_json.pop(event_id, None)
+    _documents.pop(event_id, None)
+
+
+def store_place(place: NearbyPlace):
+    _place_json[place.id] = _place_adapter.dump_json(place)
+
+
+def load_place(place_id: int, body: bytes):
+    _place_json[place_id] = body
+
+
+def clear():
+    _event_json.clear()
+    _summary_json.clear()
+    _documents.clear()
+    _place_json.clear()
+
+
+def rebuild(events: Iterable[Event], places: Iterable[NearbyPlace]):
+    clear()
+    for event in events:
+        store_event(event)
+    for place in places:
+        store_place(place)
+
+
+def event_json(event_id: int) -> bytes:
+    return bytes(_event_json[event_id])
+
+
+def event_fragments(event_id: int) -> Tuple[bytes, bytes]:
+    """Cached (event JSON, summary JSON) as stored, possibly as memoryviews."""
+    return _event_json[event_id], _summary_json[event_id]
+
+
+def place_json(place_id: int) -> bytes:
+    return _place_json[place_id]
+
+
+def _document(event_id: int) -> dict:
+    document = _documents.get(event_id)
+    if document is None:
+        document = _documents[event_id] = json.loads(bytes(_event_json[event_id]))
+        if len(_documents) > DOCUMENT_CACHE_SIZE:
+            _documents.popitem(last=False)
+    else:
+        _documents.move_to_end(event_id)
+    return document
+
+
+def join_json(fragments: Iterable[bytes]) -> bytes:
+    return b"[" + b",".join(fragments) + b"]"
+
+
+def to_json(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def object_json(members: Dict[str, bytes]) -> bytes:
+    """Assemble a JSON object whose member values are already-encoded fragments."""
+    return b"{" + b",".join(to_json(name) + b":" + value for name, value in members.items()) + b"}"
+
+
+def events_json(events: Iterable[Event], summary: bool = False) -> bytes:
+    return event_ids_json((e.id for e in events), summary)
+
+
+def event_ids_json(event_ids: Iterable[int], summary: bool = False) -> bytes:
+    """Like ``events_json`` for ids already known to be in the catalog."""
+    cache = _summary_json if summary else _event_json
+    return join_json(cache[event_id] for event_id in event_ids)
+
+
+def places_json(places: Iterable[NearbyPlace]) -> bytes:
+    return join_json(_place_json[p.id] for p in places)
+
+
+def parse_fields(fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """Turn a ``fields=`` value into a tuple of names, ``(SUMMARY,)`` or None."""
+    if not fields:
+        return None
+    names = tuple(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    if names == (SUMMARY,):
+        return names
+    unknown = [name for name in names if name not in EVENT_FIELDS]
+    if unknown or not names:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return names
+
+
+def project(events: Iterable[Event], fields: Tuple[str, ...]) -> List[dict]:
+    return project_ids((e.id for e in events), fields)
+
+
+def project_ids(event_ids: Iterable[int], fields: Tuple[str, ...]) -> List[dict]:
+    documents = (_document(event_id) for event_id in event_ids)
+    return [{name: document[name] for name in fields} for document in documents]
@@ -0,0 +1,208 @@
+"""
+Shared-memory catalog for Tokyo Weekend Events API
+
+When TWE_SHARED_CATALOG names a catalog, every uvicorn worker on the host
+serves the same snapshot (see ``app.snapshot``) out of POSIX shared memory
+instead of keeping its own copy. Event JSON is served straight from the
+segment through memoryviews, so the bulk of the catalog is mapped once no
+matter how many workers there are.
+
+Each published snapshot is a new, immutable segment ``<name>-<generation>``.
+A small control segment ``<name>`` holds the current generation and segment
+name behind a sequence counter (a seqlock): the writer makes the counter odd,
+updates the record and makes it even again, and readers retry until they see
+the same even value before and after reading. Swapping generations is
+therefore atomic for readers, and a reader that already mapped the previous
+generation keeps a valid mapping after it is unlinked.
+
+A generation starts with a short state record ahead of the snapshot, opaque
+to this module. The store keeps the catalog version, its epoch and the tail
+of its change log there, so every worker reports the same ones.
+
+There is a single writer at a time: publishers serialize on a lock file, and
+a worker holds it across a whole write, from catching up with the current
+generation to publishing its own. Segments deliberately
+outlive the workers, so a restarted worker attaches instead of reloading;
+``python -m app.shared_catalog unlink <name>`` removes them.
+"""
+import argparse
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Iterator, List, Optional, Tuple
+
+from app.snapshot import Blob
+
+_CONTROL = struct.Struct("<QQ64s")
+_SEQUENCE = struct.Struct("<Q")
+_STATE = struct.Struct("<I")
+
+
+def _untrack(segment: SharedMemory):
+    # Before 3.13 every attach registers the segment with this process's
+    # resource tracker, which would unlink it when the worker exits.
+    if sys.version_info < (3, 13):
+        resource_tracker.unregister(segment._name, "shared_memory")
+
+
+def _open(name: str, create: bool = False, size: int = 0) -> SharedMemory:
+    if sys.version_info >= (3, 13):
+        return SharedMemory(name=name, create=create, size=size, track=False)
+    segment = SharedMemory(name=name, create=create, size=size)
+    _untrack(segment)
+    return segment
+
+
+class SharedCatalog:
+    def __init__(self, name: str, create: bool = True):
+        """Open the control segment of ``name``, creating it unless ``create`` is False."""
+        self.name = name
+        try:
+            if not create:
+                raise FileExistsError(name)
+            self._control = _open(name, create=True, size=_CONTROL.size)
+            self._control.buf[:_CONTROL.size] = bytes(_CONTROL.size)
+        except FileExistsError:
+            self._control = _open(name)
+        self._lock_path = os.path.join(tempfile.gettempdir(), f"{name}.lock")
+        self._lock_depth = 0
+        self._lock_file = None
+        self._lock_mutex = threading.Lock()
+
+    def current(self) -> Tuple[int, str]:
+        """Return (generation, segment name); generation 0 means nothing is published."""
+        buf = self._control.buf
+        while True:
+            before = _SEQUENCE.unpack_from(buf)[0]
+            if before % 2:
+                time.sleep(0)
+                continue
+            _, generation, raw = _CONTROL.unpack_from(buf)
+            if _SEQUENCE.unpack_from(buf)[0] == before:
+                return generation, raw.rstrip(b"\0").decode()
+
+    def generation(self) -> int:
+        return self.current()[0]
+
+    def attach(self) -> Optional[Tuple[int, SharedMemory]]:
+        """Map the current generation, or return None if there is none yet."""
+        while True:
+            generation, segment_name = self.current()
+            if generation == 0:
+                return None
+            try:
+                return generation, _open(segment_name)
+            except FileNotFoundError:
+                # Unlinked by a newer publish between reading and mapping.
+                continue
+
+    @contextmanager
+    def lock(self) -> Iterator[None]:
+        """Exclusive across processes; held by the process, not the thread.
+
+        Once one thread has it, every thread of this process passes straight
+        through until the last of them lets go. Callers that need exclusion
+        among their own threads must add it themselves.
+        """
+        import fcntl
+
+        with self._lock_mutex:
+            if self._lock_depth == 0:
+                self._lock_file = open(self._lock_path, "a")
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            self._lock_depth += 1
+        try:
+            yield
+        finally:
+            with self._lock_mutex:
+                self._lock_depth -= 1
+                if self._lock_depth == 0:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+                    self._lock_file.close()
+                    self._lock_file = None
+
+    def publish(self, parts: List[Blob], size: int, state: bytes = b"") -> int:
+        """Copy ``state`` and a snapshot into a new segment and make it current."""
+        with self.lock():
+            previous_generation, previous_name = self.current()
+            generation = previous_generation + 1
+            segment_name = f"{self.name}-{generation}"
+            segment = _open(segment_name, create=True, size=_STATE.size + len(state) + size)
+            offset = 0
+            for part in (_STATE.pack(len(state)), state, *parts):
+                segment.buf[offset:offset + len(part)] = part
+                offset += len(part)
+            segment.close()
+
+            buf = self._control.buf
+            sequence = _SEQUENCE.unpack_from(buf)[0]
+            _SEQUENCE.pack_into(buf, 0, sequence + 1)
+            _CONTROL.pack_into(buf, 0, sequence + 1, generation, segment_name.encode())
+            _SEQUENCE.pack_into(buf, 0, sequence + 2)
+
+            if previous_generation:
+                _unlink(previous_name)
+            return generation
+
+    def close(self):
+        self._control.close()
+
+
+def contents(segment: SharedMemory) -> Tuple[bytes, memoryview]:
+    """Split a generation into its state record and a view of its snapshot."""
+    (length,) = _STATE.unpack_from(segment.buf)
+    start = _STATE.size + length
+    return bytes(segment.buf[_STATE.size:start]), segment.buf[start:]
+
+
+def _unlink(name: str):
+    try:
+        segment = _open(name)
+    except FileNotFoundError:
+        return
+    segment.close()
+    if sys.version_info < (3, 13):
+        # unlink() unregisters the name from the tracker; keep its books even.
+        resource_tracker.register(segment._name, "shared_memory")
+    segment.unlink()
+
+
+def unlink(name: str):
+    """Remove the control segment and the current generation of ``name``."""
+    try:
+        control = SharedCatalog(name, create=False)
+    except FileNotFoundError:
+        return
+    _, segment_name = control.current()
+    control.close()
+    if segment_name:
+        _unlink(segment_name)
+    _unlink(name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage a shared-memory catalog")
+    parser.add_argument("command", choices=("status", "unlink"))
+    parser.add_argument("name")
+    args = parser.parse_args()
+    if args.command == "unlink":
+        unlink(args.name)
+        return
+    try:
+        control = SharedCatalog(args.name, create=False)
+    except FileNotFoundError:
+        print(f"{args.name}: not published")
+        return
+    generation, segment_name = control.current()
+    control.close()
+    print(f"{args.name}: generation {generation} in {segment_name or '-'}")
+
+
+if __name__ == "__main__":
+    main()
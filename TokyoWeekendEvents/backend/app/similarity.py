@@ -0,0 +1,215 @@
+"""
+Content-based "similar events" for Tokyo Weekend Events API
+
+Each event is a sparse TF-IDF vector over character n-grams of its name and
+description, plus one-hot category and area features. Vectors are kept in an
+inverted index so that scoring one event against the catalog only touches the
+events sharing a feature with it, and the top-k neighbors of every event are
+cached. Single upserts only refresh the cached rows whose neighbor lists can
+change; bulk loads and rebuilds just update the index and leave rows to be
+computed on first read. A full index is built with ``build``, which touches
+no module state and so can run off the event loop, and swapped in with
+``install``. Terms no event uses any more are dropped from the vocabulary.
+
+Candidates are generated from the most selective features first. Features
+shared by a large part of the catalog (common n-grams, popular categories),
+or anything past MAX_CANDIDATES, only add into the scores of candidates that
+were already found, which bounds the cost of scoring one event.
+"""
+import heapq
+import math
+from collections import Counter, defaultdict
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from app.models import Event
+
+TOP_K = 20
+MAX_SCANNED_POSTING = 2000
+MAX_CANDIDATES = 1000
+NGRAM_SIZES = (2, 3)
+CATEGORY_WEIGHT = 0.6
+AREA_WEIGHT = 0.4
+
+_vectors: Dict[int, Dict[str, float]] = {}
+_postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+_document_frequency: Counter = Counter()
+_terms: Dict[int, Counter] = {}
+_neighbors: Dict[int, List[Tuple[float, int]]] = {}
+
+# (vectors, postings, document frequency, terms) built by ``build``
+Index = Tuple[Dict[int, Dict[str, float]], Dict[str, Dict[int, float]], Counter, Dict[int, Counter]]
+
+
+def _ngrams(text: str) -> Counter:
+    text = "".join(text.lower().split())
+    grams = Counter()
+    for n in NGRAM_SIZES:
+        grams.update(text[i:i + n] for i in range(len(text) - n + 1))
+    return grams
+
+
+def _idf(term: str, documents: Dict[int, Counter] = None, frequency: Counter = None) -> float:
+    documents = _terms if documents is None else documents
+    frequency = _document_frequency if frequency is None else frequency
+    return math.log((1 + len(documents)) / (1 + frequency[term])) + 1
+
+
+def _vectorize(event: Event, terms: Counter,
+               idf: Callable[[str], float] = _idf) -> Dict[str, float]:
+    vector = {term: count * idf(term) for term, count in terms.items()}
+    norm = math.sqrt(sum(w * w for w in vector.values())) or 1.0
+    vector = {term: w / norm for term, w in vector.items()}
+    vector["category:" + event.category] = CATEGORY_WEIGHT
+    vector["area:" + event.location.area] = AREA_WEIGHT
+    norm = math.sqrt(sum(w * w for w in vector.values()))
+    return {term: w / norm for term, w in vector.items()}
+
+
+def _forget_terms(event_id: int):
+    """Take an event's terms out of the document frequencies, dropping unused ones."""
+    terms = _terms.pop(event_id, None)
+    if terms is None:
+        return
+    for term in terms:
+        count = _document_frequency[term] - 1
+        if count > 0:
+            _document_frequency[term] = count
+        else:
+            del _document_frequency[term]
+
+
+def _index(event_id: int, vector: Dict[str, float]):
+    _vectors[event_id] = vector
+    for term, weight in vector.items():
+        _postings[term][event_id] = weight
+
+
+def _unindex(event_id: int):
+    for term in _vectors.pop(event_id, {}):
+        posting = _postings.get(term)
+        if posting is not None:
+            posting.pop(event_id, None)
+            if not posting:
+                del _postings[term]
+
+
+def _scores(event_id: int) -> Dict[int, float]:
+    scores: Dict[int, float] = defaultdict(float)
+    terms = sorted(_vectors.get(event_id, {}).items(), key=lambda item: len(_postings[item[0]]))
+    for term, weight in terms:
+        posting = _postings[term]
+        if len(posting) <= MAX_SCANNED_POSTING and len(scores) < MAX_CANDIDATES:
+            for other_id, other_weight in posting.items():
+                if other_id != event_id:
+                    scores[other_id] += weight * other_weight
+        else:
+            # Postings only get longer from here on; stop adding candidates.
+            for other_id in scores:
+                other_weight = posting.get(other_id)
+                if other_weight is not None:
+                    scores[other_id] += weight * other_weight
+    return scores
+
+
+def _top(scores: Dict[int, float]) -> List[Tuple[float, int]]:
+    return heapq.nlargest(TOP_K, ((score, other_id) for other_id, score in scores.items()))
+
+
+def _offer(event_id: int, other_id: int, score: float):
+    """Update event_id's cached neighbor list after its similarity to other_id changed."""
+    row = _neighbors.get(event_id)
+    if row is None:
+        return
+    had_other = any(n == other_id for _, n in row)
+    row = [(s, n) for s, n in row if n != other_id]
+    if had_other and len(row) == TOP_K - 1 and score < row[-1][0]:
+        # other_id fell out of a full list; something else may deserve the slot.
+        _neighbors[event_id] = _top(_scores(event_id))
+        return
+    if score > 0 and (len(row) < TOP_K or score > row[-1][0]):
+        row.append((score, other_id))
+        row.sort(reverse=True)
+        del row[TOP_K:]
+    _neighbors[event_id] = row
+
+
+def index_many(events: Iterable[Event]):
+    """Add or replace many events without computing any neighbor lists.
+
+    Every cached row may be stale afterwards, so all of them are dropped and
+    recomputed lazily by ``similar_to``.
+    """
+    events = list(events)
+    for event in events:
+        _forget_terms(event.id)
+        _unindex(event.id)
+        terms = _ngrams(event.name + " " + event.description)
+        _terms[event.id] = terms
+        _document_frequency.update(terms.keys())
+    for event in events:
+        _index(event.id, _vectorize(event, _terms[event.id]))
+    _neighbors.clear()
+
+
+def build(events: Iterable[Event]) -> Index:
+    """Build a full index of ``events`` without touching the current one."""
+    events = list(events)
+    terms = {event.id: _ngrams(event.name + " " + event.description) for event in events}
+    frequency: Counter = Counter()
+    for event_terms in terms.values():
+        frequency.update(event_terms.keys())
+    idf = lambda term: _idf(term, terms, frequency)
+    vectors: Dict[int, Dict[str, float]] = {}
+    postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+    for event in events:
+        vector = vectors[event.id] = _vectorize(event, terms[event.id], idf)
+        for term, weight in vector.items():
+            postings[term][event.id] = weight
+    return vectors, postings, frequency, terms
+
+
+def install(index: Index):
+    """Swap in an index from ``build``; neighbor lists are computed on first read."""
+    global _vectors, _postings, _document_frequency, _terms, _neighbors
+    _vectors, _postings, _document_frequency, _terms = index
+    _neighbors = {}
+
+
+def rebuild(events: Iterable[Event]):
+    install(build(events))
+
+
+def upsert(event: Event):
+    previous = _scores(event.id)
+    _forget_terms(event.id)
+    _unindex(event.id)
+
+    terms = _ngrams(event.name + " " + event.description)
+    _terms[event.id] = terms
+    _document_frequency.update(terms.keys())
+    _index(event.id, _vectorize(event, terms))
+
+    scores = _scores(event.id)
+    _neighbors[event.id] = _top(scores)
+    # Similarity is symmetric, so only rows that scored against the old or the
+    # new vector can have a different neighbor list.
+    for other_id in set(previous) | set(scores):
+        _offer(other_id, event.id, scores.get(other_id, 0.0))
+
+
+def remove(event_id: int):
+    previous = _scores(event_id)
+    _forget_terms(event_id)
+    _unindex(event_id)
+    _neighbors.pop(event_id, None)
+    for other_id in previous:
+        _offer(other_id, event_id, 0.0)
+
+
+def similar_to(event_id: int, limit: int = 10) -> List[int]:
+    row = _neighbors.get(event_id)
+    if row is None:
+        if event_id not in _vectors:
+            return []
+        row = _neighbors[event_id] = _top(_scores(event_id))
+    return [other_id for _, other_id in row[:limit]]
@@ -0,0 +1,200 @@
+"""
+Binary catalog snapshots for Tokyo Weekend Events API
+
+A snapshot holds the catalog in the layout the store serves it from, so a
+worker can start from it without re-validating or re-serializing anything:
+
+    header    magic, format version, record counts, section offsets
+    strings   JSON array of area names, referenced by index
+    events    fixed-width records in (start_datetime, id) index order:
+              id, start time, area, offset/lengths of the event JSON and its
+              summary JSON
+    places    fixed-width records in id order: id, area, offset/length of JSON
+    blobs     the JSON fragments themselves, back to back
+
+The file is memory-mapped, so fixed-width tables are read in place and JSON
+is only copied out when a record is used. The same bytes can be published to
+shared memory (see ``app.shared_catalog``), where readers keep zero-copy views
+instead. Write a snapshot file from the seed catalog or a JSONL feed with:
+
+    python -m app.snapshot catalog.snap [--from events.jsonl]
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import tempfile
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator, List, Tuple, Union
+
+from app import serialization
+from app.models import Event, NearbyPlace
+from app.pagination import EventKey
+
+MAGIC = b"TWES"
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct("<4sHHIIIQQQQ")
+_EVENT = struct.Struct("<qqIQII")
+_PLACE = struct.Struct("<qIQI")
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+Blob = Union[bytes, memoryview]
+EventRow = Tuple[EventKey, str, Blob, Blob]
+PlaceRow = Tuple[int, str, Blob]
+
+
+def _micros(value: datetime) -> int:
+    return (value - _EPOCH) // _MICROSECOND
+
+
+def model_rows(events: Iterable[Event],
+               places: Iterable[NearbyPlace]) -> Tuple[List[EventRow], List[PlaceRow]]:
+    """Rows for models whose JSON is in the serialization cache."""
+    event_rows = []
+    for event in events:
+        body, summary = serialization.event_fragments(event.id)
+        event_rows.append(((event.start_datetime, event.id), event.location.area, body, summary))
+    place_rows = [(p.id, p.location.area, serialization.place_json(p.id)) for p in places]
+    return event_rows, place_rows
+
+
+def encode(event_rows: Iterable[EventRow], place_rows: Iterable[PlaceRow]) -> Tuple[List[Blob], int]:
+    """Return the snapshot of the given rows as (parts, total size)."""
+    event_rows = sorted(event_rows, key=lambda row: row[0])
+    place_rows = sorted(place_rows, key=lambda row: row[0])
+    areas = sorted({row[1] for row in event_rows} | {row[1] for row in place_rows})
+    area_index = {area: i for i, area in enumerate(areas)}
+    strings = json.dumps(areas, ensure_ascii=False).encode()
+
+    blobs: List[Blob] = []
+    offset = 0
+    event_table = bytearray()
+    for (start_datetime, event_id), area, body, summary in event_rows:
+        event_table += _EVENT.pack(event_id, _micros(start_datetime), area_index[area],
+                                   offset, len(body), len(summary))
+        blobs += (body, summary)
+        offset += len(body) + len(summary)
+    place_table = bytearray()
+    for place_id, area, body in place_rows:
+        place_table += _PLACE.pack(place_id, area_index[area], offset, len(body))
+        blobs.append(body)
+        offset += len(body)
+
+    strings_offset = _HEADER.size
+    events_offset = strings_offset + len(strings)
+    places_offset = events_offset + len(event_table)
+    blobs_offset = places_offset + len(place_table)
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(event_rows), len(place_rows), len(areas),
+                          strings_offset, events_offset, places_offset, blobs_offset)
+    return [header, strings, bytes(event_table), bytes(place_table)] + blobs, blobs_offset + offset
+
+
+def write(path: str, event_rows: Iterable[EventRow], place_rows: Iterable[PlaceRow]):
+    """Write a snapshot of the given rows to ``path``, replacing it atomically."""
+    parts, _ = encode(event_rows, place_rows)
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as stream:
+            stream.writelines(parts)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+class Snapshot:
+    """A read-only view of a snapshot held in any buffer.
+
+    With ``zero_copy`` the JSON blobs are yielded as memoryviews into the
+    buffer, which must then outlive them; otherwise they are copied out.
+    """
+
+    def __init__(self, buffer, zero_copy: bool = False):
+        self._buffer = memoryview(buffer)
+        self._map = None
+        self._zero_copy = zero_copy
+        if len(self._buffer) < _HEADER.size:
+            raise ValueError("Not a catalog snapshot")
+        (magic, version, _, self.event_count, self.place_count, area_count, strings_offset,
+         self._events_offset, self._places_offset, self._blobs_offset) = _HEADER.unpack_from(self._buffer)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"Not a version {FORMAT_VERSION} catalog snapshot")
+        self.areas: List[str] = json.loads(bytes(self._buffer[strings_offset:self._events_offset]))
+        if len(self.areas) != area_count:
+            raise ValueError("Corrupt catalog snapshot")
+
+    @classmethod
+    def open(cls, path: str) -> "Snapshot":
+        """Memory-map the snapshot file at ``path``."""
+        with open(path, "rb") as stream:
+            mapped = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            snap = cls(mapped)
+        except ValueError as exc:
+            mapped.close()
+            raise ValueError(f"{path}: {exc}") from exc
+        snap._map = mapped
+        return snap
+
+    def close(self):
+        self._buffer.release()
+        if self._map is not None:
+            self._map.close()
+
+    def _blob(self, offset: int, length: int) -> Blob:
+        start = self._blobs_offset + offset
+        blob = self._buffer[start:start + length]
+        return blob if self._zero_copy else blob.tobytes()
+
+    def event_rows(self) -> Iterator[EventRow]:
+        """Yield (index key, area, event JSON, summary JSON) in index order."""
+        table = self._buffer[self._events_offset:self._places_offset]
+        try:
+            for event_id, micros, area, offset, length, summary_length in _EVENT.iter_unpack(table):
+                key = (_EPOCH + timedelta(microseconds=micros), event_id)
+                yield (key, self.areas[area], self._blob(offset, length),
+                       self._blob(offset + length, summary_length))
+        finally:
+            table.release()
+
+    def place_rows(self) -> Iterator[PlaceRow]:
+        """Yield (id, area, place JSON) in id order."""
+        table = self._buffer[self._places_offset:self._blobs_offset]
+        try:
+            for place_id, area, offset, length in _PLACE.iter_unpack(table):
+                yield place_id, self.areas[area], self._blob(offset, length)
+        finally:
+            table.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a binary catalog snapshot")
+    parser.add_argument("path", help="Snapshot file to write")
+    parser.add_argument("--from", dest="source", help="JSONL or CSV feed to snapshot instead of the seed catalog")
+    args = parser.parse_args()
+
+    from app import seed
+
+    events = seed.seed_events()
+    places = seed.seed_places()
+    if args.source:
+        from app.ingest import detect_format, ingest, iter_records
+
+        events = []
+        with open(args.source, encoding="utf-8", newline="") as stream:
+            report = ingest(iter_records(stream, detect_format(args.source)),
+                            lambda batch: events.extend(batch) or len(batch))
+        if report.rejected:
+            parser.error(f"{report.rejected} invalid records in {args.source}")
+        events = list({event.id: event for event in events}.values())
+    serialization.rebuild(events, places)
+    write(args.path, *model_rows(events, places))
+    print(f"wrote {len(events)} events and {len(places)} places to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
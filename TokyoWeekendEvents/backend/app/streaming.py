@@ -0,0 +1,102 @@
+"""
+Live change notifications for Tokyo Weekend Events API
+
+A single broadcast channel fans store changes out to Server-Sent Events
+subscribers. Each subscriber owns one bounded queue and nothing else: no
+per-connection timers or tasks beyond the response generator itself, and
+keepalives come from one shared heartbeat task. A subscriber whose queue
+fills up is dropped rather than allowed to buffer without bound.
+"""
+import asyncio
+import itertools
+import json
+from typing import AsyncIterator, Dict, Optional
+
+QUEUE_SIZE = 64
+HEARTBEAT_SECONDS = 15
+RETRY_MILLISECONDS = 5000
+
+_KEEPALIVE = b": keepalive\n\n"
+
+
+class _Subscriber:
+    __slots__ = ("queue", "user_id")
+
+    def __init__(self, user_id: Optional[int]):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.user_id = user_id
+
+
+_subscribers: Dict[int, _Subscriber] = {}
+_ids = itertools.count()
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def subscriber_count() -> int:
+    return len(_subscribers)
+
+
+def _frame(kind: str, data: dict) -> bytes:
+    payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    return f"event: {kind}\ndata: {payload}\n\n".encode()
+
+
+def _drop(subscriber_id: int):
+    subscriber = _subscribers.pop(subscriber_id, None)
+    if subscriber is None:
+        return
+    # Make room for the sentinel that tells the response generator to stop.
+    while not subscriber.queue.empty():
+        subscriber.queue.get_nowait()
+    subscriber.queue.put_nowait(None)
+
+
+def _fanout(frame: bytes, user_id: Optional[int]):
+    for subscriber_id, subscriber in list(_subscribers.items()):
+        if user_id is not None and subscriber.user_id != user_id:
+            continue
+        try:
+            subscriber.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            _drop(subscriber_id)
+
+
+def publish(kind: str, data: dict, user_id: Optional[int] = None):
+    """Broadcast to everyone, or only to ``user_id``'s connections.
+
+    Safe to call from any thread; delivery always happens on the event loop.
+    """
+    if not _subscribers or _loop is None:
+        return
+    frame = _frame(kind, data)
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is _loop:
+        _fanout(frame, user_id)
+    else:
+        _loop.call_soon_threadsafe(_fanout, frame, user_id)
+
+
+async def heartbeat():
+    while True:
+        await asyncio.sleep(HEARTBEAT_SECONDS)
+        _fanout(_KEEPALIVE, None)
+
+
+async def subscribe(user_id: Optional[int] = None) -> AsyncIterator[bytes]:
+    global _loop
+    _loop = asyncio.get_running_loop()
+    subscriber_id = next(_ids)
+    subscriber = _Subscriber(user_id)
+    _subscribers[subscriber_id] = subscriber
+    try:
+        yield f"retry: {RETRY_MILLISECONDS}\n\n".encode()
+        while True:
+            frame = await subscriber.queue.get()
+            if frame is None:
+                return
+            yield frame
+    finally:
+        _subscribers.pop(subscriber_id, None)
@@ -0,0 +1,32 @@
+"""
+Login path at each user count: user lookup, bcrypt and JWTs
+"""
+import pytest
+from jose import jwt
+
+from app import database_updated as db
+from benchmarks.synthetic import PASSWORD
+
+
+@pytest.mark.benchmark(group="auth")
+def bench_get_user_by_email(benchmark, catalog):
+    benchmark(db.get_user_by_email, catalog.users[-1].email)
+
+
+@pytest.mark.benchmark(group="auth")
+def bench_authenticate_user(benchmark, catalog):
+    # bcrypt dominates and does not depend on scale; a few rounds suffice.
+    user = benchmark.pedantic(db.authenticate_user, args=(catalog.users[-1].email, PASSWORD),
+                              rounds=3)
+    assert user is not None
+
+
+@pytest.mark.benchmark(group="auth")
+def bench_create_and_decode_token(benchmark, catalog):
+    email = catalog.users[-1].email
+
+    def round_trip():
+        token = db.create_access_token({"sub": email})
+        return jwt.decode(token, db.SECRET_KEY, algorithms=[db.ALGORITHM])
+
+    assert benchmark(round_trip)["sub"] == email
@@ -0,0 +1,29 @@
+"""
+Response serialization at each catalog scale
+"""
+import pytest
+
+from app import serialization
+from app import database_updated as db
+
+
+@pytest.mark.benchmark(group="serialization")
+def bench_events_json_page(benchmark, catalog):
+    page, _ = db.filter_events_page(None, 200)
+    benchmark(serialization.events_json, page)
+
+
+@pytest.mark.benchmark(group="serialization")
+def bench_events_json_catalog(benchmark, catalog):
+    benchmark(serialization.events_json, db.get_all_events())
+
+
+@pytest.mark.benchmark(group="serialization")
+def bench_project_fields(benchmark, catalog):
+    page, _ = db.filter_events_page(None, 200)
+    benchmark(serialization.project, page, ("id", "name", "start_datetime"))
+
+
+@pytest.mark.benchmark(group="serialization")
+def bench_store_event(benchmark, catalog):
+    benchmark(serialization.store_event, catalog.events[0])
@@ -0,0 +1,70 @@
+"""
+Store queries at each catalog scale
+"""
+import itertools
+from datetime import datetime
+
+import pytest
+
+from app import database_updated as db
+from benchmarks.synthetic import FIRST_WEEKEND
+
+
+@pytest.mark.benchmark(group="filter_events")
+def bench_filter_events_by_area(benchmark, catalog):
+    benchmark(db.filter_events, area="渋谷")
+
+
+@pytest.mark.benchmark(group="filter_events")
+def bench_filter_events_by_dates_and_category(benchmark, catalog):
+    benchmark(db.filter_events, start_date=FIRST_WEEKEND, end_date=datetime(2026, 3, 1),
+              category="音楽")
+
+
+@pytest.mark.benchmark(group="filter_events")
+def bench_filter_events_page(benchmark, catalog):
+    benchmark(db.filter_events_page, None, 20, "渋谷")
+
+
+@pytest.mark.benchmark(group="search_events")
+def bench_search_events_hit(benchmark, catalog):
+    benchmark(db.search_events, "ジャズ")
+
+
+@pytest.mark.benchmark(group="search_events")
+def bench_search_events_miss(benchmark, catalog):
+    benchmark(db.search_events, "存在しないイベント")
+
+
+@pytest.mark.benchmark(group="favorites")
+def bench_get_user_favorites(benchmark, catalog, busiest_user):
+    benchmark(db.get_user_favorites, busiest_user)
+
+
+@pytest.mark.benchmark(group="favorites")
+def bench_add_favorite(benchmark, catalog):
+    user_id = catalog.users[-1].id
+    owned = {f.event_id for f in db.favorites if f.user_id == user_id}
+    event_ids = itertools.cycle([event.id for event in catalog.events[:1000]
+                                 if event.id not in owned])
+    added = []
+
+    def setup():
+        # Undo the previous round (untimed) so every round starts from the same state.
+        if added:
+            db.remove_favorite(user_id, added.pop())
+        added.append(next(event_ids))
+        return (user_id, added[-1]), {}
+
+    benchmark.pedantic(db.add_favorite, setup=setup, rounds=1000)
+    db.remove_favorite(user_id, added.pop())
+
+
+@pytest.mark.benchmark(group="nearby")
+def bench_get_nearby_places(benchmark, catalog):
+    benchmark(db.get_nearby_places, "新宿", "restaurant")
+
+
+@pytest.mark.benchmark(group="nearby")
+def bench_get_nearby_places_page(benchmark, catalog):
+    benchmark(db.get_nearby_places_page, "新宿", None, None, 20)
@@ -0,0 +1,40 @@
+"""
+Fixtures for the pytest-benchmark suite
+
+Benchmarks run at every catalog scale in TWE_BENCH_SCALES (comma-separated
+event counts, default 1000,10000,100000; 1000000 works given the memory).
+Each scale's synthetic catalog is generated once per session and installed
+into the store before that scale's benchmarks run.
+"""
+import os
+
+import pytest
+
+from benchmarks import synthetic
+
+SCALES = [int(scale) for scale in os.getenv("TWE_BENCH_SCALES", "1000,10000,100000").split(",")]
+
+_catalogs = {}
+
+
+@pytest.fixture(scope="session", params=SCALES, ids=lambda scale: f"{scale}")
+def scale(request):
+    return request.param
+
+
+@pytest.fixture
+def catalog(scale) -> synthetic.Catalog:
+    """The synthetic catalog for ``scale``, installed into the store."""
+    if scale not in _catalogs:
+        _catalogs.clear()
+        _catalogs[scale] = synthetic.generate(scale)
+        synthetic.install(_catalogs[scale])
+    return _catalogs[scale]
+
+
+@pytest.fixture
+def busiest_user(catalog) -> int:
+    counts = {}
+    for favorite in catalog.favorites:
+        counts[favorite.user_id] = counts.get(favorite.user_id, 0) + 1
+    return max(counts, key=counts.get) if counts else catalog.users[0].id
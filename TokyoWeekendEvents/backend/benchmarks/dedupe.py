@@ -0,0 +1,98 @@
+"""
+Throughput of MinHash signatures and LSH lookups in the ingest dedupe stage
+
+Builds a synthetic feed in which every ``--duplicate-every``-th event is a
+lightly edited copy of an earlier one (extra words, moved pin) and reports
+signatures/sec, dedupe events/sec and how many planted duplicates were found.
+Run from the backend directory:
+
+    python -m benchmarks.dedupe --events 100000
+"""
+import argparse
+import random
+import time
+from typing import List, Set, Tuple
+
+from app import database_updated as db
+from app.dedupe import Deduplicator, signature
+from app.models import Event
+
+WORDS = ["祭", "花火", "マルシェ", "ジャズ", "夜市", "展示", "ワークショップ", "ライブ",
+         "神社", "公園", "ビール", "クラフト", "アート", "朝市", "映画", "落語"]
+KANA = "アイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモヤユヨラリルレロワン"
+
+
+def _word(rng: random.Random) -> str:
+    # Made-up names keep unrelated events from sharing most of their shingles.
+    return "".join(rng.choice(KANA) for _ in range(rng.randint(3, 6)))
+
+
+def build_feed(size: int, duplicate_every: int, seed: int = 7) -> Tuple[List[Event], Set[int]]:
+    rng = random.Random(seed)
+    seeds = list(db.get_all_events())
+    feed: List[Event] = []
+    planted: Set[int] = set()
+    for i in range(size):
+        if i and i % duplicate_every == 0:
+            original = feed[rng.randrange(len(feed))]
+            coordinates = original.location.coordinates.model_copy(update={
+                "latitude": original.location.coordinates.latitude + rng.uniform(-0.001, 0.001)
+            })
+            location = original.location.model_copy(update={"coordinates": coordinates})
+            feed.append(original.model_copy(update={
+                "id": i + 1,
+                "name": original.name + " " + rng.choice(WORDS),
+                "location": location,
+            }))
+            planted.add(i + 1)
+            continue
+        base = seeds[i % len(seeds)]
+        name = f"{_word(rng)}{rng.choice(WORDS)} {_word(rng)}"
+        coordinates = base.location.coordinates.model_copy(update={
+            "latitude": 35.5 + rng.random() * 0.4,
+            "longitude": 139.5 + rng.random() * 0.4,
+        })
+        feed.append(base.model_copy(update={
+            "id": i + 1,
+            "name": name,
+            "description": " ".join(_word(rng) for _ in range(8)) + rng.choice(WORDS),
+            "location": base.location.model_copy(update={"coordinates": coordinates}),
+        }))
+    return feed, planted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=100000)
+    parser.add_argument("--duplicate-every", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    feed, planted = build_feed(args.events, args.duplicate_every)
+
+    started = time.perf_counter()
+    signatures = [signature(event) for event in feed]
+    signature_seconds = time.perf_counter() - started
+
+    deduplicator = Deduplicator("flag")
+    started = time.perf_counter()
+    for i in range(0, len(feed), args.batch_size):
+        deduplicator.process(feed[i:i + args.batch_size], signatures[i:i + args.batch_size])
+    lookup_seconds = time.perf_counter() - started
+
+    flagged = {match.event_id for match in deduplicator.matches}
+    # Only the first MAX_RECORDED_MATCHES matches are kept, so recall is exact
+    # only for small feeds.
+    found = len(flagged & planted) if len(deduplicator.matches) == deduplicator.duplicates else None
+    print(f"feed: {args.events} events, {len(planted)} planted duplicates")
+    print(f"signatures:   {args.events / signature_seconds:10.0f} events/s")
+    print(f"LSH lookups:  {args.events / lookup_seconds:10.0f} events/s")
+    print(f"flagged:      {deduplicator.duplicates:10d}")
+    if found is not None:
+        print(f"planted found:{found:10d}")
+    total = signature_seconds + lookup_seconds
+    print(f"1M events:    {total * 1_000_000 / args.events / 60:10.1f} min (one process)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Memory check for the NDJSON catalog export
+
+Installs synthetic catalogs of growing size and drains the events and places
+exports, gzipped, as /export/*.ndjson would send them. tracemalloc measures
+the peak memory allocated while each export runs, on top of the catalog
+itself. The export only ever holds one page, so the peak should stay roughly
+the same from the smallest catalog to the largest. The script exits
+non-zero if the largest catalog's peak is more than twice the smallest's.
+
+Run from the backend directory:
+
+    python -m benchmarks.export --sizes 10000 50000 200000
+"""
+import argparse
+import asyncio
+import sys
+import time
+import tracemalloc
+
+from app import database_updated as db, export, serialization
+from benchmarks import synthetic
+
+
+async def drain(chunks) -> int:
+    sent = 0
+    async for chunk in chunks:
+        sent += len(chunk)
+    return sent
+
+
+def measure(fetch, encode) -> tuple:
+    tracemalloc.start()
+    started = time.perf_counter()
+    sent = asyncio.run(drain(export.gzipped(export.ndjson(fetch, encode))))
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, sent, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000, 200000],
+                        help="catalog sizes in events")
+    args = parser.parse_args()
+
+    peaks = []
+    for size in args.sizes:
+        synthetic.install(synthetic.generate(size, users=1))
+        peak, sent, elapsed = measure(
+            lambda after, limit: db.filter_event_ids_page(after, limit), serialization.event_json)
+        place_peak, place_sent, _ = measure(
+            lambda after, limit: db.get_nearby_place_ids_page(None, None, after, limit),
+            serialization.place_json)
+        peaks.append(peak)
+        print(f"{size:>8} events: peak {peak / 1024:,.0f} KiB, {sent / 1024:,.0f} KiB gzipped "
+              f"in {elapsed:.2f} s ({size / elapsed:,.0f} events/s); "
+              f"{len(db.nearby_places)} places: peak {place_peak / 1024:,.0f} KiB")
+    flat = peaks[-1] <= 2 * peaks[0]
+    print("memory stays flat" if flat else "MEMORY GROWS WITH THE CATALOG")
+    sys.exit(0 if flat else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Throughput of the offline reverse geocoder
+
+Geocodes random points over central Tokyo (nearest station plus area) and a
+batch of events with their station and area stripped, the way ``app.ingest``
+runs it. Run from the backend directory:
+
+    python -m benchmarks.geocoding --points 100000
+"""
+import argparse
+import random
+import time
+
+from app import database_updated as db
+from app import geocoding
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--points", type=int, default=100000)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    points = [(35.60 + rng.random() * 0.20, 139.65 + rng.random() * 0.20)
+              for _ in range(args.points)]
+    geocoding.load()
+
+    started = time.perf_counter()
+    for latitude, longitude in points:
+        geocoding.nearest_station(latitude, longitude)
+        geocoding.area_at(latitude, longitude)
+    point_seconds = time.perf_counter() - started
+
+    seeds = list(db.get_all_events())
+    feed = []
+    for i, (latitude, longitude) in enumerate(points):
+        base = seeds[i % len(seeds)]
+        coordinates = base.location.coordinates.model_copy(
+            update={"latitude": latitude, "longitude": longitude})
+        location = base.location.model_copy(
+            update={"coordinates": coordinates, "area": "", "station": None})
+        feed.append(base.model_copy(update={"id": i + 1, "location": location}))
+
+    started = time.perf_counter()
+    filled = geocoding.fill_events(feed)
+    event_seconds = time.perf_counter() - started
+
+    with_area = sum(1 for event in filled if event.location.area)
+    with_station = sum(1 for event in filled if event.location.station)
+    print(f"points:       {args.points / point_seconds:10.0f} points/s")
+    print(f"fill_events:  {args.points / event_seconds:10.0f} events/s")
+    print(f"area found:   {with_area / args.points:10.1%}")
+    print(f"station found:{with_station / args.points:10.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Requests/sec of /events before and after the pre-serialized JSON cache
+
+"Before" serves the catalog through ``response_model=List[Event]`` the way
+``read_events`` used to; "after" is the real ``/events`` endpoint assembling
+its body from cached per-event JSON fragments. Run from the backend directory:
+
+    python -m benchmarks.json_cache --events 10000 --requests 20
+"""
+import argparse
+import time
+from typing import List
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import database_updated as db
+from app.main_updated import app
+from app.models import Event
+
+
+def build_catalog(size: int) -> List[Event]:
+    seeds = list(db.get_all_events())
+    return [
+        seeds[i % len(seeds)].model_copy(update={"id": i + 1})
+        for i in range(size)
+    ]
+
+
+def requests_per_second(client: TestClient, path: str, requests: int) -> float:
+    client.get(path)
+    started = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(path)
+        assert response.status_code == 200
+    return requests / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+
+    db.load_catalog(build_catalog(args.events), list(db.get_nearby_places()))
+
+    baseline = FastAPI()
+
+    @baseline.get("/events", response_model=List[Event])
+    async def read_events():
+        return db.filter_events()
+
+    before = requests_per_second(TestClient(baseline), "/events", args.requests)
+    after = requests_per_second(TestClient(app), "/events", args.requests)
+    print(f"catalog: {args.events} events, {args.requests} requests each")
+    print(f"response_model:     {before:8.1f} req/s")
+    print(f"cached JSON bytes:  {after:8.1f} req/s  ({after / before:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+"""
+Load replay of iOS client sessions
+
+Simulated devices replay sessions shaped like the iOS app's ``APIService``
+traffic. Each device logs in on its first session, as the whole fleet does
+when the app starts, which produces the login burst. In later sessions it
+reuses its token, the way the app keeps it in UserDefaults, and logs in
+again only occasionally. A session runs:
+
+* ``fetchEvents()`` with no filters when ``EventListView`` appears, and
+  sometimes an area filter or a search;
+* one to three event details. On some of them the device calls
+  ``fetchRoutes`` once per transport button tapped in ``RouteOptionsView``,
+  from the view's fixed location;
+* sometimes a favorite, the favorites tab and nearby places.
+
+The device waits a think time between steps. Think times are exponentially
+distributed around ``--think`` seconds, and the wait between sessions is
+five times longer.
+
+Targets:
+
+* ``inprocess`` (the default) drives the app over ASGI in this process;
+* ``uvicorn`` starts a local uvicorn worker;
+* a URL uses a server that is already running.
+
+The first two install a synthetic catalog of ``--events`` events, whose
+users all have the password ``password123``. Each device has its own client
+address. Against uvicorn it is sent as ``X-Forwarded-For``, so per-IP rate
+limits apply per device as they do in production.
+
+The report gives throughput and p50/p95/p99 latency per endpoint, status
+counts, and event loop lag. In-process the lag is that of the loop shared by
+the app and the clients. Against ``uvicorn`` it is measured inside the
+worker. ``--json`` saves the report, so runs can be compared to catch
+regressions. Run from the backend directory:
+
+    python -m benchmarks.load --users 50 --duration 60
+    python -m benchmarks.load --target uvicorn --users 200 --think 1 --json load.json
+    python -m benchmarks.load --target http://127.0.0.1:8000 --email test@example.com
+"""
+import argparse
+import asyncio
+import json
+import random
+import signal
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks import synthetic
+
+# RouteOptionsView plans routes from a fixed location (Tokyo Station).
+ORIGIN = {"from_lat": 35.6812, "from_lng": 139.7671}
+TRANSPORT_TYPES = ["walking", "transit", "driving", "bicycle", "taxi"]
+AREAS = list(synthetic.WARDS)
+PLACE_TYPES = list(synthetic.PLACE_TYPES)
+QUERIES = [theme for themes in synthetic.THEMES.values() for theme in themes]
+LAG_INTERVAL = 0.01
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(ordered: List[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))]
+
+
+def summarize(samples: List[float]) -> dict:
+    ordered = sorted(samples)
+    summary = {f"p{p}": percentile(ordered, p) for p in PERCENTILES}
+    summary["max"] = ordered[-1] if ordered else 0.0
+    summary["count"] = len(ordered)
+    return summary
+
+
+async def monitor_lag(samples: List[float], interval: float = LAG_INTERVAL):
+    """Record how late every wake-up after ``interval`` seconds is, until cancelled."""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - started - interval))
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+
+    def add(self, endpoint: str, status, seconds: float):
+        self.latencies[endpoint].append(seconds)
+        self.statuses[endpoint][str(status)] += 1
+
+    def report(self, elapsed: float) -> dict:
+        endpoints = {}
+        for endpoint in sorted(self.latencies):
+            latencies = self.latencies[endpoint]
+            endpoints[endpoint] = dict(summarize(latencies), rps=len(latencies) / elapsed,
+                                       statuses=dict(self.statuses[endpoint]))
+        total = [seconds for latencies in self.latencies.values() for seconds in latencies]
+        return {"endpoints": endpoints, "total": dict(summarize(total), rps=len(total) / elapsed)}
+
+
+class Device:
+    """One simulated iPhone running the app."""
+
+    def __init__(self, client: httpx.AsyncClient, headers: dict, recorder: Recorder,
+                 rng: random.Random, email: str, password: str, event_ids: List[int],
+                 think: float):
+        self.client = client
+        self.headers = headers
+        self.recorder = recorder
+        self.rng = rng
+        self.email = email
+        self.password = password
+        self.event_ids = event_ids
+        self.think_seconds = think
+        self.token: Optional[str] = None
+
+    async def call(self, endpoint: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        headers = dict(self.headers)
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers=headers, **kwargs)
+            status = response.status_code
+        except httpx.HTTPError:
+            response, status = None, "error"
+        self.recorder.add(endpoint, status, time.perf_counter() - started)
+        return response
+
+    async def think(self, scale: float = 1.0):
+        mean = self.think_seconds * scale
+        await asyncio.sleep(self.rng.expovariate(1 / mean) if mean > 0 else 0)
+
+    def pick_event(self) -> int:
+        # Lists are ordered by start time and people tap near the top.
+        return self.event_ids[int(len(self.event_ids) * self.rng.random() ** 2)]
+
+    async def login(self):
+        response = await self.call("POST /token", "POST", "/token",
+                                   data={"username": self.email, "password": self.password})
+        if response is not None and response.status_code == 200:
+            self.token = response.json()["access_token"]
+            await self.call("GET /users/me", "GET", "/users/me")
+
+    async def session(self, login: bool):
+        rng = self.rng
+        if login or self.token is None:
+            await self.login()
+        await self.call("GET /events", "GET", "/events")
+        await self.think()
+        if rng.random() < 0.4:
+            await self.call("GET /events?area", "GET", "/events", params={"area": rng.choice(AREAS)})
+            await self.think()
+        if rng.random() < 0.2:
+            await self.call("GET /events/search", "GET", "/events/search",
+                            params={"query": rng.choice(QUERIES)})
+            await self.think()
+        for _ in range(rng.randint(1, 3)):
+            event_id = self.pick_event()
+            await self.call("GET /events/{event_id}", "GET", f"/events/{event_id}")
+            await self.think()
+            if rng.random() < 0.5:
+                for transport in rng.sample(TRANSPORT_TYPES, rng.randint(1, 3)):
+                    await self.call("GET /events/{event_id}/routes", "GET",
+                                    f"/events/{event_id}/routes",
+                                    params=dict(ORIGIN, transport_types=transport))
+                    await self.think(0.3)
+            if self.token and rng.random() < 0.2:
+                await self.call("POST /events/{event_id}/favorite", "POST",
+                                f"/events/{event_id}/favorite")
+        if self.token and rng.random() < 0.5:
+            await self.call("GET /users/favorites", "GET", "/users/favorites")
+            await self.think()
+        if rng.random() < 0.3:
+            await self.call("GET /nearby/{area}", "GET", f"/nearby/{rng.choice(AREAS)}",
+                            params={"place_type": rng.choice(PLACE_TYPES)})
+
+    async def run(self, relogin: float):
+        login = True
+        while True:
+            await self.session(login)
+            login = self.rng.random() < relogin
+            await self.think(5)
+
+
+def client_address(index: int) -> str:
+    return f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256 + 1}"
+
+
+async def replay(args, clients, credentials) -> dict:
+    """Run ``args.users`` devices for ``args.duration`` seconds.
+
+    ``clients(index)`` returns the (client, headers) a device uses and
+    ``credentials(index)`` its (email, password).
+    """
+    client, headers = clients(0)
+    response = await client.get("/events", params={"limit": 200, "fields": "id"}, headers=headers)
+    response.raise_for_status()
+    event_ids = [event["id"] for event in response.json()]
+
+    recorder = Recorder()
+    lag: List[float] = []
+    monitor = asyncio.create_task(monitor_lag(lag))
+
+    async def start(index: int):
+        await asyncio.sleep(args.ramp * index / args.users)
+        client, headers = clients(index)
+        email, password = credentials(index)
+        device = Device(client, headers, recorder, random.Random(args.seed * 100003 + index),
+                        email, password, event_ids, args.think)
+        await device.run(args.relogin)
+
+    started = time.perf_counter()
+    tasks = [asyncio.create_task(start(index)) for index in range(args.users)]
+    done, _ = await asyncio.wait(tasks, timeout=args.duration)
+    for task in done:
+        task.result()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    monitor.cancel()
+
+    report = recorder.report(elapsed)
+    report["lag"] = summarize(lag)
+    report["elapsed"] = elapsed
+    return report
+
+
+async def run_inprocess(args) -> dict:
+    from app.main_updated import app
+
+    synthetic.install(synthetic.generate(args.events, seed=args.seed))
+    users = [user.email for user in synthetic.db.users]
+    clients = {}
+
+    def client_for(index: int):
+        if index not in clients:
+            transport = httpx.ASGITransport(app=app, raise_app_exceptions=False,
+                                            client=(client_address(index), 50000))
+            clients[index] = httpx.AsyncClient(transport=transport, base_url="http://testserver")
+        return clients[index], {}
+
+    async with app.router.lifespan_context(app):
+        try:
+            return await replay(args, client_for,
+                                lambda index: (users[index % len(users)], synthetic.PASSWORD))
+        finally:
+            for client in clients.values():
+                await client.aclose()
+
+
+async def run_remote(args, url: str, credentials) -> dict:
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        return await replay(args, lambda index: (client, {"X-Forwarded-For": client_address(index)}),
+                            credentials)
+
+
+def start_uvicorn(args) -> Tuple[subprocess.Popen, str]:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    worker = subprocess.Popen(
+        [sys.executable, "-W", "ignore", "-m", "benchmarks.load", "serve", "--port", str(port),
+         "--events", str(args.events), "--seed", str(args.seed)],
+        stdout=subprocess.PIPE, text=True)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 300
+    while time.monotonic() < deadline:
+        if worker.poll() is not None:
+            raise SystemExit(f"uvicorn worker exited with {worker.returncode}")
+        try:
+            if httpx.get(url + "/", timeout=1).status_code == 200:
+                return worker, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    worker.terminate()
+    raise SystemExit("uvicorn worker did not start")
+
+
+def stop_uvicorn(worker: subprocess.Popen) -> dict:
+    worker.send_signal(signal.SIGINT)
+    output, _ = worker.communicate(timeout=60)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def serve(port: int, events: int, seed: int):
+    """Run one uvicorn worker; print its event loop lag as JSON when stopped."""
+    import uvicorn
+    from app.main_updated import app
+
+    synthetic.install(synthetic.generate(events, seed=seed))
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning",
+                                           proxy_headers=True, forwarded_allow_ips="*"))
+    lag: List[float] = []
+
+    async def run():
+        monitor = asyncio.create_task(monitor_lag(lag))
+        await server.serve()
+        monitor.cancel()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        # uvicorn re-raises the SIGINT it shut down on.
+        pass
+    print(json.dumps(summarize(lag)), flush=True)
+
+
+def milliseconds(seconds: float) -> str:
+    return f"{seconds * 1000:8.1f}"
+
+
+def print_report(report: dict):
+    print(f"{'endpoint':<34} {'requests':>8} {'req/s':>7} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  statuses")
+    for endpoint, row in report["endpoints"].items():
+        statuses = " ".join(f"{status}:{count}" for status, count in sorted(row["statuses"].items()))
+        print(f"{endpoint:<34} {row['count']:8d} {row['rps']:7.1f} {milliseconds(row['p50'])} "
+              f"{milliseconds(row['p95'])} {milliseconds(row['p99'])}  {statuses}")
+    total = report["total"]
+    print(f"{'total':<34} {total['count']:8d} {total['rps']:7.1f} {milliseconds(total['p50'])} "
+          f"{milliseconds(total['p95'])} {milliseconds(total['p99'])}")
+    labels = {"lag": "event loop lag"}
+    if "server_lag" in report:
+        labels = {"server_lag": "server event loop lag", "lag": "client event loop lag"}
+    for name, label in labels.items():
+        lag = report[name]
+        print(f"{label}: p50 {lag['p50'] * 1000:.1f} ms, p99 {lag['p99'] * 1000:.1f} ms, "
+              f"max {lag['max'] * 1000:.1f} ms ({lag['count']} samples)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("command", nargs="?", choices=("run", "serve"), default="run")
+    parser.add_argument("--target", default="inprocess",
+                        help="inprocess, uvicorn or the URL of a running server")
+    parser.add_argument("--users", type=int, default=20, help="simulated devices")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to replay for")
+    parser.add_argument("--ramp", type=float, default=0, help="seconds over which devices start")
+    parser.add_argument("--think", type=float, default=2, help="mean think time in seconds")
+    parser.add_argument("--relogin", type=float, default=0.1,
+                        help="chance that a later session logs in again")
+    parser.add_argument("--events", type=int, default=10000, help="synthetic catalog size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--email", default="test@example.com", help="login for URL targets")
+    parser.add_argument("--password", default=synthetic.PASSWORD)
+    parser.add_argument("--port", type=int, default=8000, help="serve only")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        return serve(args.port, args.events, args.seed)
+
+    if args.target == "inprocess":
+        report = asyncio.run(run_inprocess(args))
+    elif args.target == "uvicorn":
+        worker, url = start_uvicorn(args)
+        users = max(1, args.events // 100)
+        try:
+            report = asyncio.run(run_remote(
+                args, url, lambda index: (f"user{index % users + 1}@example.com", synthetic.PASSWORD)))
+        finally:
+            report_lag = stop_uvicorn(worker)
+        report["server_lag"] = report_lag
+    else:
+        report = asyncio.run(run_remote(args, args.target.rstrip("/"),
+                                        lambda index: (args.email, args.password)))
+    report["config"] = {name: getattr(args, name) for name in
+                        ("target", "users", "duration", "ramp", "think", "relogin", "events", "seed")}
+
+    print(f"{args.users} devices against {args.target} for {report['elapsed']:.1f} s, "
+          f"think {args.think} s")
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as stream:
+            json.dump(report, stream, indent=2)
+
+
+if __name__ == "__main__":
+    main()
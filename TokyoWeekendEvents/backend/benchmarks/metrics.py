@@ -0,0 +1,84 @@
+"""
+Recording overhead of the Prometheus metrics
+
+Measures the cost of a histogram observation, of a ``timed`` store function
+call and of ``MetricsMiddleware`` around an empty ASGI app, then compares
+the middleware with full ``GET /events/{id}`` and ``GET /events?limit=20``
+requests driven straight through the real app (no HTTP client or server,
+so the real share is smaller still). Run from the backend directory:
+
+    python -m benchmarks.metrics --iterations 200000
+"""
+import argparse
+import asyncio
+import time
+
+from app import metrics
+from app.main_updated import app
+
+
+def ns_per_call(function, iterations: int) -> float:
+    started = time.perf_counter_ns()
+    for _ in range(iterations):
+        function()
+    return (time.perf_counter_ns() - started) / iterations
+
+
+def scope(target: str) -> dict:
+    path, _, query = target.partition("?")
+    return {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+            "root_path": "", "query_string": query.encode(), "headers": [(b"host", b"localhost")],
+            "client": ("127.0.0.1", 50000), "server": ("localhost", 80)}
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def discard(message):
+    pass
+
+
+async def empty_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def ns_per_request(asgi_app, path: str, iterations: int) -> float:
+    await asgi_app(scope(path), receive, discard)
+    started = time.perf_counter_ns()
+    for _ in range(iterations):
+        await asgi_app(scope(path), receive, discard)
+    return (time.perf_counter_ns() - started) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=200000)
+    args = parser.parse_args()
+    n = args.iterations
+
+    histogram = metrics.Histogram("twe_benchmark_seconds", "Benchmark only.", ("route",))
+    labels = ("/events",)
+    observe = ns_per_call(lambda: histogram.observe(labels, 0.0042), n)
+    bare = ns_per_call(lambda: None, n)
+    timed = ns_per_call(metrics.timed(lambda: None), n) - bare
+
+    async def requests():
+        plain = await ns_per_request(empty_app, "/", n)
+        wrapped = await ns_per_request(metrics.MetricsMiddleware(empty_app), "/", n)
+        single = await ns_per_request(app, "/events/1", max(n // 100, 100))
+        page = await ns_per_request(app, "/events?limit=20", max(n // 100, 100))
+        return wrapped - plain, single, page
+
+    middleware, single, page = asyncio.run(requests())
+    print(f"histogram observe:        {observe:8.0f} ns")
+    print(f"timed() wrapper:          {timed:8.0f} ns")
+    print(f"middleware per request:   {middleware:8.0f} ns")
+    print(f"GET /events/1:            {single:8.0f} ns  (middleware {middleware / single:.2%})")
+    print(f"GET /events?limit=20:     {page:8.0f} ns  (middleware {middleware / page:.2%})")
+
+
+if __name__ == "__main__":
+    main()
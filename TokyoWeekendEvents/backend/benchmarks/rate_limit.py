@@ -0,0 +1,61 @@
+"""
+Per-request overhead of the rate limiting middleware
+
+Times ``RateLimitMiddleware.check`` on the configured routes for a stream of
+synthetic requests: an unlimited path, a limited static path and a limited
+path with a parameter, spread over ``--clients`` client IPs, plus an
+authenticated per-user route. The cost of the benchmark loop calling an
+empty function is measured first and subtracted, leaving the limiter's own
+overhead. Run from the backend directory:
+
+    python -m benchmarks.rate_limit --requests 1000000 --clients 10000
+"""
+import argparse
+import time
+
+from app.main_updated import RATE_LIMITS
+from app.rate_limit import RateLimitMiddleware
+
+
+def scope(method: str, path: str, client: str, token: bytes = None) -> dict:
+    headers = [(b"host", b"localhost"), (b"accept", b"application/json")]
+    if token:
+        headers.append((b"authorization", b"Bearer " + token))
+    return {"type": "http", "method": method, "path": path,
+            "client": (client, 50000), "headers": headers}
+
+
+def per_request_ns(check, scopes: list, requests: int) -> float:
+    count = len(scopes)
+    started = time.perf_counter_ns()
+    for i in range(requests):
+        check(scopes[i % count])
+    return (time.perf_counter_ns() - started) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=1000000)
+    parser.add_argument("--clients", type=int, default=10000)
+    args = parser.parse_args()
+
+    clients = [f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}" for i in range(args.clients)]
+    cases = {
+        "unlimited route": [scope("GET", "/events", ip) for ip in clients],
+        "static route (per IP)": [scope("POST", "/token", ip) for ip in clients],
+        "templated route (per IP)": [scope("GET", f"/events/{i}/routes", ip)
+                                     for i, ip in enumerate(clients)],
+        "per-user route": [scope("GET", "/events/search", ip, b"token-%d" % (i % 100))
+                           for i, ip in enumerate(clients)],
+    }
+    baseline = per_request_ns(lambda scope: 0.0, cases["unlimited route"], args.requests)
+    print(f"{args.requests} requests from {args.clients} clients")
+    print(f"{'loop and call baseline':>26}: {baseline:7.0f} ns/request")
+    for name, scopes in cases.items():
+        limiter = RateLimitMiddleware(None, RATE_LIMITS, identify=lambda token: token, url=None)
+        ns = per_request_ns(limiter.check, scopes, args.requests) - baseline
+        print(f"{name:>26}: {ns:7.0f} ns/request, {limiter.bucket_count()} live buckets")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Concurrency stress test for seat reservations
+
+Many threads reserve seats on one event (by default 50,000 seats, the size of
+六本木アートナイト) far past its capacity. Each reservation is for 1 to 4 seats
+and carries an idempotency key. Threads retry some keys as a client would
+after a timeout, release some of their reservations, and leave the
+waitlist. Partway through, the capacity is cut and later restored. The GIL
+switch interval is shortened so that threads interleave inside the
+critical sections far more often than under real load.
+
+Afterwards the script checks the invariants and exits non-zero if any of
+them fails:
+
+* confirmed seats never exceed the capacity;
+* confirmed seats plus remaining seats equal the capacity, so no seat was
+  lost or made up;
+* a retried key returned the original reservation and reserved nothing more;
+* idempotency keys are remembered only for reservations still held, one
+  key per reservation;
+* every waitlisted reservation is in the waitlist, and the first one waiting
+  needs more seats than remain.
+
+Run from the backend directory:
+
+    python -m benchmarks.reservations --threads 32 --attempts 5000
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+
+from app import reservations
+
+EVENT_ID = 6
+
+
+def worker(index: int, attempts: int, capacity: int, failures: list, barrier: threading.Barrier):
+    rng = random.Random(index)
+    user_id = index + 1
+    held = []
+    barrier.wait()
+    for attempt in range(attempts):
+        key = f"{user_id}-{attempt}"
+        quantity = rng.randint(1, 4)
+        reservation, replayed = reservations.reserve(EVENT_ID, capacity, user_id, quantity, key)
+        if replayed:
+            failures.append(f"fresh key {key} was replayed")
+        if rng.random() < 0.1:
+            again, replayed = reservations.reserve(EVENT_ID, capacity, user_id, quantity, key)
+            if not replayed or again.id != reservation.id:
+                failures.append(f"retry of {key} reserved again")
+        held.append(reservation.id)
+        if rng.random() < 0.2:
+            reservations.release(user_id, EVENT_ID, held.pop(rng.randrange(len(held))))
+
+
+def check(capacity: int) -> list:
+    state = reservations._states[EVENT_ID]
+    ours = [r for r in reservations._reservations.values() if r.event_id == EVENT_ID]
+    confirmed = sum(r.quantity for r in ours if r.status == reservations.CONFIRMED)
+    remaining = state.seats.remaining()
+    waiting = [r for r in state.waitlist if r.status == reservations.WAITLISTED]
+    problems = []
+    if confirmed > capacity:
+        problems.append(f"oversold: {confirmed} seats confirmed for {capacity}")
+    if confirmed + remaining != capacity:
+        problems.append(f"{confirmed} confirmed + {remaining} remaining != {capacity}")
+    if {r.id for r in ours if r.status == reservations.WAITLISTED} != {r.id for r in waiting}:
+        problems.append("waitlisted reservations missing from the waitlist")
+    if waiting and waiting[0].quantity <= remaining:
+        problems.append(f"head of waitlist needs {waiting[0].quantity} with {remaining} free")
+    keyed = [reservation_id for reservation_id, _ in reservations._idempotency.values()]
+    if len(keyed) != len(set(keyed)) or set(keyed) != set(reservations._idempotency_keys):
+        problems.append("an idempotency key maps to the same reservation as another")
+    if any(reservations._reservations[reservation_id].status
+           in (reservations.RELEASED, reservations.CANCELLED) for reservation_id in keyed):
+        problems.append("an idempotency key outlived its reservation")
+    return problems
+
+
+def run(threads: int, attempts: int, capacity: int, shards: int) -> float:
+    reservations.SHARDS = shards
+    reservations._states.pop(EVENT_ID, None)
+    failures: list = []
+    barrier = threading.Barrier(threads + 1)
+    pool = [threading.Thread(target=worker, args=(i, attempts, capacity, failures, barrier))
+            for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    # Shrink and restore the capacity while the workers are busy.
+    time.sleep(0.05)
+    reservations.resize(EVENT_ID, capacity // 2)
+    time.sleep(0.05)
+    reservations.resize(EVENT_ID, capacity)
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    problems = failures + check(capacity)
+    state = reservations._states[EVENT_ID]
+    requests = threads * attempts
+    print(f"{shards} shard(s): {requests} reservations from {threads} threads in {elapsed:.2f} s "
+          f"({requests / elapsed:,.0f}/s), {capacity - state.seats.remaining()} of {capacity} "
+          f"seats confirmed, {sum(1 for r in state.waitlist if r.status == 'waitlisted')} waiting")
+    for problem in problems[:10]:
+        print(f"  FAILED: {problem}")
+    return not problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--attempts", type=int, default=5000, help="reservations per thread")
+    parser.add_argument("--capacity", type=int, default=50000)
+    parser.add_argument("--switch-interval", type=float, default=1e-6,
+                        help="GIL switch interval in seconds; small values force interleaving")
+    args = parser.parse_args()
+
+    sys.setswitchinterval(args.switch_interval)
+    passed = True
+    for shards in (1, reservations.SHARDS):
+        reservations._reservations.clear()
+        reservations._idempotency.clear()
+        reservations._idempotency_keys.clear()
+        passed = run(args.threads, args.attempts, args.capacity, shards) and passed
+    print("invariants hold" if passed else "INVARIANTS VIOLATED")
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Per-worker memory with a private catalog versus the shared-memory catalog
+
+Starts ``--workers`` processes that each load the same synthetic catalog,
+either from a snapshot file into their own heap or by attaching to a shared
+memory generation, then render every event once as ``/events`` pages would.
+With all of them alive, each reports its unique (USS) and proportional (PSS)
+set size from /proc. Linux only. Run from the backend directory:
+
+    python -m benchmarks.shared_memory --events 50000 --workers 1 2 4
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+from app import database_updated as db
+from app import serialization, shared_catalog, snapshot
+
+_WORKER = """
+import sys
+from app import database_updated as db
+from app.serialization import events_json
+db.ensure_catalog()
+after = None
+while True:
+    page, after = db.filter_events_page(after, 200)
+    events_json(page)
+    if after is None:
+        break
+print("ready", flush=True)
+sys.stdin.readline()
+memory = {}
+with open("/proc/self/smaps_rollup") as stream:
+    for line in stream:
+        name, _, value = line.partition(":")
+        if name in ("Pss", "Private_Clean", "Private_Dirty"):
+            memory[name] = int(value.split()[0])
+print(memory["Private_Clean"] + memory["Private_Dirty"], memory["Pss"], flush=True)
+"""
+
+
+def measure(workers: int, env: dict) -> list:
+    processes = [
+        subprocess.Popen([sys.executable, "-W", "ignore", "-c", _WORKER], env=env, text=True,
+                         stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        for _ in range(workers)
+    ]
+    for process in processes:
+        assert process.stdout.readline().strip() == "ready"
+    results = []
+    for process in processes:
+        process.stdin.write("\n")
+        process.stdin.flush()
+        uss, pss = map(int, process.stdout.readline().split())
+        results.append((uss / 1024, pss / 1024))
+        process.wait()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=50000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    seeds = list(db.get_all_events())
+    catalog = [seeds[i % len(seeds)].model_copy(update={"id": i + 1}) for i in range(args.events)]
+    serialization.rebuild(catalog, db.nearby_places)
+    name = f"twe-bench-{os.getpid()}"
+
+    print(f"catalog: {args.events} events")
+    print(f"{'mode':>8} {'workers':>8} {'USS/worker':>11} {'PSS total':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "catalog.snap")
+        snapshot.write(path, *snapshot.model_rows(catalog, db.nearby_places))
+        base = dict(os.environ, PYTHONPATH=os.getcwd(), TWE_CATALOG_SNAPSHOT=path)
+        base.pop("TWE_SHARED_CATALOG", None)
+        try:
+            for workers in args.workers:
+                for mode, env in (("private", base), ("shared", dict(base, TWE_SHARED_CATALOG=name))):
+                    results = measure(workers, env)
+                    uss = sum(u for u, _ in results) / workers
+                    pss = sum(p for _, p in results)
+                    print(f"{mode:>8} {workers:8d} {uss:9.1f}MB {pss:8.1f}MB")
+        finally:
+            shared_catalog.unlink(name)
+
+
+if __name__ == "__main__":
+    main()
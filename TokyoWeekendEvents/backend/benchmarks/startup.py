@@ -0,0 +1,81 @@
+"""
+Worker boot time and first catalog load versus catalog size
+
+For each size a synthetic catalog is written as a binary snapshot, then fresh
+interpreters measure (a) importing ``app.main`` the way a uvicorn worker
+does, (b) the first ``ensure_catalog()`` from the snapshot and (c) building
+the same catalog the way the store used to at import: validating every model
+and serializing it. Run from the backend directory:
+
+    python -m benchmarks.startup --sizes 0 1000 10000 50000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from app import database_updated as db
+from app import serialization, snapshot
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app.main
+booted = time.perf_counter()
+from app import database_updated as db
+db.ensure_catalog()
+loaded = time.perf_counter()
+print(json.dumps({"boot": booted - started, "load": loaded - booted, "events": len(db._event_keys)}))
+"""
+
+_REBUILD = """
+import json, sys, time
+from app import serialization
+from app.models import Event
+documents = json.load(open(sys.argv[1]))
+started = time.perf_counter()
+events = [Event.model_validate(document) for document in documents]
+serialization.rebuild(events, [])
+print(json.dumps({"rebuild": time.perf_counter() - started}))
+"""
+
+
+def build_catalog(size: int):
+    seeds = list(db.get_all_events())
+    return [seeds[i % len(seeds)].model_copy(update={"id": i + 1}) for i in range(size)]
+
+
+def run(script: str, *args: str, env=None) -> dict:
+    output = subprocess.run([sys.executable, "-W", "ignore", "-c", script, *args],
+                            capture_output=True, text=True, check=True, env=env)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[0, 1000, 10000, 50000])
+    args = parser.parse_args()
+
+    print(f"{'events':>8} {'boot':>8} {'snapshot load':>14} {'model rebuild':>14}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            env = dict(os.environ, PYTHONPATH=os.getcwd())
+            rebuild = ""
+            if size:
+                catalog = build_catalog(size)
+                serialization.rebuild(catalog, db.nearby_places)
+                path = os.path.join(directory, f"catalog-{size}.snap")
+                snapshot.write(path, *snapshot.model_rows(catalog, db.nearby_places))
+                env["TWE_CATALOG_SNAPSHOT"] = path
+                documents = os.path.join(directory, f"catalog-{size}.json")
+                with open(documents, "w", encoding="utf-8") as stream:
+                    json.dump([e.model_dump(mode="json") for e in catalog], stream)
+                rebuild = f"{run(_REBUILD, documents, env=env)['rebuild']:13.3f}s"
+            probe = run(_PROBE, env=env)
+            print(f"{probe['events']:8d} {probe['boot']:7.3f}s {probe['load']:13.3f}s {rebuild:>14}")
+
+
+if __name__ == "__main__":
+    main()
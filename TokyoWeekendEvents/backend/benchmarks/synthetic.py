@@ -0,0 +1,223 @@
+"""
+Synthetic Tokyo catalogs for benchmarks
+
+Generates a catalog of any size shaped like production data: events at
+venues inside the real neighborhood polygons (``app/data/areas.json``), with
+the nearest real station and walking time filled in by ``app.geocoding``,
+Japanese names and descriptions, mostly weekend dates over a year including
+multi-day events, nearby places, users, and favorites and schedules skewed
+towards popular events. The same ``seed`` always yields the same catalog.
+
+``install`` loads a catalog into the store in place of the seed data. To
+write one as JSONL for ``python -m app.ingest`` or ``python -m app.snapshot``
+instead, run from the backend directory:
+
+    python -m benchmarks.synthetic --events 1000000 --out catalog.jsonl
+"""
+import argparse
+import json
+import random
+from datetime import datetime, timedelta
+from typing import Iterator, List, NamedTuple, Optional
+
+from app import database_updated as db
+from app import geocoding
+from app.models import (
+    Coordinates, Event, ExternalLinks, Favorite, Location, NearbyPlace, Schedule, User
+)
+
+# Every synthetic user's password is "password123", like the seed user.
+PASSWORD = "password123"
+PASSWORD_HASH = "$2b$12$4sNdtKLRLypXR.EgXnkwX.u8hHL7NNeimc12aWHgr2EnbxgbkYSgW"
+
+FIRST_WEEKEND = datetime(2026, 1, 3)
+VENUES_PER_AREA = 40
+
+WARDS = {
+    "丸の内": "千代田区", "東京": "千代田区", "日比谷": "千代田区", "銀座": "中央区",
+    "六本木": "港区", "渋谷": "渋谷区", "新宿": "新宿区", "池袋": "豊島区",
+    "上野": "台東区", "浅草": "台東区", "北千住": "足立区", "お台場": "港区",
+}
+VENUE_KINDS = ["ホール", "公園", "広場", "ギャラリー", "スタジオ", "ライブハウス", "神社",
+               "テラス", "ミュージアム", "センター", "ストリート", "アリーナ"]
+THEMES = {
+    "アート": ["現代アート", "写真", "浮世絵", "デザイン", "陶芸", "版画"],
+    "音楽": ["ジャズ", "クラシック", "ロック", "アンビエント", "和楽器", "シティポップ"],
+    "フード": ["ラーメン", "クラフトビール", "スイーツ", "日本酒", "屋台グルメ", "抹茶"],
+    "祭り": ["夏祭り", "盆踊り", "神輿", "縁日", "花火", "酉の市"],
+    "フェスティバル": ["国際", "ストリート", "ナイト", "カルチャー", "ダンス", "映画"],
+    "マーケット": ["蚤の市", "ファーマーズ", "手づくり", "古本", "骨董", "ヴィンテージ"],
+    "アニメ": ["コスプレ", "声優", "原画", "ゲーム", "コミック", "特撮"],
+    "ファッション": ["サステナブル", "古着", "ストリート", "着物", "デザイナーズ", "アクセサリー"],
+    "イルミネーション": ["ウィンター", "ガーデン", "プロジェクション", "ランタン", "クリスマス", "光の"],
+}
+EVENT_KINDS = ["フェスティバル", "フェス", "マルシェ", "ナイト", "ウィーク", "展", "ライブ",
+               "ワークショップ", "まつり", "フェア"]
+SENTENCES = [
+    "{area}で開催される{theme}の{kind}。",
+    "週末限定で{venue}に{theme}の魅力が集結します。",
+    "初心者から愛好家まで楽しめるプログラムを多数ご用意しています。",
+    "{station}から徒歩圏内でアクセスも便利です。",
+    "家族連れにもおすすめの参加型コンテンツがあります。",
+    "夜はライトアップされた会場で特別な体験をお楽しみください。",
+    "地元の店舗やクリエイターとのコラボレーション企画も実施。",
+    "入場者数に限りがありますので、お早めにお越しください。",
+]
+PLACE_TYPES = {
+    "restaurant": ["食堂", "寿司", "居酒屋", "ビストロ", "焼き鳥", "そば"],
+    "cafe": ["珈琲", "カフェ", "喫茶", "ティーハウス"],
+    "hotel": ["ホテル", "イン", "旅館", "ステイ"],
+    "entertainment": ["シアター", "カラオケ", "ボウリング", "ゲームセンター"],
+}
+
+
+class Catalog(NamedTuple):
+    events: List[Event]
+    places: List[NearbyPlace]
+    users: List[User]
+    favorites: List[Favorite]
+    schedules: List[Schedule]
+
+
+def _point_in(rng: random.Random, area: str, bbox) -> Coordinates:
+    min_lat, min_lon, max_lat, max_lon = bbox
+    for _ in range(50):
+        latitude = rng.uniform(min_lat, max_lat)
+        longitude = rng.uniform(min_lon, max_lon)
+        if geocoding.area_at(latitude, longitude) == area:
+            break
+    return Coordinates(latitude=round(latitude, 6), longitude=round(longitude, 6))
+
+
+def _address(rng: random.Random, area: str) -> str:
+    return f"東京都{WARDS.get(area, '')}{area}{rng.randint(1, 5)}-{rng.randint(1, 30)}-{rng.randint(1, 20)}"
+
+
+def _locations(rng: random.Random, per_area: int, kinds: List[str]) -> List[Location]:
+    with open(geocoding.AREAS_FILE, encoding="utf-8") as stream:
+        areas = json.load(stream)
+    locations = []
+    for area, vertices in areas.items():
+        lats = [lat for lat, _ in vertices]
+        lons = [lon for _, lon in vertices]
+        bbox = (min(lats), min(lons), max(lats), max(lons))
+        for _ in range(per_area):
+            location = Location(name=f"{area}{rng.choice(kinds)}", address=_address(rng, area),
+                                coordinates=_point_in(rng, area, bbox), area=area)
+            locations.append(geocoding.fill_location(location))
+    return locations
+
+
+def _start(rng: random.Random) -> datetime:
+    day = FIRST_WEEKEND + timedelta(weeks=rng.randrange(52))
+    # Mostly Saturday or Sunday, sometimes a weekday around it.
+    day += timedelta(days=rng.choice((0, 0, 0, 1, 1, 1, -1, -2, 2)))
+    return day + timedelta(hours=rng.randint(9, 19), minutes=rng.choice((0, 0, 30)))
+
+
+def _duration(rng: random.Random) -> timedelta:
+    roll = rng.random()
+    if roll < 0.8:
+        return timedelta(hours=rng.randint(2, 10))
+    if roll < 0.95:
+        return timedelta(days=rng.randint(1, 3), hours=rng.randint(0, 8))
+    return timedelta(days=rng.randint(4, 14))
+
+
+def iter_events(count: int, seed: int = 0) -> Iterator[Event]:
+    """Yield ``count`` events with ids 1..count, without holding them all."""
+    rng = random.Random(seed)
+    venues = _locations(rng, VENUES_PER_AREA, VENUE_KINDS)
+    categories = list(THEMES)
+    for event_id in range(1, count + 1):
+        venue = rng.choice(venues)
+        category = rng.choice(categories)
+        theme = rng.choice(THEMES[category])
+        kind = rng.choice(EVENT_KINDS)
+        words = {"area": venue.area, "theme": theme, "kind": kind, "venue": venue.name,
+                 "station": venue.station or venue.area}
+        description = "".join(sentence.format(**words)
+                              for sentence in [SENTENCES[0]] + rng.sample(SENTENCES[1:], 2))
+        start = _start(rng)
+        links = {"website": f"https://example.com/events/{event_id}"}
+        if rng.random() < 0.5:
+            links["instagram"] = f"https://instagram.com/twe{event_id}"
+        yield Event(
+            id=event_id,
+            name=f"{venue.area}{theme}{kind}",
+            description=description,
+            start_datetime=start,
+            end_datetime=start + _duration(rng),
+            location=venue,
+            category=category,
+            external_links=ExternalLinks(**links),
+            price=None if rng.random() < 0.25 else rng.randint(1, 16) * 500,
+            capacity=rng.choice((50, 100, 300, 500, 1000, 3000, 10000, 20000)),
+        )
+
+
+def generate_places(count: int, seed: int = 0) -> List[NearbyPlace]:
+    rng = random.Random(seed + 1)
+    places = []
+    per_area = max(1, count // len(WARDS))
+    for place_type, names in PLACE_TYPES.items():
+        for location in _locations(rng, max(1, per_area // len(PLACE_TYPES)), names):
+            places.append(NearbyPlace(
+                id=len(places) + 1, name=location.name, type=place_type, location=location,
+                rating=round(rng.uniform(3.0, 5.0), 1), price_level=rng.randint(1, 4),
+                description=f"{location.area}駅周辺の人気{names[0]}。",
+            ))
+    return places
+
+
+def generate(events: int, places: Optional[int] = None, users: Optional[int] = None,
+             seed: int = 0) -> Catalog:
+    """A catalog of ``events`` events; places and users scale with it by default."""
+    places = max(48, events // 50) if places is None else places
+    users = max(1, events // 100) if users is None else users
+    catalog_events = list(iter_events(events, seed))
+    rng = random.Random(seed + 2)
+
+    catalog_users = [User(id=i, username=f"user{i}", email=f"user{i}@example.com")
+                     for i in range(1, users + 1)]
+    favorites, schedules = [], []
+    for user in catalog_users:
+        # Popularity is skewed: low ids are picked far more often.
+        picked = {int(events * rng.random() ** 3) + 1 for _ in range(rng.randint(0, 20))}
+        for event_id in sorted(picked):
+            favorites.append(Favorite(id=len(favorites) + 1, user_id=user.id, event_id=event_id))
+            if rng.random() < 0.3:
+                schedules.append(Schedule(id=len(schedules) + 1, user_id=user.id,
+                                          event_id=event_id, reminder=rng.random() < 0.5))
+    return Catalog(catalog_events, generate_places(places, seed), catalog_users,
+                   favorites, schedules)
+
+
+def install(catalog: Catalog):
+    """Replace the store's catalog, users, favorites and schedules with ``catalog``."""
+    db.load_catalog(catalog.events, catalog.places)
+    db.users[:] = catalog.users
+    db.password_hashes.clear()
+    db.password_hashes.update((user.email, PASSWORD_HASH) for user in catalog.users)
+    db.favorites[:] = catalog.favorites
+    db.schedules[:] = catalog.schedules
+    db.rebuild_recommendations()
+    db.rebuild_reminders()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", required=True, help="JSONL file to write the events to")
+    args = parser.parse_args()
+
+    with open(args.out, "w", encoding="utf-8") as stream:
+        for event in iter_events(args.events, args.seed):
+            stream.write(event.model_dump_json())
+            stream.write("\n")
+    print(f"wrote {args.events} events to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
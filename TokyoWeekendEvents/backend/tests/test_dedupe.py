@@ -0,0 +1,44 @@
+"""
+The store's near-duplicate index stays current without re-signing the catalog
+"""
+import pytest
+
+from app import database_updated as db, dedupe
+from benchmarks import synthetic
+
+
+@pytest.fixture
+def signed(monkeypatch):
+    synthetic.install(synthetic.generate(2000, users=1))
+    db.dedupe_index()
+    calls = []
+    sign = dedupe.signature
+    monkeypatch.setattr(dedupe, "signature", lambda event: calls.append(event.id) or sign(event))
+    return calls
+
+
+def copy_of(event, new_id):
+    return event.model_copy(update={"id": new_id})
+
+
+def test_ingest_signs_only_new_records(signed):
+    batch = [copy_of(db.events[i], 900000 + i) for i in range(3)]
+    deduplicator = dedupe.Deduplicator("flag", index=db.dedupe_index())
+    db.upsert_events(deduplicator.process(batch))
+
+    assert sorted(signed) == [900000, 900001, 900002]
+    assert deduplicator.duplicates == 3
+    assert len(db.dedupe_index()) == len(db.events)
+
+
+def test_writes_outside_ingest_update_the_index(signed):
+    original = copy_of(db.events[0], 900000)
+    db.upsert_event(original)
+    assert signed == [900000]
+
+    deduplicator = dedupe.Deduplicator("flag", index=db.dedupe_index())
+    deduplicator.process([copy_of(original, 900001)])
+    assert 900000 in {match.duplicate_of for match in deduplicator.matches}
+
+    db.delete_event(900000)
+    assert db.dedupe_index().get(900000) is None
@@ -0,0 +1,79 @@
+"""
+NDJSON export: output matches the filters, and no fetch holds the loop long
+"""
+import asyncio
+import gzip
+import json
+
+import pytest
+
+from app import database_updated as db, export, serialization, snapshot
+from benchmarks import synthetic
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    synthetic.install(synthetic.generate(8000, users=1))
+    return db.events[100]
+
+
+async def collect(chunks) -> bytes:
+    return b"".join([chunk async for chunk in chunks])
+
+
+def event_fetch(**filters):
+    return lambda after, limit: db.filter_event_ids_page(after, limit, **filters)
+
+
+def test_export_matches_filter_events(catalog):
+    filters = {"area": catalog.location.area, "category": catalog.category}
+    body = asyncio.run(collect(export.gzipped(export.ndjson(event_fetch(**filters),
+                                                            serialization.event_json))))
+    ids = [json.loads(line)["id"] for line in gzip.decompress(body).splitlines()]
+    assert ids == [e.id for e in sorted(db.filter_events(**filters), key=db._event_key)]
+
+
+def test_places_export_covers_every_place(catalog):
+    fetch = lambda after, limit: db.get_nearby_place_ids_page(None, None, after, limit)
+    body = asyncio.run(collect(export.ndjson(fetch, serialization.place_json)))
+    assert [json.loads(line)["id"] for line in body.splitlines()] == \
+        sorted(place.id for place in db.nearby_places)
+
+
+def test_selective_filter_scans_bounded_pages(catalog, monkeypatch):
+    lookups = []
+    event = db._peek_event
+
+    def counting(event_id):
+        lookups[-1] += 1
+        return event(event_id)
+
+    def fetch(after, limit):
+        lookups.append(0)
+        return db.filter_event_ids_page(after, limit, station="no such station")
+
+    monkeypatch.setattr(db, "_peek_event", counting)
+    body = asyncio.run(collect(export.ndjson(fetch, serialization.event_json)))
+    assert body == b""
+    assert sum(lookups) == len(db._event_keys)
+    assert max(lookups) <= db.MAX_PAGE_SCAN
+
+
+def test_export_keeps_snapshot_events_undecoded(catalog, tmp_path):
+    expected = [json.loads(serialization.event_json(key[-1])) for key in db._event_keys]
+    path, _, _ = db.write_snapshot(str(tmp_path / "catalog.snap"))
+    snap = snapshot.Snapshot.open(path)
+    try:
+        with db._catalog_lock:
+            db._load_snapshot(snap)
+    finally:
+        snap.close()
+    try:
+        everything = asyncio.run(collect(export.ndjson(event_fetch(), serialization.event_json)))
+        filtered = asyncio.run(collect(export.ndjson(event_fetch(category=catalog.category),
+                                                     serialization.event_json)))
+        assert [json.loads(line) for line in everything.splitlines()] == expected
+        assert len(filtered.splitlines()) == sum(e["category"] == catalog.category for e in expected)
+        assert not db._events_by_id and len(db._undecoded) == len(expected)
+    finally:
+        synthetic.install(synthetic.generate(8000, users=1))
@@ -0,0 +1,29 @@
+"""
+Conditional GETs against encoded and identity representations
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main_updated import app
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "identity"])
+def test_304_repeats_the_validator_the_client_holds(client, encoding):
+    first = client.get("/events", headers={"Accept-Encoding": encoding})
+    etag = first.headers["etag"]
+    assert etag.endswith('-gzip"') == (encoding == "gzip")
+
+    again = client.get("/events", headers={"Accept-Encoding": encoding, "If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["etag"] == etag
+
+
+def test_stale_validator_gets_the_body(client):
+    response = client.get("/events", headers={"If-None-Match": '"stale"'})
+    assert response.status_code == 200
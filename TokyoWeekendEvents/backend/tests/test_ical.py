@@ -0,0 +1,36 @@
+"""
+The feed cache keeps its byte count while feeds are stored from threadpool threads
+"""
+import sys
+import threading
+
+from app import ical
+
+
+def test_byte_count_survives_concurrent_stores(monkeypatch):
+    monkeypatch.setattr(ical, "MAX_CACHED_FEEDS", 50)
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+
+    def store(worker: int):
+        for i in range(20000):
+            key = ("test", i % 80)
+            feed = ical._Feed((worker,), "", b"x" * (i % 7 + 1))
+            list(ical.caching(key, feed.versions, feed.etag, iter([feed.body])))
+            ical.lookup(("test", (i * 7) % 80), (worker,))
+            if i % 5 == 0:
+                ical.invalidate(("test", (i * 3) % 80))
+
+    threads = [threading.Thread(target=store, args=(worker,)) for worker in range(4)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert ical._cached_bytes == sum(len(feed.body) for feed in ical._feeds.values())
+    assert len(ical._feeds) <= 50
+    for key in list(ical._feeds):
+        ical.invalidate(key)
+    assert ical._cached_bytes == 0
@@ -0,0 +1,61 @@
+"""
+Malformed uploads to /admin/events/ingest are reported, never a 500
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+from app import database_updated as db
+from app.main_updated import app
+
+
+@pytest.fixture(scope="module")
+def client():
+    client = TestClient(app)
+    client.post("/users/register", json={"email": "admin@example.com", "username": "admin",
+                                         "password": "pw"})
+    token = client.post("/token", data={"username": "admin@example.com",
+                                        "password": "pw"}).json()["access_token"]
+    client.headers["Authorization"] = f"Bearer {token}"
+    return client
+
+
+def line(event_id: int) -> bytes:
+    return db.get_event_by_id(1).model_copy(update={"id": event_id}).model_dump_json().encode()
+
+
+CSV_ROW = ("name,description,category,start_datetime,end_datetime,location.name,location.address,"
+           "location.area,location.station,location.coordinates.latitude,"
+           "location.coordinates.longitude,price_range,image_url\n")
+
+
+def csv_row(event_id: int, name: bytes) -> bytes:
+    return (b"%d," % event_id + name + b",desc,festival,2026-05-02T10:00:00,2026-05-02T18:00:00,"
+            b"Hall,1-1 Shibuya,Shibuya,Shibuya,35.66,139.70,free,https://example.com/a.jpg\n")
+
+
+def test_conflicting_csv_columns_are_a_bad_request(client):
+    body = b"id,location,location.name\n1,x,y\n"
+    response = client.post("/admin/events/ingest", content=body,
+                           headers={"Content-Type": "text/csv"})
+    assert response.status_code == 400
+    assert "location" in response.json()["detail"]
+
+
+def test_jsonl_line_that_is_not_utf8_is_a_row_error(client):
+    body = line(700001) + b"\n" + line(700002).replace(b'"name":"', b'"name":"\xff') + b"\n" + line(700003)
+    response = client.post("/admin/events/ingest", content=body,
+                           headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+    report = response.json()
+    assert report["upserted"] == 2
+    assert [error["line"] for error in report["errors"]] == [2]
+
+
+def test_csv_row_that_is_not_utf8_is_a_row_error(client):
+    body = b"id," + CSV_ROW.encode() + csv_row(700011, b"Fair") + csv_row(700012, b"F\xe9te")
+    response = client.post("/admin/events/ingest", content=body,
+                           headers={"Content-Type": "text/csv"})
+    assert response.status_code == 200
+    report = response.json()
+    assert report["upserted"] == 1
+    assert [error["line"] for error in report["errors"]] == [3]
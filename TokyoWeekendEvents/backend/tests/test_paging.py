@@ -0,0 +1,89 @@
+"""
+Keyset pages against the unpaginated filters they stand in for
+"""
+import random
+from datetime import timedelta
+
+import pytest
+
+from app import database_updated as db, pagination
+from benchmarks import synthetic
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    synthetic.install(synthetic.generate(5000, users=1))
+    return db.events[100]
+
+
+def walk(**filters):
+    ids, after = [], None
+    while True:
+        page, after = db.filter_events_page(after, 50, **filters)
+        ids.extend(event.id for event in page)
+        if after is None:
+            return ids
+
+
+@pytest.mark.parametrize("make_filters", [
+    lambda e: {},
+    lambda e: {"category": e.category},
+    lambda e: {"station": e.location.station},
+    lambda e: {"area": e.location.area, "category": e.category},
+    lambda e: {"end_date": e.start_datetime + timedelta(days=3)},
+    lambda e: {"start_date": e.start_datetime, "end_date": e.start_datetime + timedelta(days=10),
+               "category": e.category},
+])
+def test_pages_cover_filter_events(catalog, make_filters):
+    filters = make_filters(catalog)
+    expected = [e.id for e in sorted(db.filter_events(**filters), key=db._event_key)]
+    assert walk(**filters) == expected
+
+
+def test_selective_filter_returns_short_page_with_cursor(catalog):
+    page, after = db.filter_events_page(None, 50, station="no such station")
+    assert page == [] and after == db._event_keys[db.MAX_PAGE_SCAN - 1]
+
+
+def test_end_date_stops_the_scan(catalog):
+    before_all = db.events[0].start_datetime - timedelta(days=1)
+    assert db.filter_events_page(None, 50, end_date=before_all) == ([], None)
+
+
+def test_writes_keep_events_in_key_order(catalog):
+    rng = random.Random(1)
+    for _ in range(200):
+        event = rng.choice(db.events)
+        if rng.random() < 0.3:
+            db.delete_event(event.id)
+        else:
+            moved = event.start_datetime + timedelta(hours=rng.randint(-500, 500))
+            db.upsert_event(event.model_copy(update={"start_datetime": moved}))
+    db.upsert_events([e.model_copy(update={"id": 100000 + i}) for i, e in enumerate(db.events[:100])])
+
+    assert [db._event_key(e) for e in db.events] == db._event_keys
+    assert len(db.events) == len(db._events_by_id)
+
+
+@pytest.mark.parametrize("values", [
+    ["e", "2026-01-01T10:00:00+09:00", 1],
+    ["e", "2026-01-01T10:00:00", True],
+    ["p", False],
+])
+def test_malformed_cursors_are_rejected(values):
+    cursor = pagination._encode(values)
+    decode = pagination.decode_event_cursor if values[0] == "e" else pagination.decode_place_cursor
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode(cursor)
+
+
+def test_malformed_cursors_are_bad_requests(catalog):
+    from fastapi.testclient import TestClient
+    from app.main_updated import app
+
+    aware = pagination._encode(["e", "2026-01-01T10:00:00+09:00", 1])
+    boolean = pagination._encode(["p", True])
+    client = TestClient(app)
+    for path in (f"/events?cursor={aware}", f"/events/search?query=a&cursor={aware}",
+                 f"/nearby/{catalog.location.area}?cursor={boolean}"):
+        assert client.get(path).status_code == 400, path
@@ -0,0 +1,29 @@
+"""
+The bcrypt queue gauge counts hashes waiting for a thread
+"""
+import asyncio
+import threading
+
+from app import main_updated as main, metrics
+
+
+def queue_depth() -> float:
+    for line in metrics.render().decode().splitlines():
+        if line.startswith("twe_bcrypt_queue_depth "):
+            return float(line.split()[1])
+
+
+def test_queue_depth_counts_waiting_hashes():
+    release = threading.Event()
+
+    async def scenario():
+        tasks = [asyncio.ensure_future(main.run_in_password_pool(release.wait))
+                 for _ in range(main.PASSWORD_THREADS + 2)]
+        await asyncio.sleep(0.05)
+        waiting = queue_depth()
+        release.set()
+        await asyncio.gather(*tasks)
+        return waiting
+
+    assert asyncio.run(scenario()) == 2
+    assert queue_depth() == 0
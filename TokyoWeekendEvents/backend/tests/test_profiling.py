@@ -0,0 +1,52 @@
+"""
+A request profile covers that request, not everything else on the loop
+"""
+import asyncio
+
+from app import profiling
+
+
+def busy_elsewhere():
+    return sum(range(20000))
+
+
+def busy_profiled():
+    return sum(range(20000))
+
+
+async def endpoint(scope, receive, send):
+    work = busy_profiled if scope["path"] == "/profiled" else busy_elsewhere
+    for _ in range(5):
+        work()
+        await asyncio.sleep(0.001)
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def request(path, profiled):
+    headers = [(b"x-profile", b"1"), (b"authorization", b"Bearer admin")] if profiled else []
+    return {"type": "http", "method": "GET", "path": path, "query_string": b"", "headers": headers}
+
+
+async def run_both(app):
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    await asyncio.gather(app(request("/profiled", True), receive, send),
+                         app(request("/other", False), receive, send))
+    return [dict(message["headers"]) for message in sent if message["type"] == "http.response.start"]
+
+
+def test_profile_leaves_out_concurrent_requests():
+    app = profiling.ProfilingMiddleware(endpoint, lambda token: token == "admin")
+    (profile_id,) = [headers[b"x-profile-id"] for headers in asyncio.run(run_both(app))
+                     if b"x-profile-id" in headers]
+
+    report = profiling.request_profile(profile_id.decode())
+    assert "busy_profiled" in report
+    assert "busy_elsewhere" not in report
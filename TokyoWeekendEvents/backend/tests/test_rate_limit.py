@@ -0,0 +1,23 @@
+"""
+Per-user limits: the token to user cache is bounded and expires
+"""
+from app import rate_limit
+from app.rate_limit import RateLimitMiddleware
+
+
+def test_token_cache_is_lru_with_ttl(monkeypatch):
+    monkeypatch.setattr(rate_limit, "MAX_CACHED_TOKENS", 2)
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: now[0])
+    lookups = []
+    limiter = RateLimitMiddleware(None, {}, identify=lambda token: lookups.append(token) or token,
+                                  url=None, token_ttl=60)
+
+    for token in ("a", "b", "a", "c"):
+        limiter._user(token)
+    assert list(limiter._users) == ["a", "c"]
+    assert lookups == ["a", "b", "c"]
+
+    now[0] += 61
+    assert limiter._user("a") == "user:a"
+    assert lookups == ["a", "b", "c", "a"]
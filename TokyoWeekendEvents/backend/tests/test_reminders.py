@@ -0,0 +1,40 @@
+"""
+Reminders and reservations keep Tokyo time on a host running in UTC
+"""
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import clock, reminders, reservations
+
+
+@pytest.fixture(autouse=True)
+def utc_host(monkeypatch):
+    monkeypatch.setenv("TZ", "UTC")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_clock_reads_tokyo_time():
+    tokyo = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(hours=9)
+    assert abs(clock.now() - tokyo) < timedelta(seconds=5)
+
+
+def test_events_that_started_in_tokyo_get_no_reminder():
+    started = clock.now() - timedelta(hours=1)
+    upcoming = clock.now() + reminders.LEAD_TIME + timedelta(hours=1)
+    reminders.schedule(1, 900001, started)
+    reminders.schedule(1, 900002, upcoming)
+    try:
+        assert (1, 900001) not in reminders._pending
+        assert reminders._pending[(1, 900002)][1] == upcoming
+    finally:
+        reminders.cancel(1, 900002)
+
+
+def test_reservations_are_stamped_in_tokyo_time():
+    reservation, _ = reservations.reserve(900001, 10, 1, 1)
+    assert abs(reservation.created_at - clock.now()) < timedelta(seconds=5)
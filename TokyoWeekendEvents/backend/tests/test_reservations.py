@@ -0,0 +1,79 @@
+"""
+Seat reservation invariants under concurrency, and idempotency key lifetimes
+"""
+import sys
+
+import pytest
+
+from app import reservations
+from benchmarks import reservations as stress
+
+
+def clear():
+    for state in (reservations._states, reservations._reservations, reservations._by_user,
+                  reservations._idempotency, reservations._idempotency_keys):
+        state.clear()
+
+
+@pytest.fixture(autouse=True)
+def fresh(monkeypatch):
+    # The stress run changes SHARDS; monkeypatch puts it back.
+    monkeypatch.setattr(reservations, "SHARDS", reservations.SHARDS)
+    clear()
+    yield
+    clear()
+
+
+@pytest.mark.parametrize("shards", [1, 8])
+def test_stress_keeps_invariants(shards):
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        assert stress.run(threads=8, attempts=300, capacity=1000, shards=shards)
+    finally:
+        sys.setswitchinterval(interval)
+
+
+def test_retry_replays_until_released():
+    first, replayed = reservations.reserve(1, 10, 1, 2, "k")
+    assert not replayed
+    assert reservations.reserve(1, 10, 1, 2, "k") == (first, True)
+
+    reservations.release(1, 1, first.id)
+    second, replayed = reservations.reserve(1, 10, 1, 2, "k")
+    assert not replayed and second.id != first.id
+
+
+def test_cancelling_a_waitlisted_reservation_forgets_its_key():
+    reservations.reserve(1, 1, 1, 1)
+    waiting, _ = reservations.reserve(1, 1, 2, 1, "k")
+    assert waiting.status == reservations.WAITLISTED
+    reservations.release(2, 1, waiting.id)
+    assert not reservations._idempotency and not reservations._idempotency_keys
+
+
+def test_keys_expire_and_are_capped(monkeypatch):
+    monkeypatch.setattr(reservations, "MAX_IDEMPOTENCY_KEYS", 3)
+    for i in range(5):
+        reservations.reserve(1, 100, 1, 1, f"k{i}")
+    assert list(reservations._idempotency) == [(1, "k2"), (1, "k3"), (1, "k4")]
+    assert len(reservations._idempotency_keys) == 3
+
+    clock = reservations.time.monotonic() + reservations.IDEMPOTENCY_TTL_SECONDS + 1
+    monkeypatch.setattr(reservations.time, "monotonic", lambda: clock)
+    _, replayed = reservations.reserve(1, 100, 1, 1, "k4")
+    assert not replayed
+    assert list(reservations._idempotency) == [(1, "k4")]
+
+
+def test_waitlist_positions_move_up():
+    reservations.reserve(1, 1, 1, 1)
+    first, _ = reservations.reserve(1, 1, 2, 1)
+    second, _ = reservations.reserve(1, 1, 3, 1)
+    third, _ = reservations.reserve(1, 1, 4, 1)
+    assert [first.position, second.position, third.position] == [1, 2, 3]
+
+    reservations.release(2, 1, first.id)
+    assert first.position is None
+    assert [r.position for r in reservations.user_reservations(4)] == [2]
+    assert [r.position for r in reservations.user_reservations(3)] == [1]
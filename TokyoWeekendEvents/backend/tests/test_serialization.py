@@ -0,0 +1,15 @@
+"""
+Projected documents: decoded on first use and capped, least recently used first out
+"""
+from app import database_updated as db, serialization
+
+
+def test_document_cache_is_capped(monkeypatch):
+    monkeypatch.setattr(serialization, "DOCUMENT_CACHE_SIZE", 3)
+    db.ensure_catalog()
+    first, second, third, fourth = (event.id for event in db.get_all_events()[:4])
+    serialization._documents.clear()
+
+    projected = serialization.project_ids([first, second, third, first, fourth], ("id",))
+    assert [document["id"] for document in projected] == [first, second, third, first, fourth]
+    assert list(serialization._documents) == [third, first, fourth]
@@ -0,0 +1,139 @@
+"""
+Two workers serving one shared-memory catalog
+
+Each worker is a separate process, as under ``uvicorn --workers``, driven over
+a pipe so that the test decides exactly how their requests interleave.
+"""
+import multiprocessing
+import os
+import uuid
+
+import pytest
+
+
+def serve(connection, catalog: str):
+    os.environ["TWE_SHARED_CATALOG"] = catalog
+    from fastapi.testclient import TestClient
+    from app import database_updated as db
+    from app.main_updated import app
+
+    with TestClient(app) as client:
+        while True:
+            command, *args = connection.recv()
+            if command == "get":
+                path, etag = args
+                response = client.get(path, headers={"If-None-Match": etag} if etag else {})
+                body = response.json() if response.status_code == 200 else None
+                connection.send((response.status_code, response.headers.get("etag"), body))
+            elif command == "upsert":
+                (event_id,) = args
+                template = db.get_event_by_id(1)
+                db.upsert_event(template.model_copy(update={"id": event_id}))
+                connection.send(None)
+            elif command == "ids":
+                connection.send(sorted(event.id for event in db.get_all_events()))
+            elif command == "ingest":
+                (event_ids,) = args
+                template = db.get_event_by_id(1)
+                body = "\n".join(template.model_copy(update={"id": event_id}).model_dump_json()
+                                 for event_id in event_ids)
+                client.post("/users/register", json={"email": "admin@example.com",
+                                                     "username": "admin", "password": "pw"})
+                token = client.post("/token", data={"username": "admin@example.com",
+                                                    "password": "pw"}).json()["access_token"]
+                response = client.post("/admin/events/ingest?chunk_size=1", content=body,
+                                       headers={"Authorization": f"Bearer {token}",
+                                                "Content-Type": "application/x-ndjson"})
+                connection.send((response.status_code, db._shared.generation()))
+            elif command == "generation":
+                db.ensure_catalog()
+                connection.send(db._shared.generation())
+            else:
+                connection.send(None)
+                return
+
+
+class Worker:
+    def __init__(self, context, catalog: str):
+        self.connection, child = context.Pipe()
+        self.process = context.Process(target=serve, args=(child, catalog), daemon=True)
+        self.process.start()
+
+    def __call__(self, *command):
+        self.connection.send(command)
+        if not self.connection.poll(60):
+            raise TimeoutError(f"worker did not answer {command}")
+        return self.connection.recv()
+
+    def stop(self):
+        self("stop")
+        self.process.join(10)
+
+
+@pytest.fixture
+def workers():
+    from app import shared_catalog
+
+    catalog = f"twe-test-{uuid.uuid4().hex[:8]}"
+    context = multiprocessing.get_context("spawn")
+    started = [Worker(context, catalog), Worker(context, catalog)]
+    yield started
+    for worker in started:
+        worker.stop()
+    shared_catalog.unlink(catalog)
+
+
+def test_etag_follows_generation_published_by_other_worker(workers):
+    a, b = workers
+    status, etag, body = b("get", "/events", None)
+    assert status == 200 and 800 not in {event["id"] for event in body}
+    # A second request caches the body under that ETag.
+    assert b("get", "/events", None)[1] == etag
+
+    a("upsert", 800)
+
+    status, new_etag, body = b("get", "/events", etag)
+    assert status == 200
+    assert new_etag != etag
+    assert 800 in {event["id"] for event in body}
+
+
+def test_concurrent_writes_from_both_workers_are_kept(workers):
+    a, b = workers
+    a("upsert", 800)
+    b("upsert", 900)
+    a("upsert", 801)
+
+    assert {800, 801, 900} <= set(a("ids"))
+    assert a("ids") == b("ids")
+
+
+def test_workers_agree_on_etags(workers):
+    a, b = workers
+    a("upsert", 800)
+    status, etag, _ = a("get", "/events", None)
+    assert status == 200
+    assert b("get", "/events", None)[1] == etag
+    assert b("get", "/events", etag)[0] == 304
+
+
+def test_delta_sync_spans_workers(workers):
+    a, b = workers
+    _, _, synced = b("get", "/events/changes?since=0", None)
+
+    a("upsert", 800)
+    a("upsert", 801)
+
+    _, _, changes = b("get", f"/events/changes?since={synced['version']}&epoch={synced['epoch']}", None)
+    assert not changes["full_resync"]
+    assert changes["epoch"] == synced["epoch"]
+    assert sorted(event["id"] for event in changes["upserts"]) == [800, 801]
+
+
+def test_ingest_publishes_once_per_upload(workers):
+    a, b = workers
+    before = a("generation")
+    status, after = a("ingest", [800, 801, 802])
+    assert status == 200
+    assert after == before + 1
+    assert {800, 801, 802} <= set(b("ids"))
@@ -0,0 +1,47 @@
+"""
+Similar events: the index is built off the loop and keeps up with writes
+"""
+import pytest
+
+from app import database_updated as db, similarity
+from benchmarks import synthetic
+
+
+@pytest.fixture
+def catalog():
+    synthetic.install(synthetic.generate(500, users=1))
+    return db.events
+
+
+def test_updates_drop_unused_terms(catalog):
+    db._ensure_similarity()
+    event = catalog[0]
+    renamed = event.model_copy(update={"name": "ゾゾゾゾ", "description": "ヂヂヂヂ"})
+    db.upsert_event(renamed)
+    assert "ゾゾ" in similarity._document_frequency
+    db.upsert_event(event)
+    assert "ゾゾ" not in similarity._document_frequency
+    assert all(count > 0 for count in similarity._document_frequency.values())
+
+
+def test_writes_during_a_build_are_replayed(catalog):
+    renamed, deleted = catalog[1], catalog[2]
+    event_ids = db.start_similarity_build()
+    db.upsert_event(renamed.model_copy(update={"name": "ゾゾゾゾ"}))
+    db.delete_event(deleted.id)
+    db.install_similarity(db.build_similarity(event_ids))
+
+    assert db.similarity_ready()
+    assert deleted.id not in similarity._terms
+    assert "ゾゾ" in similarity._terms[renamed.id]
+    expected = similarity.build(db.get_all_events())
+    assert similarity._document_frequency == expected[2]
+    assert set(similarity._vectors) == {event.id for event in db.get_all_events()}
+
+
+def test_a_build_across_a_catalog_replacement_is_dropped(catalog):
+    event_ids = db.start_similarity_build()
+    index = db.build_similarity(event_ids)
+    db.load_catalog(list(catalog), list(db.nearby_places))
+    db.install_similarity(index)
+    assert not db.similarity_ready()